@@ -0,0 +1,121 @@
+import asyncio
+import math
+from collections import OrderedDict, defaultdict, deque
+
+# Kelas prioritas: angka kecil dilayani lebih dulu
+PRIORITY_LIVE = 0 # window /ws (user sedang menunggu di depan layar)
+PRIORITY_BATCH = 1 # chunk /evaluate, re-score
+PRIORITY_NAMES = {PRIORITY_LIVE: "live", PRIORITY_BATCH: "batch"}
+
+
+def profile_priority(profile: str) -> int:
+    """Profil streaming ("stream", "stream_incremental") = live, sisanya batch."""
+    return PRIORITY_LIVE if profile.startswith("stream") else PRIORITY_BATCH
+
+
+class Overloaded(Exception):
+    """Request ditolak admission control; client sebaiknya mencoba lagi setelah retry_after detik."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Server sibuk ({reason}), coba lagi dalam {retry_after:.0f} detik")
+        self.reason = reason # queue_full / user_limit / slo / shed
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_seconds(self) -> int:
+        """Dibulatkan ke atas untuk header Retry-After / event busy."""
+        return max(1, math.ceil(self.retry_after))
+
+
+class FairQueue:
+    """
+    Antrian inferensi terbatas untuk BatchScheduler.
+    - Prioritas ketat: item live selalu diambil sebelum item batch.
+    - Di dalam satu kelas, round-robin antar user_id (satu item per user per putaran),
+      jadi user yang mengirim banyak chunk sekaligus tidak menahan user lain.
+    - max_pending: batas total item; max_per_user: batas item per user (0 = tanpa batas).
+    - Kalau penuh, item live boleh menggeser item batch terbaru milik user dengan antrian terpanjang.
+    """
+
+    def __init__(self, max_pending: int = 64, max_per_user: int = 0):
+        self.max_pending = max_pending
+        self.max_per_user = max_per_user
+
+        self._classes = {p: OrderedDict() for p in PRIORITY_NAMES} # priority -> user -> deque
+        self._per_user = defaultdict(int)
+        self._size = 0
+        self._not_empty = asyncio.Event()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def depth(self, priority: int) -> int:
+        """Jumlah item yang akan dilayani sebelum item baru dengan prioritas ini."""
+        return sum(
+            len(items) for p, users in self._classes.items() if p <= priority for items in users.values()
+        )
+
+    def _append(self, item, user: str, priority: int):
+        self._classes[priority].setdefault(user, deque()).append(item)
+        self._per_user[user] += 1
+        self._size += 1
+        self._not_empty.set()
+
+    def _remove_user_item(self, users: OrderedDict, user: str, newest: bool):
+        items = users[user]
+        item = items.pop() if newest else items.popleft()
+        if not items:
+            del users[user]
+        self._per_user[user] -= 1
+        if not self._per_user[user]:
+            del self._per_user[user]
+        self._size -= 1
+        if not self._size:
+            self._not_empty.clear()
+        return item
+
+    def put_nowait(self, item, user: str, priority: int):
+        """Melempar Overloaded("user_limit"/"queue_full") kalau item tidak bisa diterima (retry_after diisi pemanggil)."""
+        if self.max_per_user and self._per_user.get(user, 0) >= self.max_per_user:
+            raise Overloaded("user_limit", 0.0)
+        if self._size >= self.max_pending:
+            raise Overloaded("queue_full", 0.0)
+        self._append(item, user, priority)
+
+    def shed(self, below: int):
+        """Buang item terbaru dari kelas prioritas di bawah `below` (user dengan antrian terpanjang)."""
+        for priority in sorted(self._classes, reverse=True):
+            if priority <= below:
+                break
+            users = self._classes[priority]
+            if users:
+                user = max(users, key=lambda u: len(users[u]))
+                return self._remove_user_item(users, user, newest=True)
+        return None
+
+    def get_nowait(self):
+        for priority in sorted(self._classes):
+            users = self._classes[priority]
+            if users:
+                user = next(iter(users))
+                item = self._remove_user_item(users, user, newest=False)
+                if user in users:
+                    users.move_to_end(user) # Giliran user berikutnya
+                return item
+        raise asyncio.QueueEmpty
+
+    async def get(self):
+        while not self._size:
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._size,
+            "max_pending": self.max_pending,
+            "max_per_user": self.max_per_user,
+            "by_priority": {
+                PRIORITY_NAMES[p]: sum(len(items) for items in users.values()) for p, users in self._classes.items()
+            },
+            "users_waiting": len(self._per_user),
+        }
@@ -0,0 +1,363 @@
+import difflib
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------
+# SIMILARITY BACKEND
+# ------------------------------------------------
+# "difflib"   -> SequenceMatcher.ratio() seperti sebelumnya (skor identik), dengan cache
+# "rapidfuzz" -> Indel ratio bit-parallel (C++), skala 0-100 yang sama, jauh lebih cepat
+SIMILARITY_BACKEND = os.getenv("SIMILARITY_BACKEND", "difflib")
+SIMILARITY_CACHE_SIZE = int(os.getenv("SIMILARITY_CACHE_SIZE", "65536"))
+
+_rapidfuzz_ratio = None
+if SIMILARITY_BACKEND == "rapidfuzz":
+    try:
+        from rapidfuzz.fuzz import ratio as _rapidfuzz_ratio
+    except ImportError:
+        logger.info("⚠️ rapidfuzz tidak terpasang, kembali ke difflib")
+
+
+def difflib_similarity(pred: str, expected: str) -> float:
+    """Skor asli (referensi untuk benchmark)."""
+    return difflib.SequenceMatcher(None, pred, expected).ratio() * 100
+
+
+@lru_cache(maxsize=SIMILARITY_CACHE_SIZE)
+def word_similarity(pred: str, expected: str) -> float:
+    """
+    Skor kemiripan 0-100 antara kata prediksi dan kata target.
+    Pasangan kata yang sama terus berulang antar window/sesi, jadi hasilnya di-cache.
+    """
+    if pred == expected:
+        return 100.0
+    if _rapidfuzz_ratio is not None:
+        return _rapidfuzz_ratio(pred, expected)
+    return difflib_similarity(pred, expected)
+
+
+# ------------------------------------------------
+# MODE ALIGNMENT
+# ------------------------------------------------
+# "greedy"    -> scan kata demi kata dari current_index, berhenti di mismatch pertama
+# "lookahead" -> banded DP terhadap jendela target di sekitar current_index,
+#                bisa mendeteksi kata terlewat, diulang, dan sisipan dalam satu kali jalan
+ALIGNMENT_MODE = os.getenv("ALIGNMENT_MODE", "greedy")
+LOOKAHEAD_BAND = int(os.getenv("LOOKAHEAD_BAND", "8")) # jumlah kata target ke depan
+LOOKBACK_WORDS = 3 # kata sebelum current_index (untuk deteksi pengulangan)
+
+# Bobot DP (skor dimaksimalkan). Match memberi sim/100 (0.65 - 1.0)
+MISMATCH_PENALTY = 1.0
+INSERT_PENALTY = 0.5
+SKIP_PENALTY = 0.6
+
+# ------------------------------------------------
+# NORMALISASI & ALIGNMENT
+# ------------------------------------------------
+class _NormalizeTable(dict):
+    """
+    Tabel str.translate untuk normalize_arabic (satu kali scan string):
+    harakat dihapus, variasi alif/hamzah/ta marbuthah diseragamkan,
+    karakter non-Arab (selain spasi) jadi spasi.
+    Karakter yang belum ada di tabel dihitung sekali lalu di-cache.
+    """
+
+    def __missing__(self, codepoint: int):
+        ch = chr(codepoint)
+        value = codepoint if ("\u0600" <= ch <= "\u06FF" or ch.isspace()) else " "
+        self[codepoint] = value
+        return value
+
+
+# Rentang harakat sama dengan regex lama [\u0610-\u061A\u064B-\u065F\u06D6-\u06ED]
+_NORMALIZE_TABLE = _NormalizeTable()
+for _start, _end in ((0x0610, 0x061A), (0x064B, 0x065F), (0x06D6, 0x06ED)):
+    for _cp in range(_start, _end + 1):
+        _NORMALIZE_TABLE[_cp] = None
+_NORMALIZE_TABLE.update({ord(c): "ا" for c in "إأٱآ"})
+_NORMALIZE_TABLE.update({ord("ؤ"): "و", ord("ئ"): "ي", ord("ة"): "ه"})
+
+
+def normalize_arabic(text: str) -> str:
+    return " ".join(text.translate(_NORMALIZE_TABLE).split())
+
+# def normalize_arabic(text: str) -> str:
+#     if not text:
+#         return ""
+#     # Filter ketat hanya menyisakan huruf Arab dan spasi
+#     text = re.sub(r"[^\u060f\u0620-\u064a\u066e\u066f\u0671-\u06d3\u06d5\s]", "", text)
+#     return re.sub(r"\s+", " ", text).strip()
+
+def tokenize_words(text: str) -> List[str]:
+    return text.translate(_NORMALIZE_TABLE).split()
+
+
+def normalizer_fingerprint() -> str:
+    """
+    Sidik jari perilaku tokenize_words: hasil normalisasi semua karakter Latin, Arab, dan
+    bentuk presentasi Arab. Berubah setiap kali tabel / aturan normalisasi berubah, jadi token
+    yang sudah disimpan (verse index) bisa dideteksi basi.
+    """
+    probe = " ".join(
+        chr(cp) for cp in (*range(0x21, 0x0900), *range(0xFB50, 0xFF00)) if not chr(cp).isspace()
+    )
+    return hashlib.sha256("|".join(tokenize_words(probe)).encode("utf-8")).hexdigest()[:16]
+
+
+class WordAlignmentEngine:
+    def __init__(self, target_text: str, match_threshold: float, current_index: int,
+                 mode: str = None, band: int = LOOKAHEAD_BAND, target_words=None):
+        self.target_text = target_text
+        # target_words bisa diberikan dari verse index (sudah ternormalisasi)
+        self.target_words = list(target_words) if target_words is not None else tokenize_words(target_text)
+        self.match_threshold = match_threshold
+        self.current_index = current_index
+        self.last_sent = -1
+        self.mode = mode or ALIGNMENT_MODE
+        self.band = band
+
+        # Statistik mode lookahead
+        self.skipped = [] # index kata yang dilewati anak
+        self.repeated_count = 0
+        self.inserted_count = 0
+        
+        # 📊 FITUR BARU: Kamus untuk melacak jumlah salah per index kata
+        # Contoh bentuknya: {0: 0, 1: 2, 2: 0, 3: 1 ...}
+        self.word_errors = {i: 0 for i in range(len(self.target_words))}
+
+    def feed(self, asr_text: str):
+        if self.mode == "lookahead":
+            return self._feed_lookahead(asr_text)
+
+        events = []
+        original_words = asr_text.split()
+        preds = tokenize_words(asr_text)
+        
+        # Flag penanda: Apakah di dalam rekaman kali ini target utamanya sudah ketemu?
+        found_anchor = False 
+        
+        for i, p in enumerate(preds):
+            if self.current_index >= len(self.target_words): 
+                break
+            
+            expected = self.target_words[self.current_index]
+            actual_text = original_words[i] if i < len(original_words) else p
+            
+            # Hitung skor kecocokan
+            score = word_similarity(p, expected)
+            is_match = score >= self.match_threshold
+            
+            # ========================================================
+            # SKENARIO 1: Baru Memulai Ayat (current_index == 0)
+            # ========================================================
+            if self.current_index == 0:
+                if is_match:
+                    self._emit_correct(events, expected, actual_text, score)
+                    found_anchor = True
+                else:
+                    # Langsung hitung salah, kirim feedback unmatch, dan HENTIKAN proses kata selanjutnya
+                    self.word_errors[self.current_index] += 1
+                    self._emit_unmatched(events, expected, actual_text, score)
+                    break 
+
+            # ========================================================
+            # SKENARIO 2: Sedang di Tengah Hafalan (current_index > 0)
+            # ========================================================
+            else:
+                # 2A. Jika KATA TARGET BELUM KETEMU dalam rentetan ucapan ini
+                if not found_anchor:
+                    if is_match:
+                        # Alhamdulillah ketemu!
+                        found_anchor = True
+                        self._emit_correct(events, expected, actual_text, score)
+                    else:
+                        # Kata belum cocok. Kita cek apakah ini ancang-ancang?
+                        if i < (len(preds)-1):
+                            continue
+                            
+                        else:
+                            # Jika ini kata yang murni salah/ngawur, kita hitung diam-diam
+                            self.word_errors[self.current_index] += 1
+                            self._emit_unmatched(events, expected, actual_text, score)
+                            # LANJUTKAN LOOP (Continue) tanpa mengirim feedback unmatch ke Flutter
+                            break
+                
+                # 2B. Jika KATA TARGET SUDAH KETEMU (Mengecek kata ekornya)
+                else:
+                    if is_match:
+                        # Ternyata kata selanjutnya juga benar
+                        self._emit_correct(events, expected, actual_text, score)
+                    else:
+                        # Kata sambungannya salah! Hitung error, kirim unmatch, dan putus loop
+                        self.word_errors[self.current_index] += 1
+                        self._emit_unmatched(events, expected, actual_text, score)
+                        break
+
+        return events
+
+    # -----------------------------------------------------------------
+    # MODE LOOKAHEAD (Banded DP)
+    # -----------------------------------------------------------------
+
+    def _align_window(self, preds, lo, hi):
+        """
+        Semi-global alignment preds terhadap target_words[lo:hi].
+        Semua kata prediksi harus terpakai (match/sisipan), target boleh mulai & berhenti di mana saja.
+        Melewati target sebelum current_index gratis (pengulangan), setelahnya kena SKIP_PENALTY.
+        Biaya O(len(preds) * (hi - lo)), tidak tergantung panjang ayat.
+        """
+        targets = self.target_words[lo:hi]
+        n, m = len(preds), len(targets)
+        c = self.current_index - lo
+        neg = float("-inf")
+
+        score = [[neg] * (m + 1) for _ in range(n + 1)]
+        back = [[None] * (m + 1) for _ in range(n + 1)]
+        sims = [[word_similarity(p, t) for t in targets] for p in preds]
+
+        for i in range(n + 1):
+            for j in range(m + 1):
+                if i == 0 and j == 0:
+                    score[0][0] = 0.0
+                    continue
+                best, op = neg, None
+                if i > 0 and j > 0:
+                    sim = sims[i - 1][j - 1]
+                    gain = sim / 100 if sim >= self.match_threshold else -MISMATCH_PENALTY
+                    if score[i - 1][j - 1] + gain > best:
+                        best, op = score[i - 1][j - 1] + gain, "align"
+                if i > 0 and score[i - 1][j] - INSERT_PENALTY > best:
+                    best, op = score[i - 1][j] - INSERT_PENALTY, "insert"
+                if j > 0:
+                    cost = 0.0 if (j - 1) < c else SKIP_PENALTY
+                    if score[i][j - 1] - cost > best:
+                        best, op = score[i][j - 1] - cost, "skip"
+                score[i][j], back[i][j] = best, op
+
+        # Ekor target bebas: ambil kolom terbaik di baris terakhir
+        j = max(range(m + 1), key=lambda col: score[n][col])
+        i = n
+        ops = []
+        while i > 0 or j > 0:
+            op = back[i][j]
+            if op == "align":
+                ops.append(("align", i - 1, lo + j - 1, sims[i - 1][j - 1]))
+                i, j = i - 1, j - 1
+            elif op == "insert":
+                ops.append(("insert", i - 1, None, None))
+                i -= 1
+            else:
+                ops.append(("skip", None, lo + j - 1, None))
+                j -= 1
+        ops.reverse()
+        return ops
+
+    def _feed_lookahead(self, asr_text: str):
+        events = []
+        original_words = asr_text.split()
+        preds = tokenize_words(asr_text)
+        if not preds or self.current_index >= len(self.target_words):
+            return events
+
+        lo = max(0, self.current_index - LOOKBACK_WORDS)
+        hi = min(len(self.target_words), self.current_index + self.band)
+        ops = self._align_window(preds, lo, hi)
+
+        progressed = False
+        last_pred = None
+        for k, (op, i, j, sim) in enumerate(ops):
+            if op == "insert":
+                self.inserted_count += 1
+                last_pred = i
+                continue
+
+            if j < self.current_index:
+                if op == "align":
+                    self.repeated_count += 1 # Anak mengulang kata sebelumnya
+                continue
+
+            if op == "skip":
+                next_align = next((o for o in ops[k + 1:] if o[0] == "align"), None)
+                if next_align is None:
+                    break # Ekor target yang belum dibaca, bukan dilewati
+
+                if next_align[3] >= self.match_threshold:
+                    # Kata dilewati tapi kata setelahnya cocok -> catat error & lanjut
+                    self.word_errors[j] += 1
+                    self.skipped.append(j)
+                    events.append({
+                        "event": "word_skipped",
+                        "index": j,
+                        "expected": self.target_words[j],
+                        "error_count": self.word_errors[j]
+                    })
+                    self.current_index = j + 1
+                    continue
+
+                # Skip lalu salah = kata saat ini diganti kata lain, bukan dilewati
+                i = next_align[1]
+                sim = word_similarity(preds[i], self.target_words[self.current_index])
+
+            expected = self.target_words[self.current_index]
+            actual_text = original_words[i] if i < len(original_words) else preds[i]
+            if sim >= self.match_threshold:
+                self._emit_correct(events, expected, actual_text, sim)
+                progressed = True
+            else:
+                self.word_errors[self.current_index] += 1
+                self._emit_unmatched(events, expected, actual_text, sim)
+                return events
+            last_pred = i
+
+        # Tidak ada kata yang cocok sama sekali -> kata terakhir dihitung salah (sama dengan mode greedy)
+        if not progressed and last_pred is not None and self.current_index < len(self.target_words):
+            expected = self.target_words[self.current_index]
+            actual_text = original_words[last_pred] if last_pred < len(original_words) else preds[last_pred]
+            self.word_errors[self.current_index] += 1
+            self._emit_unmatched(events, expected, actual_text, word_similarity(preds[last_pred], expected))
+
+        return events
+
+    # -----------------------------------------------------------------
+    # FUNGSI HELPER (Agar loop utama di atas lebih mudah dibaca)
+    # -----------------------------------------------------------------
+    
+    def _emit_correct(self, events, expected, actual_text, score):
+        idx = self.current_index
+        self.current_index += 1
+        if idx != self.last_sent:
+            events.append({
+                "event": "word_correct",
+                "index": idx,
+                "text": actual_text,
+                "expected": expected,
+                "score": score,
+                "error_count": self.word_errors[idx]
+            })
+            self.last_sent = idx
+
+    def _emit_unmatched(self, events, expected, actual_text, score):
+        events.append({
+            "event": "word_unmatched",
+            "index": self.current_index,
+            "text": actual_text,
+            "expected": expected,
+            "score": score,
+            "error_count": self.word_errors[self.current_index]
+        })
+
+    # def _is_ancang_ancang(self, word: str) -> bool:
+    #     # Mengecek apakah kata ini ada di 5 kata sebelumnya
+    #     start_check = max(0, self.current_index - 5)
+    #     previous_words = self.target_words[start_check : self.current_index]
+        
+    #     for prev_word in previous_words:
+    #         prev_score = difflib.SequenceMatcher(None, word, prev_word).ratio() * 100
+    #         if prev_score >= self.match_threshold:
+    #             return True
+    #     return False
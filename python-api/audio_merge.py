@@ -0,0 +1,194 @@
+import logging
+import os
+from typing import List, Tuple
+
+import av
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+OUTPUT_BITRATE = 64000
+# Ukuran blok saat membaca chunk .pcm (1 detik audio 16-bit mono)
+PCM_BLOCK_BYTES = SAMPLE_RATE * 2
+
+
+# ------------------------------------------------
+# PROBE CHUNK
+# ------------------------------------------------
+def _probe(path: str) -> Tuple[str, int, int]:
+    """(codec, sample_rate, channels) dari stream audio pertama sebuah chunk."""
+    if path.endswith(".pcm"):
+        return ("pcm_s16le", SAMPLE_RATE, 1)
+    with av.open(path) as container:
+        ctx = container.streams.audio[0].codec_context
+        return (ctx.name, ctx.sample_rate, ctx.layout.nb_channels)
+
+
+# ------------------------------------------------
+# JALUR 1: REMUX TANPA TRANSCODE
+# ------------------------------------------------
+def _remux(chunk_files: List[str], output_path: str):
+    """
+    Paket AAC dari setiap chunk langsung disalin ke satu container mp4,
+    timestamp digeser sebesar durasi chunk sebelumnya. Tidak ada decode/encode.
+    """
+    with av.open(output_path, "w", format="mp4") as out:
+        out_stream = None
+        offset = None # detik, posisi akhir chunk sebelumnya
+
+        for path in chunk_files:
+            with av.open(path) as src:
+                in_stream = src.streams.audio[0]
+                if out_stream is None:
+                    out_stream = out.add_stream_from_template(in_stream)
+
+                shift = None
+                chunk_end = None
+                for packet in src.demux(in_stream):
+                    if packet.dts is None:
+                        continue # Paket flush penanda akhir stream
+                    if shift is None:
+                        # Paket pertama (termasuk priming encoder) menempel di akhir chunk sebelumnya
+                        shift = 0 if offset is None else int(round(offset / in_stream.time_base)) - packet.dts
+                    packet.pts += shift
+                    packet.dts += shift
+                    end = packet.pts + (packet.duration or 0)
+                    chunk_end = end if chunk_end is None else max(chunk_end, end)
+                    packet.stream = out_stream
+                    out.mux(packet)
+
+                if chunk_end is not None:
+                    offset = float(chunk_end * in_stream.time_base)
+
+
+# ------------------------------------------------
+# JALUR 2: SATU ENCODER UNTUK SEMUA CHUNK
+# ------------------------------------------------
+def _pcm_frames(path: str):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(PCM_BLOCK_BYTES)
+            if len(block) < 2:
+                break
+            samples = np.frombuffer(block[:len(block) // 2 * 2], dtype=np.int16).reshape(1, -1)
+            frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+            frame.sample_rate = SAMPLE_RATE
+            yield frame
+
+
+def _decoded_frames(path: str):
+    if path.endswith(".pcm"):
+        yield from _pcm_frames(path)
+        return
+    with av.open(path) as src:
+        yield from src.decode(audio=0)
+
+
+def _encode(chunk_files: List[str], output_path: str, sample_rate: int, channels: int,
+            bit_rate: int = OUTPUT_BITRATE):
+    """
+    Decode chunk satu per satu (frame demi frame) dan alirkan ke satu encoder AAC.
+    Memori hanya sebesar beberapa frame, berapa pun panjang bacaannya.
+    """
+    layout = "stereo" if channels > 1 else "mono"
+    with av.open(output_path, "w", format="mp4") as out:
+        stream = out.add_stream("aac", rate=sample_rate)
+        stream.layout = layout
+        stream.bit_rate = bit_rate
+        frame_size = stream.codec_context.frame_size or 1024
+
+        fifo = av.AudioFifo()
+        written = 0
+
+        def drain(final: bool = False):
+            nonlocal written
+            while fifo.samples >= frame_size or (final and fifo.samples):
+                frame = fifo.read(min(frame_size, fifo.samples))
+                frame.pts = written
+                written += frame.samples
+                for packet in stream.encode(frame):
+                    out.mux(packet)
+
+        for path in chunk_files:
+            # Resampler per chunk karena format input bisa berbeda (aac / pcm)
+            resampler = av.AudioResampler(format="fltp", layout=layout, rate=sample_rate)
+            for frame in _decoded_frames(path):
+                frame.pts = None
+                for resampled in resampler.resample(frame):
+                    resampled.pts = None # Timeline baru ditentukan oleh fifo
+                    fifo.write(resampled)
+                drain()
+            for resampled in resampler.resample(None):
+                resampled.pts = None
+                fifo.write(resampled)
+
+        drain(final=True)
+        for packet in stream.encode(None):
+            out.mux(packet)
+
+
+# ------------------------------------------------
+# API
+# ------------------------------------------------
+def merge_chunks(chunk_files: List[str], output_path: str) -> str:
+    """
+    Gabungkan chunk (.m4a / .pcm) berurutan ke satu file .m4a.
+    Kalau semua chunk AAC dengan sample rate & channel yang sama -> remux ("copy"),
+    selain itu di-encode ulang lewat satu encoder ("encode").
+    File ditulis ke path sementara lalu di-rename, jadi tidak pernah ada file setengah jadi.
+    Dipanggil dari thread executor (blocking).
+    """
+    probes = [_probe(path) for path in chunk_files]
+    tmp_path = output_path + ".tmp"
+
+    try:
+        mode = None
+        if len(set(probes)) == 1 and probes[0][0] == "aac":
+            try:
+                _remux(chunk_files, tmp_path)
+                mode = "copy"
+            except (av.error.FFmpegError, ValueError, AttributeError) as e:
+                # AttributeError: PyAV < 14 belum punya add_stream_from_template
+                logger.info(f"⚠️ Remux gagal ({e}), encode ulang")
+
+        if mode is None:
+            # Sama seperti pydub: sample rate & channel mengikuti chunk tertinggi
+            mode = "encode"
+            _encode(chunk_files, tmp_path, max(p[1] for p in probes), max(p[2] for p in probes))
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return mode
+
+
+def compact_recording(path: str, bit_rate: int) -> int:
+    """
+    Encode ulang rekaman .m4a yang sudah selesai ke bitrate lebih rendah (mono), nama file
+    dan mtime tetap. Rekaman yang bitrate-nya sudah <= bit_rate (+25%) dilewati. File hanya
+    diganti kalau hasilnya lebih kecil dan tidak ditimpa rekaman baru selama encode.
+    Mengembalikan jumlah byte yang dihemat (0 = tidak diubah). Dipanggil dari thread (blocking).
+    """
+    before = os.stat(path)
+    with av.open(path) as src:
+        stream = src.streams.audio[0]
+        current = stream.codec_context.bit_rate or stream.bit_rate or 0
+        sample_rate = stream.codec_context.sample_rate
+    if current and current <= bit_rate * 1.25:
+        return 0
+
+    # Akhiran berbeda dari merge_chunks (path + ".tmp") supaya tidak bertabrakan dengan /finish
+    tmp_path = path + ".compact.tmp"
+    try:
+        _encode([path], tmp_path, sample_rate, 1, bit_rate=bit_rate)
+        saved = before.st_size - os.path.getsize(tmp_path)
+        if saved <= 0 or os.stat(path).st_mtime_ns != before.st_mtime_ns:
+            return 0
+        os.utime(tmp_path, ns=(before.st_atime_ns, before.st_mtime_ns))
+        os.replace(tmp_path, path)
+        return saved
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,70 @@
+"""
+Benchmark skor kemiripan kata di WordAlignmentEngine.feed.
+
+Memastikan backend baru menghasilkan skor yang sama dengan difflib.SequenceMatcher
+lalu membandingkan kecepatannya (per pasangan kata dan per panggilan feed).
+
+    python benchmarks/bench_alignment.py
+    SIMILARITY_BACKEND=rapidfuzz python benchmarks/bench_alignment.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import alignment  # noqa: E402
+from alignment import WordAlignmentEngine, difflib_similarity, tokenize_words, word_similarity  # noqa: E402
+from corpus import VERSES, asr_like  # noqa: E402
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return time.perf_counter() - start
+
+
+def main():
+    rng = random.Random(0)
+    pairs = []
+    for text in VERSES.values():
+        targets = tokenize_words(text)
+        for _ in range(50):
+            preds = tokenize_words(asr_like(text, rng))
+            pairs.extend(zip(preds, targets))
+
+    # 1. Kecocokan skor
+    mismatches = [(p, t) for p, t in pairs if abs(word_similarity(p, t) - difflib_similarity(p, t)) > 1e-9]
+    backend = "rapidfuzz" if alignment._rapidfuzz_ratio else "difflib"
+    print(f"backend={backend} pasangan={len(pairs)} skor berbeda={len(mismatches)}")
+    for p, t in mismatches[:5]:
+        print(f"  {p} / {t}: difflib={difflib_similarity(p, t):.2f} baru={word_similarity(p, t):.2f}")
+
+    # 2. Kecepatan per pasangan (cache dingin vs hangat)
+    old = timed(lambda: [difflib_similarity(p, t) for p, t in pairs], 5)
+    word_similarity.cache_clear()
+    cold = timed(lambda: [word_similarity(p, t) for p, t in pairs], 1) * 5
+    warm = timed(lambda: [word_similarity(p, t) for p, t in pairs], 5)
+    print(f"difflib : {old * 1e6 / (5 * len(pairs)):.2f} us/pasangan")
+    print(f"baru    : {cold * 1e6 / (5 * len(pairs)):.2f} us/pasangan (cache dingin), "
+          f"{warm * 1e6 / (5 * len(pairs)):.2f} us/pasangan (cache hangat)")
+
+    # 3. End-to-end feed
+    sessions = [(text, asr_like(text, rng)) for text in VERSES.values() for _ in range(20)]
+
+    def run_feed():
+        for target, asr in sessions:
+            WordAlignmentEngine(target, 65.0, 0).feed(asr)
+
+    new_feed = timed(run_feed, 5)
+    alignment.word_similarity = difflib_similarity
+    try:
+        old_feed = timed(run_feed, 5)
+    finally:
+        alignment.word_similarity = word_similarity
+    print(f"feed lama: {old_feed:.3f}s | feed baru: {new_feed:.3f}s | speedup {old_feed / new_feed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Bandingkan throughput jalur serial (model.transcribe per klip) dengan micro-batching,
+dan pastikan teks hasil kedua jalur sama (setelah normalisasi). Exit code 1 kalau porsi klip
+yang sama di bawah --min-parity. Klip noise sintetis bisa memicu fallback sampling (acak);
+untuk cek paritas yang ketat pakai rekaman nyata (--audio).
+
+Contoh:
+    python benchmarks/bench_batching.py --clips 16 --batch 8
+    python benchmarks/bench_batching.py --audio rekaman1.m4a rekaman2.m4a --profile file
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from alignment import normalize_arabic  # noqa: E402
+from inference import SAMPLE_RATE, transcribe_batch, transcribe_single  # noqa: E402
+
+PROMPT = "بسم الله الرحمن الرحيم"
+
+
+def synthetic_clips(n: int, seconds: float):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    clips = []
+    for _ in range(n):
+        # Nada bervariasi + noise agar VAD & decoder punya sesuatu untuk diproses
+        freq = rng.uniform(120, 300)
+        clip = 0.3 * np.sin(2 * np.pi * freq * t) + 0.05 * rng.standard_normal(len(t))
+        clips.append(clip.astype(np.float32))
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clips", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=1.6)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--profile", default="stream", choices=["stream", "file"])
+    parser.add_argument("--audio", nargs="*", help="File audio nyata (opsional)")
+    parser.add_argument("--min-parity", type=float, default=1.0, help="Porsi minimal klip dengan teks sama")
+    args = parser.parse_args()
+
+    model = WhisperModel(args.model, device="cpu", compute_type="int8", cpu_threads=args.threads, num_workers=1)
+
+    if args.audio:
+        clips = [decode_audio(p, sampling_rate=SAMPLE_RATE) for p in args.audio]
+    else:
+        clips = synthetic_clips(args.clips, args.seconds)
+
+    # Pemanasan agar waktu load kernel tidak ikut terhitung
+    transcribe_single(model, clips[0], PROMPT, args.profile)
+
+    start = time.perf_counter()
+    serial_texts = [transcribe_single(model, clip, PROMPT, args.profile) for clip in clips]
+    serial = time.perf_counter() - start
+
+    batched_texts = []
+    start = time.perf_counter()
+    for i in range(0, len(clips), args.batch):
+        part = clips[i:i + args.batch]
+        batched_texts.extend(transcribe_batch(model, part, [PROMPT] * len(part), args.profile))
+    batched = time.perf_counter() - start
+
+    print(f"clips={len(clips)} profile={args.profile} batch={args.batch}")
+    print(f"serial : {serial:.3f}s  ({len(clips) / serial:.2f} klip/detik)")
+    print(f"batched: {batched:.3f}s  ({len(clips) / batched:.2f} klip/detik)")
+    print(f"speedup: {serial / batched:.2f}x")
+
+    mismatches = [
+        (i, a, b) for i, (a, b) in enumerate(zip(serial_texts, batched_texts))
+        if normalize_arabic(a).split() != normalize_arabic(b).split()
+    ]
+    parity = 1 - len(mismatches) / len(clips)
+    print(f"parity : {parity:.0%} ({len(clips) - len(mismatches)}/{len(clips)} klip sama)")
+    for i, a, b in mismatches:
+        print(f"  klip {i}: serial='{a}' | batched='{b}'")
+    if parity < args.min_parity:
+        sys.exit(f"❌ Paritas {parity:.0%} < {args.min_parity:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Uji kesetaraan & microbenchmark normalize_arabic (tabel str.translate)
+terhadap implementasi regex lama (tests/regex_reference.py, dipakai juga oleh tests/test_alignment.py).
+
+Kesetaraan dicek pada seluruh teks di verse index (kalau ada), korpus benchmark,
+dan string acak (huruf Arab, harakat, Latin, angka, spasi Unicode).
+Keluar dengan kode 1 kalau ada perbedaan.
+
+    python benchmarks/bench_normalizer.py
+    python benchmarks/bench_normalizer.py --index data/quran_index.json.gz
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+from alignment import normalize_arabic, tokenize_words  # noqa: E402
+from corpus import VERSES  # noqa: E402
+from regex_reference import normalize_arabic_regex, tokenize_words_regex  # noqa: E402
+from verse_index import VerseIndex  # noqa: E402
+
+
+def random_texts(n: int, rng: random.Random):
+    pool = (
+        [chr(c) for c in range(0x0600, 0x0700)]
+        + list("abcXYZ0123456789.,!?-()")
+        + [" ", "  ", "\t", "\n", "\u00a0", "\u2003", "\u200b", "\ufeff"]
+        + [chr(c) for c in range(0x08A0, 0x08B0)] + ["\ufdf2", "\ufe8e"]
+    )
+    return ["".join(rng.choice(pool) for _ in range(rng.randint(0, 60))) for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default=os.path.join(ROOT, "data", "quran_index.json.gz"))
+    parser.add_argument("--random", type=int, default=20000)
+    args = parser.parse_args()
+
+    index = VerseIndex.load(args.index)
+    texts = [v.text for v in index.verses.values()] + list(VERSES.values())
+    texts += random_texts(args.random, random.Random(0))
+    print(f"teks diuji: {len(texts)} ({len(index)} dari verse index)")
+
+    diffs = [t for t in texts if normalize_arabic(t) != normalize_arabic_regex(t)
+             or tokenize_words(t) != tokenize_words_regex(t)]
+    print(f"berbeda: {len(diffs)}")
+    for t in diffs[:5]:
+        print(f"  {t!r}: lama={normalize_arabic_regex(t)!r} baru={normalize_arabic(t)!r}")
+
+    sample = texts[:5000]
+    for name, fn in (("regex", tokenize_words_regex), ("translate", tokenize_words)):
+        start = time.perf_counter()
+        for _ in range(5):
+            for t in sample:
+                fn(t)
+        elapsed = time.perf_counter() - start
+        print(f"{name:9s}: {elapsed * 1e6 / (5 * len(sample)):.2f} us/teks")
+
+    sys.exit(1 if diffs else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Korpus kecil teks target untuk benchmark (Al-Fatihah & Al-Ikhlas)."""
+import random
+
+VERSES = {
+    "1:1": "بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ",
+    "1:2": "ٱلْحَمْدُ لِلَّهِ رَبِّ ٱلْعَٰلَمِينَ",
+    "1:3": "ٱلرَّحْمَٰنِ ٱلرَّحِيمِ",
+    "1:4": "مَٰلِكِ يَوْمِ ٱلدِّينِ",
+    "1:5": "إِيَّاكَ نَعْبُدُ وَإِيَّاكَ نَسْتَعِينُ",
+    "1:6": "ٱهْدِنَا ٱلصِّرَٰطَ ٱلْمُسْتَقِيمَ",
+    "1:7": "صِرَٰطَ ٱلَّذِينَ أَنْعَمْتَ عَلَيْهِمْ غَيْرِ ٱلْمَغْضُوبِ عَلَيْهِمْ وَلَا ٱلضَّآلِّينَ",
+    "112:1": "قُلْ هُوَ ٱللَّهُ أَحَدٌ",
+    "112:2": "ٱللَّهُ ٱلصَّمَدُ",
+    "112:3": "لَمْ يَلِدْ وَلَمْ يُولَدْ",
+    "112:4": "وَلَمْ يَكُن لَّهُۥ كُفُوًا أَحَدٌۢ",
+}
+
+
+def perturb_word(word: str, rng: random.Random) -> str:
+    """Simulasi kesalahan ASR: hapus / ganti / sisip satu huruf."""
+    if len(word) < 2:
+        return word
+    i = rng.randrange(len(word))
+    op = rng.choice(("drop", "swap", "insert", "keep"))
+    if op == "drop":
+        return word[:i] + word[i + 1:]
+    if op == "swap":
+        return word[:i] + rng.choice("ابتثجحخدذرزسشصضطظعغفقكلمنهوي") + word[i + 1:]
+    if op == "insert":
+        return word[:i] + rng.choice("اوي") + word[i:]
+    return word
+
+
+def asr_like(text: str, rng: random.Random) -> str:
+    """Teks mirip keluaran ASR dari teks target (beberapa kata salah eja)."""
+    return " ".join(perturb_word(w, rng) for w in text.split())
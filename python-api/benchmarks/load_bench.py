@@ -0,0 +1,599 @@
+"""
+Load test end-to-end python-api: N streamer /ws dan M uploader /evaluate bersamaan
+terhadap server lokal, supaya setiap perubahan konfigurasi (WINDOW_SECONDS,
+OVERLAP_SECONDS, beam size, AI_THREADS, lebar executor, ...) bisa diukur.
+
+Yang dilaporkan:
+- Latensi p50/p95/p99: jeda kata /ws (audio kata selesai dikirim -> event kata diterima),
+  finish /ws, init /ws, chunk /evaluate, /finish.
+- Throughput: detik audio per detik wall-clock, request /evaluate per detik.
+- CPU & RSS proses server (termasuk proses worker anak).
+- Akurasi event kata terhadap target (rekaman dianggap bacaan yang benar):
+  kata word_correct / jumlah kata target, plus jumlah word_unmatched & word_skipped.
+
+Korpus:
+- Default: sinyal sintetis per ayat (satu "ledakan" nada per kata) dengan batas kata
+  yang diketahui persis. Cocok untuk latensi & kapasitas; akurasi tidak bermakna
+  karena Whisper tidak mendengar kata sungguhan.
+- --corpus DIR: rekaman bacaan (wav/m4a/mp3/...). Target dari DIR/manifest.json
+  ({"file.m4a": "1:1"} atau {"file.m4a": {"key": "1:1", "text": "...", "word_ends": [..]}}),
+  kalau tidak ada dari nama file ("1_1.m4a" -> key "1:1", teks dari corpus.VERSES /
+  verse index server). Tanpa word_ends, batas kata diperkirakan rata di bagian bersuara.
+
+Contoh:
+    # Server sudah jalan di localhost:8000
+    python benchmarks/load_bench.py --ws 4 --evaluate 4 --duration 60 --server-pid 1234
+
+    # Jalankan server sendiri dengan konfigurasi tertentu lalu simpan hasil JSON
+    python benchmarks/load_bench.py --spawn --env WINDOW_SECONDS=3.0 --env OVERLAP_SECONDS=1.0 \\
+        --ws 8 --evaluate 0 --duration 120 --out hasil/window3.json
+
+    python benchmarks/load_bench.py --corpus rekaman/ --ws 2 --evaluate 2 --label beam1 \\
+        --spawn --env FILE_BEAM_SIZE=1
+
+Dependensi tambahan: lihat benchmarks/requirements.txt (psutil opsional).
+Catatan: setiap sesi yang selesai ikut disimpan server ke STORAGE_PATH seperti sesi asli.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+try:
+    import psutil
+except ImportError:  # Fallback ke /proc (Linux)
+    psutil = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from alignment import tokenize_words  # noqa: E402
+from corpus import VERSES  # noqa: E402
+
+SAMPLE_RATE = 16000
+WORD_EVENTS = ("word_correct", "word_unmatched", "word_skipped")
+AUDIO_EXTENSIONS = (".wav", ".m4a", ".mp3", ".ogg", ".opus", ".flac", ".webm")
+
+
+# ------------------------------------------------
+# KORPUS
+# ------------------------------------------------
+@dataclass
+class Clip:
+    key: str
+    text: Optional[str]  # None = target diambil server dari verse index
+    pcm: np.ndarray  # int16 mono 16 kHz
+    word_ends: Optional[List[float]]  # detik; None = diperkirakan setelah target_len diketahui
+    source: str = "synthetic"
+
+    @property
+    def seconds(self) -> float:
+        return len(self.pcm) / SAMPLE_RATE
+
+
+def synthetic_clip(key: str, text: str, rng: np.random.Generator) -> Clip:
+    """Satu nada ber-modulasi per kata + jeda hening, batas kata diketahui."""
+    parts = [np.zeros(int(0.3 * SAMPLE_RATE), np.float32)]
+    word_ends = []
+    position = len(parts[0])
+    for _ in tokenize_words(text):
+        n = int(rng.uniform(0.35, 0.6) * SAMPLE_RATE)
+        t = np.arange(n) / SAMPLE_RATE
+        freq = rng.uniform(120, 260)
+        envelope = np.sin(np.pi * np.arange(n) / n) * (0.6 + 0.4 * np.sin(2 * np.pi * 5 * t))
+        word = 0.3 * envelope * (np.sin(2 * np.pi * freq * t) + 0.5 * np.sin(4 * np.pi * freq * t))
+        word += 0.01 * rng.standard_normal(n)
+        gap = np.zeros(int(rng.uniform(0.1, 0.25) * SAMPLE_RATE), np.float32)
+        parts.extend([word.astype(np.float32), gap])
+        position += n
+        word_ends.append(position / SAMPLE_RATE)
+        position += len(gap)
+    parts.append(np.zeros(int(0.3 * SAMPLE_RATE), np.float32))
+    audio = np.concatenate(parts)
+    return Clip(key, text, (np.clip(audio, -1, 1) * 32767).astype(np.int16), word_ends)
+
+
+def load_corpus(path: str) -> List[Clip]:
+    from faster_whisper.audio import decode_audio
+
+    manifest = {}
+    manifest_path = os.path.join(path, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    clips = []
+    for name in sorted(os.listdir(path)):
+        if not name.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        entry = manifest.get(name, os.path.splitext(name)[0].replace("_", ":"))
+        if isinstance(entry, str):
+            entry = {"key": entry}
+        key = entry["key"]
+        audio = decode_audio(os.path.join(path, name), sampling_rate=SAMPLE_RATE)
+        clips.append(Clip(
+            key, entry.get("text", VERSES.get(key)),
+            (np.clip(audio, -1, 1) * 32767).astype(np.int16),
+            entry.get("word_ends"), source=name,
+        ))
+    if not clips:
+        raise SystemExit(f"Tidak ada file audio di {path}")
+    return clips
+
+
+def estimate_word_ends(clip: Clip, target_len: int, threshold: float = 0.015) -> List[float]:
+    """Bagi bagian bersuara (RMS frame 20 ms > threshold) rata ke setiap kata."""
+    frame = SAMPLE_RATE // 50
+    n = len(clip.pcm) // frame
+    rms = np.sqrt(np.mean((clip.pcm[:n * frame].reshape(n, frame) / 32768.0) ** 2, axis=1))
+    voiced = np.flatnonzero(rms > threshold)
+    start, end = (voiced[0], voiced[-1] + 1) if len(voiced) else (0, n)
+    start, end = start * frame / SAMPLE_RATE, end * frame / SAMPLE_RATE
+    return [start + (end - start) * (i + 1) / target_len for i in range(target_len)]
+
+
+def dithered(pcm: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Ubah LSB acak agar hash audio berbeda tiap iterasi (tidak kena cache hasil /evaluate)."""
+    noise = rng.integers(-1, 2, size=len(pcm), dtype=np.int16)
+    return np.clip(pcm.astype(np.int32) + noise, -32768, 32767).astype(np.int16)
+
+
+def encode_m4a(pcm: np.ndarray) -> bytes:
+    import av
+
+    buf = io.BytesIO()
+    with av.open(buf, mode="w", format="mp4") as container:
+        stream = container.add_stream("aac", rate=SAMPLE_RATE)
+        stream.layout = "mono"
+        for i in range(0, len(pcm), 1024):
+            frame = av.AudioFrame.from_ndarray(pcm[i:i + 1024].reshape(1, -1), format="s16", layout="mono")
+            frame.sample_rate = SAMPLE_RATE
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buf.getvalue()
+
+
+# ------------------------------------------------
+# PENCATAT HASIL
+# ------------------------------------------------
+@dataclass
+class Recorder:
+    latencies: dict = field(default_factory=dict)  # nama -> [detik]
+    counters: dict = field(default_factory=dict)
+    accuracy: dict = field(default_factory=dict)  # "ws" / "evaluate" -> {target, correct, unmatched, skipped}
+    audio_seconds: float = 0.0
+
+    def latency(self, name: str, seconds: float):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def score(self, path: str, target_len: int, events: List[dict]):
+        acc = self.accuracy.setdefault(path, {"target_words": 0, "correct": 0, "unmatched": 0, "skipped": 0})
+        acc["target_words"] += target_len
+        acc["correct"] += len({ev["index"] for ev in events if ev["event"] == "word_correct"})
+        acc["unmatched"] += sum(ev["event"] == "word_unmatched" for ev in events)
+        acc["skipped"] += sum(ev["event"] == "word_skipped" for ev in events)
+
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000
+    return {
+        "count": len(ms),
+        "p50": round(float(np.percentile(ms, 50)), 1),
+        "p95": round(float(np.percentile(ms, 95)), 1),
+        "p99": round(float(np.percentile(ms, 99)), 1),
+        "max": round(float(ms.max()), 1),
+        "mean": round(float(ms.mean()), 1),
+    }
+
+
+# ------------------------------------------------
+# CPU & RSS SERVER
+# ------------------------------------------------
+class ResourceSampler:
+    """Sampling CPU (detik CPU / detik wall, >100% = lebih dari satu core) & RSS proses + anak."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (cpu_percent, rss_bytes)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _tree(self) -> List[int]:
+        if psutil is not None:
+            proc = psutil.Process(self.pid)
+            return [self.pid] + [p.pid for p in proc.children(recursive=True)]
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        parents.setdefault(int(f.read().rsplit(")", 1)[1].split()[1]), []).append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    pass
+        pids, todo = [], [self.pid]
+        while todo:
+            pid = todo.pop()
+            pids.append(pid)
+            todo.extend(parents.get(pid, []))
+        return pids
+
+    @staticmethod
+    def _usage(pid: int):
+        """(detik CPU kumulatif, RSS byte) satu proses."""
+        if psutil is not None:
+            proc = psutil.Process(pid)
+            times = proc.cpu_times()
+            return times.user + times.system, proc.memory_info().rss
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        ticks = os.sysconf("SC_CLK_TCK")
+        return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+    def _total(self):
+        cpu, rss = 0.0, 0
+        for pid in self._tree():
+            try:
+                c, r = self._usage(pid)
+            except Exception:
+                continue  # Proses anak bisa keluar di tengah sampling
+            cpu += c
+            rss += r
+        return cpu, rss
+
+    def _loop(self):
+        last_cpu, _ = self._total()
+        last_t = time.monotonic()
+        while not self._stop.wait(self.interval):
+            cpu, rss = self._total()
+            now = time.monotonic()
+            self.samples.append((100.0 * max(0.0, cpu - last_cpu) / (now - last_t), rss))
+            last_cpu, last_t = cpu, now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        if not self.samples:
+            return {}
+        cpu = [c for c, _ in self.samples]
+        rss = [r for _, r in self.samples]
+        return {
+            "cpu_percent_mean": round(float(np.mean(cpu)), 1),
+            "cpu_percent_p95": round(float(np.percentile(cpu, 95)), 1),
+            "rss_mb_mean": round(float(np.mean(rss)) / 2**20, 1),
+            "rss_mb_max": round(max(rss) / 2**20, 1),
+            "samples": len(self.samples),
+        }
+
+
+# ------------------------------------------------
+# CLIENT /ws
+# ------------------------------------------------
+async def pace(start: float, audio_seconds: float, speed: float):
+    """Tunggu sampai audio_seconds pertama 'terekam' (speed 0 = tanpa jeda)."""
+    if speed > 0:
+        delay = start + audio_seconds / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def ws_session(ws_url: str, user_id: str, clip: Clip, args, rec: Recorder):
+    frame_samples = int(SAMPLE_RATE * args.frame_ms / 1000)
+    init = {"user_id": user_id, "key": clip.key, "threshold": args.threshold}
+    if clip.text:
+        init["target_text"] = clip.text
+    if args.decoding:
+        init["decoding"] = args.decoding
+
+    connect_start = time.monotonic()
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        await ws.send(json.dumps(init))
+        reply = json.loads(await ws.recv())
+        if reply.get("event") != "init_ok":
+            rec.count("ws_init_error")
+            return
+        rec.latency("ws_init", time.monotonic() - connect_start)
+        target_len = reply["target_len"]
+        word_ends = clip.word_ends or estimate_word_ends(clip, target_len)
+
+        events = []  # (arrival, event)
+
+        async def receive():
+            try:
+                async for message in ws:
+                    if isinstance(message, str):
+                        events.append((time.monotonic(), json.loads(message)))
+            except websockets.ConnectionClosed:
+                pass  # Server mengakhiri koneksi setelah finish tanpa close frame
+
+        receiver = asyncio.create_task(receive())
+        sent_at = []  # waktu kirim per frame
+        start = time.monotonic()
+        for i in range(0, len(clip.pcm), frame_samples):
+            frame = clip.pcm[i:i + frame_samples]
+            await pace(start, (i + len(frame)) / SAMPLE_RATE, args.speed)
+            await ws.send(frame.tobytes())
+            sent_at.append(time.monotonic())
+
+        finish_start = time.monotonic()
+        await ws.send(json.dumps({"event": "finish"}))
+        try:
+            await asyncio.wait_for(receiver, timeout=args.finish_timeout)
+            rec.latency("ws_finish", time.monotonic() - finish_start)
+        except asyncio.TimeoutError:
+            rec.count("ws_finish_timeout")
+
+    word_events = [ev for _, ev in events if ev.get("event") in WORD_EVENTS]
+    seen = set()
+    for arrival, ev in events:
+        index = ev.get("index")
+        if ev.get("event") not in WORD_EVENTS or index in seen or index >= len(word_ends):
+            continue
+        seen.add(index)
+        frame_index = min(len(sent_at) - 1, max(0, int(np.ceil(word_ends[index] * SAMPLE_RATE / frame_samples)) - 1))
+        rec.latency("ws_word_lag", arrival - sent_at[frame_index])
+    rec.count("ws_sessions")
+    rec.count("ws_partials", sum(ev.get("event") == "transcript_partial" for _, ev in events))
+    rec.score("ws", target_len, word_events)
+    rec.audio_seconds += clip.seconds
+
+
+# ------------------------------------------------
+# CLIENT /evaluate
+# ------------------------------------------------
+async def evaluate_session(client: httpx.AsyncClient, user_id: str, clip: Clip, args, rec: Recorder,
+                           rng: np.random.Generator):
+    pcm = clip.pcm if args.allow_cache_hits else dithered(clip.pcm, rng)
+    chunk_samples = int(SAMPLE_RATE * args.chunk_seconds)
+    current_index = 0
+    target_len = len(tokenize_words(clip.text)) if clip.text else None
+    events = []
+
+    start = time.monotonic()
+    for chunk_index, i in enumerate(range(0, len(pcm), chunk_samples)):
+        chunk = pcm[i:i + chunk_samples]
+        # Client baru mengirim chunk setelah chunk itu selesai direkam
+        await pace(start, (i + len(chunk)) / SAMPLE_RATE, args.speed)
+        if args.evaluate_format == "m4a":
+            payload = await asyncio.to_thread(encode_m4a, chunk)
+        else:
+            payload = chunk.tobytes()
+
+        data = {
+            "user_id": user_id, "key": clip.key, "threshold": str(args.threshold),
+            "chunk_index": str(chunk_index), "current_index": str(current_index),
+            "audio_format": args.evaluate_format,
+        }
+        if clip.text:
+            data["target_text"] = clip.text
+        request_start = time.monotonic()
+        try:
+            response = await client.post("/evaluate", data=data, files={"audio": (f"chunk.{args.evaluate_format}", payload)})
+        except httpx.HTTPError:
+            rec.count("evaluate_transport_error")
+            continue
+        rec.latency("evaluate_chunk", time.monotonic() - request_start)
+
+        if response.status_code != 200:
+            rec.count(f"evaluate_http_{response.status_code}")
+            continue
+        body = response.json()
+        if body.get("status") != "success":
+            rec.count("evaluate_error")
+            continue
+        rec.count("evaluate_ok")
+        rec.count("evaluate_cached", int(bool(body.get("cached"))))
+        if target_len is None:
+            target_len = len(tokenize_words(body["target_text"]))
+        for ev in body["details"]:
+            events.append(ev)
+            if ev["event"] in ("word_correct", "word_skipped"):
+                current_index = max(current_index, ev["index"] + 1)
+
+    finish_start = time.monotonic()
+    response = await client.post("/finish", data={"user_id": user_id, "key": clip.key})
+    if response.status_code == 200:
+        rec.latency("evaluate_finish", time.monotonic() - finish_start)
+    else:
+        rec.count(f"finish_http_{response.status_code}")
+    rec.count("evaluate_sessions")
+    if target_len:
+        rec.score("evaluate", target_len, events)
+    rec.audio_seconds += clip.seconds
+
+
+# ------------------------------------------------
+# ORKESTRASI
+# ------------------------------------------------
+async def run_client(kind: str, idx: int, clips: List[Clip], args, rec: Recorder, deadline: float,
+                     client: httpx.AsyncClient, ws_url: str):
+    rng = random.Random(args.seed * 1000 + idx + (0 if kind == "ws" else 500))
+    np_rng = np.random.default_rng(args.seed * 1000 + idx)
+    await asyncio.sleep(args.ramp * idx / max(1, args.ws + args.evaluate))
+    user_id = f"bench-{kind}-{idx}"
+    while time.monotonic() < deadline:
+        clip = rng.choice(clips)
+        try:
+            if kind == "ws":
+                await ws_session(ws_url, user_id, clip, args, rec)
+            else:
+                await evaluate_session(client, user_id, clip, args, rec, np_rng)
+        except (OSError, websockets.WebSocketException, httpx.HTTPError) as e:
+            rec.count(f"{kind}_session_error")
+            print(f"⚠️ {user_id}: {e}", file=sys.stderr)
+            await asyncio.sleep(1.0)
+
+
+async def run_load(args, clips: List[Clip]) -> dict:
+    ws_url = args.url.replace("http", "ws", 1).rstrip("/") + "/ws"
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.evaluate + 4)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.request_timeout, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        tasks = [run_client("ws", i, clips, args, rec, deadline, client, ws_url) for i in range(args.ws)]
+        tasks += [run_client("evaluate", i, clips, args, rec, deadline, client, ws_url) for i in range(args.evaluate)]
+        await asyncio.gather(*tasks)
+        wall = time.monotonic() - started
+
+        server_stats = {}
+        for path in ("/inference/stats", "/persistence/stats"):
+            try:
+                server_stats[path] = (await client.get(path)).json()
+            except (httpx.HTTPError, ValueError):
+                pass
+
+    accuracy = {}
+    for path, acc in rec.accuracy.items():
+        accuracy[path] = dict(acc, word_accuracy=round(acc["correct"] / acc["target_words"], 4) if acc["target_words"] else None)
+    return {
+        "wall_seconds": round(wall, 2),
+        "audio_seconds": round(rec.audio_seconds, 2),
+        "audio_seconds_per_second": round(rec.audio_seconds / wall, 3),
+        "evaluate_requests_per_second": round(len(rec.latencies.get("evaluate_chunk", [])) / wall, 3),
+        "latency_ms": {name: percentiles(values) for name, values in sorted(rec.latencies.items())},
+        "counters": dict(sorted(rec.counters.items())),
+        "accuracy": accuracy,
+        "server_stats": server_stats,
+    }
+
+
+def spawn_server(args) -> subprocess.Popen:
+    env = dict(os.environ)
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    port = args.url.rsplit(":", 1)[-1].strip("/")
+    log = open(args.server_log, "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", port],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + args.ready_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server berhenti (exit {proc.returncode}), lihat {args.server_log}")
+        try:
+            if httpx.get(args.url.rstrip("/") + "/readyz", timeout=2).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit(f"Server tidak siap dalam {args.ready_timeout} detik, lihat {args.server_log}")
+
+
+def print_report(result: dict):
+    print(f"\n== {result['label'] or 'hasil'} ({result['config']['ws']} ws, {result['config']['evaluate']} evaluate, "
+          f"{result['wall_seconds']} detik) ==")
+    print(f"{'latensi (ms)':<18}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, p in result["latency_ms"].items():
+        if p["count"]:
+            print(f"{name:<18}{p['count']:>7}{p['p50']:>9}{p['p95']:>9}{p['p99']:>9}{p['max']:>9}")
+    print(f"throughput: {result['audio_seconds_per_second']} detik audio/detik, "
+          f"{result['evaluate_requests_per_second']} request /evaluate/detik")
+    for path, acc in result["accuracy"].items():
+        print(f"akurasi {path}: {acc['word_accuracy']} ({acc['correct']}/{acc['target_words']} kata, "
+              f"unmatched {acc['unmatched']}, skipped {acc['skipped']})")
+    if result.get("resources"):
+        r = result["resources"]
+        print(f"server: CPU rata-rata {r['cpu_percent_mean']}% (p95 {r['cpu_percent_p95']}%), "
+              f"RSS rata-rata {r['rss_mb_mean']} MB (maks {r['rss_mb_max']} MB)")
+    print(f"counter: {result['counters']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--ws", type=int, default=2, help="Jumlah streamer /ws bersamaan")
+    parser.add_argument("--evaluate", type=int, default=2, help="Jumlah uploader /evaluate bersamaan")
+    parser.add_argument("--duration", type=float, default=60.0, help="Detik; sesi yang sedang jalan diselesaikan")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Client mulai bertahap selama N detik")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 0 = secepatnya")
+    parser.add_argument("--corpus", help="Folder rekaman bacaan (default: korpus sintetis)")
+    parser.add_argument("--keys", nargs="*", help="Batasi key ayat korpus sintetis (mis. 1:1 112:1)")
+    parser.add_argument("--threshold", type=float, default=65.0)
+    parser.add_argument("--decoding", choices=["window", "incremental", "verify"], help="Mode decoding /ws (default: server)")
+    parser.add_argument("--frame-ms", type=int, default=100, help="Ukuran frame PCM /ws")
+    parser.add_argument("--chunk-seconds", type=float, default=2.0, help="Panjang chunk /evaluate")
+    parser.add_argument("--evaluate-format", choices=["pcm_s16le", "m4a"], default="m4a")
+    parser.add_argument("--allow-cache-hits", action="store_true",
+                        help="Kirim audio identik tiap iterasi (default: di-dither agar tidak kena cache)")
+    parser.add_argument("--finish-timeout", type=float, default=15.0)
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-pid", type=int, help="PID server untuk sampling CPU/RSS")
+    parser.add_argument("--spawn", action="store_true", help="Jalankan uvicorn main:app sendiri di port --url")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Env tambahan untuk server --spawn (bisa berulang)")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "hafizku-load-test-server.log"))
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--label", default="", help="Nama konfigurasi di laporan / JSON")
+    parser.add_argument("--out", help="Simpan hasil lengkap sebagai JSON")
+    args = parser.parse_args()
+
+    if args.corpus:
+        clips = load_corpus(args.corpus)
+    else:
+        rng = np.random.default_rng(args.seed)
+        keys = args.keys or list(VERSES)
+        clips = [synthetic_clip(key, VERSES[key], rng) for key in keys]
+    print(f"korpus: {len(clips)} klip, {sum(c.seconds for c in clips):.1f} detik audio")
+
+    server = spawn_server(args) if args.spawn else None
+    sampler = None
+    pid = server.pid if server else args.server_pid
+    if pid:
+        sampler = ResourceSampler(pid)
+        sampler.start()
+    try:
+        result = asyncio.run(run_load(args, clips))
+    finally:
+        resources = sampler.stop() if sampler else {}
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result = {
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        "corpus": {"clips": len(clips), "seconds": round(sum(c.seconds for c in clips), 2),
+                   "source": args.corpus or "synthetic"},
+        "resources": resources,
+        **result,
+    }
+    print_report(result)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"hasil disimpan di {args.out}")
+
+
+if __name__ == "__main__":
+    main()
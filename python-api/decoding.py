@@ -0,0 +1,109 @@
+import logging
+from collections import defaultdict
+from typing import Optional
+
+from admission import profile_priority
+from inference import DECODE_PROFILES
+
+logger = logging.getLogger(__name__)
+
+DECODING_LEVELS = ("busy", "normal", "idle")
+
+
+class DecodingController:
+    """
+    Memilih varian profil decoding ("file:busy", "stream:idle", ...) dari beban scheduler:
+    - busy   : perkiraan latency >= busy_ratio * SLO (atau antrian >= busy_ratio * max_pending)
+               -> greedy, tanpa decode ulang.
+    - idle   : tidak ada antrian, ada slot kosong, latency <= idle_ratio * SLO -> beam lebar.
+    - normal : di antaranya -> beam default, klip log-prob rendah di-decode ulang.
+    Chunk /evaluate yang skor alignment-nya dalam +-margin dari threshold boleh di-decode
+    ulang dengan varian "wide" selama tidak busy.
+    Perubahan tingkat beban dicatat di log, jumlah keputusan di stats().
+    """
+
+    def __init__(self, enabled: bool = True, busy_ratio: float = 0.7, idle_ratio: float = 0.2,
+                 margin: float = 10.0):
+        self.enabled = enabled
+        self.busy_ratio = busy_ratio
+        self.idle_ratio = idle_ratio
+        self.margin = margin
+
+        self._last_level = {} # profil dasar -> tingkat terakhir (untuk log perubahan)
+        self.decisions = defaultdict(int) # "file:busy" -> jumlah
+        self.widened = 0
+        self.widen_changed = 0
+        self.widen_skipped_busy = 0
+
+    def level(self, scheduler, profile: str) -> str:
+        priority = profile_priority(profile)
+        queued = scheduler.queue.depth(priority) if scheduler.queue else 0
+        slo = scheduler.slo_seconds.get(priority)
+        if slo:
+            load = scheduler.estimated_latency(priority) / slo
+        else:
+            load = queued / scheduler.max_pending
+
+        if load >= self.busy_ratio:
+            level = "busy"
+        elif queued == 0 and scheduler.running_batches < scheduler.max_concurrent_batches and load <= self.idle_ratio:
+            level = "idle"
+        else:
+            level = "normal"
+
+        if self._last_level.get(profile) != level:
+            logger.info(f"🎚️ Decoding {profile}: {self._last_level.get(profile, '-')} -> {level} (beban {load:.2f}, antrian {queued})")
+            self._last_level[profile] = level
+        return level
+
+    def choose(self, scheduler, profile: str) -> str:
+        """Nama profil yang dipakai untuk submit (profil dasar kalau nonaktif / tidak ada varian)."""
+        if not self.enabled:
+            return profile
+        variant = f"{profile}:{self.level(scheduler, profile)}"
+        if variant not in DECODE_PROFILES:
+            return profile
+        self.decisions[variant] += 1
+        return variant
+
+    def widen(self, scheduler, used_profile: str, events: list, threshold: float) -> Optional[str]:
+        """
+        Varian "wide" kalau hasil alignment ambigu (kosong / skor dekat threshold) dan beban
+        mengizinkan; None kalau decode ulang tidak perlu / tidak sepadan.
+        """
+        if not self.enabled:
+            return None
+        base = used_profile.split(":")[0]
+        wide = f"{base}:wide"
+        if wide not in DECODE_PROFILES:
+            return None
+        if DECODE_PROFILES[wide]["beam_size"] <= DECODE_PROFILES[used_profile]["beam_size"]:
+            return None
+
+        ambiguous = not events or any(
+            ev.get("score") is not None and abs(ev["score"] - threshold) <= self.margin for ev in events
+        )
+        if not ambiguous:
+            return None
+        if self.level(scheduler, base) == "busy":
+            self.widen_skipped_busy += 1
+            return None
+        self.widened += 1
+        return wide
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "busy_ratio": self.busy_ratio,
+            "idle_ratio": self.idle_ratio,
+            "margin": self.margin,
+            "levels": dict(self._last_level),
+            "decisions": dict(self.decisions),
+            "widened": self.widened,
+            "widen_changed": self.widen_changed,
+            "widen_skipped_busy": self.widen_skipped_busy,
+            "beams": {
+                name: (params["beam_size"], params.get("retry_beam_size", 0))
+                for name, params in DECODE_PROFILES.items() if ":" in name
+            },
+        }
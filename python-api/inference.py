@@ -0,0 +1,598 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Tuple, Union
+
+import ctranslate2
+import numpy as np
+from faster_whisper.audio import decode_audio, pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import get_compression_ratio, get_suppressed_tokens
+from faster_whisper.vad import VadOptions, collect_chunks, get_speech_timestamps
+
+from admission import PRIORITY_NAMES, FairQueue, Overloaded, profile_priority
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# Whisper hanya bisa meng-encode maksimal 30 detik per item batch
+MAX_BATCH_SECONDS = 30
+
+# ------------------------------------------------
+# PROFIL DECODING
+# ------------------------------------------------
+# "stream" -> window WebSocket (cepat, greedy, pakai VAD)
+# "file"   -> chunk /evaluate (beam 3 agar tidak gampang "blank", tanpa VAD)
+# "stream_incremental" -> streaming incremental, butuh timestamp per kata
+#                         (tanpa VAD agar timestamp tetap sesuai timeline audio asli)
+DECODE_PROFILES = {
+    "stream": dict(beam_size=int(os.getenv("STREAM_BEAM_SIZE", "1")), vad_filter=True),
+    "file": dict(beam_size=int(os.getenv("FILE_BEAM_SIZE", "3")), vad_filter=False),
+    "stream_incremental": dict(beam_size=1, vad_filter=False, word_timestamps=True),
+    # "stream_verify" -> window WebSocket, kata target berikutnya diverifikasi dengan forced
+    #                    alignment; decode biasa hanya kalau tidak ada kata yang lolos
+    "stream_verify": dict(
+        beam_size=1, vad_filter=True, verify=True,
+        min_word_prob=float(os.getenv("VERIFY_MIN_WORD_PROB", "0.4")),
+        min_word_seconds=float(os.getenv("VERIFY_MIN_WORD_SECONDS", "0.1")),
+    ),
+}
+
+# Varian per tingkat beban untuk DecodingController: "<profil>:<tingkat>" -> (beam_size, retry_beam_size).
+# retry_beam_size > beam_size: klip dengan avg log-prob rendah (bukan hening) di-decode ulang dengan beam itu.
+# "wide" dipakai untuk decode ulang chunk yang skor alignment-nya dekat threshold.
+WIDE_BEAM_SIZE = int(os.getenv("WIDE_BEAM_SIZE", "5"))
+ADAPTIVE_BEAMS = {
+    "stream": {
+        "busy": (1, 0),
+        "normal": (DECODE_PROFILES["stream"]["beam_size"], 0),
+        "idle": (DECODE_PROFILES["stream"]["beam_size"], 3),
+    },
+    "file": {
+        "busy": (1, 0),
+        "normal": (DECODE_PROFILES["file"]["beam_size"], WIDE_BEAM_SIZE),
+        "idle": (WIDE_BEAM_SIZE, 0),
+        "wide": (WIDE_BEAM_SIZE, 0),
+    },
+}
+for _profile, _levels in ADAPTIVE_BEAMS.items():
+    for _level, (_beam, _retry) in _levels.items():
+        # Saat busy juga tanpa fallback temperatur (decode ulang berantai justru menambah antrian)
+        DECODE_PROFILES[f"{_profile}:{_level}"] = dict(
+            DECODE_PROFILES[_profile], beam_size=_beam, retry_beam_size=_retry, temperature_fallback=_level != "busy"
+        )
+
+
+@dataclass
+class StreamHypothesis:
+    """Hasil profil dengan word_timestamps: teks + (kata, start, end) dalam detik."""
+    text: str = ""
+    words: List[Tuple[str, float, float]] = field(default_factory=list)
+
+@dataclass(frozen=True)
+class TargetPrompt:
+    """Prompt profil verify: kata target berikutnya + kata sebelumnya (konteks overlap window)."""
+    text: str # prompt biasa, dipakai kalau jatuh ke decode biasa
+    words: Tuple[str, ...] = ()
+    context: Tuple[str, ...] = ()
+
+
+def _prompt_text(prompt) -> str:
+    return prompt.text if isinstance(prompt, TargetPrompt) else prompt
+
+# Ambang yang sama dengan default model.transcribe untuk membuang segmen hening
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+# Fallback temperatur seperti model.transcribe (generate_with_fallback): hasil yang terlalu
+# repetitif (rasio kompresi gzip > 2.4) atau log-prob rendah di-decode ulang dengan sampling.
+# best_of 1 sama dengan jalur serial (transcribe_single). Kosongkan FALLBACK_TEMPERATURES untuk mematikan.
+COMPRESSION_RATIO_THRESHOLD = 2.4
+FALLBACK_TEMPERATURES = tuple(float(t) for t in os.getenv("FALLBACK_TEMPERATURES", "0.2,0.4,0.6,0.8,1.0").split(",") if t.strip())
+FALLBACK_BEST_OF = int(os.getenv("FALLBACK_BEST_OF", "1"))
+
+
+def _load_audio(audio: Union[str, np.ndarray]) -> np.ndarray:
+    if isinstance(audio, str):
+        return decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    return audio
+
+
+def transcribe_single(model, audio, prompt: str, profile: str):
+    """Jalur serial lama (satu klip per panggilan model.transcribe)."""
+    params = DECODE_PROFILES[profile]
+    segments, _ = model.transcribe(
+        audio,
+        language="ar",
+        beam_size=params["beam_size"],
+        best_of=1,
+        vad_filter=params["vad_filter"],
+        condition_on_previous_text=False,
+        initial_prompt=prompt,
+        word_timestamps=params.get("word_timestamps", False),
+    )
+    segments = list(segments)
+    text = "".join([s.text for s in segments]).strip()
+
+    if params.get("word_timestamps"):
+        words = [(w.word.strip(), w.start, w.end) for s in segments for w in (s.words or [])]
+        return StreamHypothesis(text, words)
+    return text
+
+
+def transcribe_batch(model, audios: List[Union[str, np.ndarray]], prompts: List[str], profile: str) -> List[str]:
+    """
+    Transkripsi banyak klip sekaligus langsung lewat backend CTranslate2.
+    Encoder dijalankan satu kali untuk seluruh batch, decoder per kelompok prompt yang sama.
+    Klip > 30 detik dilempar ke jalur serial karena tidak muat dalam satu window encoder.
+    Beda dengan model.transcribe: decode tanpa token timestamp dan tanpa condition_on_previous_text
+    (satu window per klip); fallback temperatur tetap ada (lihat _fallback_temperature).
+    Profil dengan verify=True menerima TargetPrompt dan memverifikasi kata target (lihat _verify_targets).
+    """
+    params = DECODE_PROFILES[profile]
+    word_timestamps = params.get("word_timestamps", False)
+    results = [StreamHypothesis() if word_timestamps else "" for _ in audios]
+
+    batch_idx = []
+    batch_audio = []
+    for i, audio in enumerate(audios):
+        audio = _load_audio(audio)
+
+        if params["vad_filter"]:
+            speech_chunks = get_speech_timestamps(audio, VadOptions())
+            if not speech_chunks:
+                continue # Tidak ada suara sama sekali
+            audio_chunks, _ = collect_chunks(audio, speech_chunks)
+            audio = np.concatenate(audio_chunks, axis=0)
+
+        if len(audio) > MAX_BATCH_SECONDS * SAMPLE_RATE:
+            results[i] = transcribe_single(model, audio, _prompt_text(prompts[i]), profile)
+            continue
+
+        batch_idx.append(i)
+        batch_audio.append(audio)
+
+    if not batch_idx:
+        return results
+
+    tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language="ar")
+
+    # 1. Encoder: satu panggilan untuk seluruh batch
+    features = np.stack([pad_or_trim(model.feature_extractor(a)) for a in batch_audio])
+    encoder_output = model.encode(features)
+
+    # 2. Decoder (atau verifikasi kata target dengan fallback ke decoder)
+    if params.get("verify"):
+        _verify_targets(model, tokenizer, encoder_output, batch_idx, batch_audio, prompts, params, profile, results)
+    else:
+        _decode(model, tokenizer, encoder_output, batch_idx, batch_audio, prompts, params, profile, results)
+    return results
+
+
+def _subset(storage, rows: List[int]):
+    """Ambil sebagian baris encoder output (StorageView tidak bisa di-index langsung)."""
+    encoded = np.array(storage)
+    return ctranslate2.StorageView.from_array(np.ascontiguousarray(encoded[rows]))
+
+
+def _decode(model, tokenizer, encoder_output, batch_idx, batch_audio, prompts, params, profile, results):
+    """Decoder untuk klip yang sudah di-encode: kelompokkan item dengan prompt yang sama."""
+    word_timestamps = params.get("word_timestamps", False)
+    suppress_tokens = get_suppressed_tokens(tokenizer, [-1])
+    encoded = np.array(encoder_output) if len(set(prompts[i] for i in batch_idx)) > 1 else None
+
+    groups = defaultdict(list)
+    for pos, i in enumerate(batch_idx):
+        groups[prompts[i]].append(pos)
+
+    for prompt_text, positions in groups.items():
+        prompt_text = _prompt_text(prompt_text)
+        previous_tokens = tokenizer.encode(" " + prompt_text.strip()) if prompt_text else []
+        prompt = model.get_prompt(tokenizer, previous_tokens, without_timestamps=True)
+
+        if encoded is None:
+            group_output = encoder_output
+        else:
+            group_output = ctranslate2.StorageView.from_array(np.ascontiguousarray(encoded[positions]))
+
+        def generate(storage, count, beam_size, **sampling):
+            return model.model.generate(
+                storage,
+                [prompt] * count,
+                beam_size=beam_size,
+                max_length=model.max_length,
+                return_scores=True,
+                return_no_speech_prob=True,
+                suppress_blank=True,
+                suppress_tokens=suppress_tokens,
+                **sampling,
+            )
+
+        outputs = generate(group_output, len(positions), params["beam_size"])
+
+        retry_beam = params.get("retry_beam_size", 0)
+        if retry_beam > params["beam_size"] and not word_timestamps:
+            outputs = _retry_low_confidence(generate, group_output, outputs, retry_beam, profile)
+        if params.get("temperature_fallback", True):
+            outputs = _fallback_temperature(generate, tokenizer, group_output, outputs, profile)
+
+        kept = [] # (index di dalam grup, tokens) yang bukan hening
+        for group_pos, (pos, output) in enumerate(zip(positions, outputs)):
+            tokens = output.sequences_ids[0]
+            if _is_silence(output):
+                continue # Dianggap hening, sama seperti model.transcribe
+            text = tokenizer.decode(tokens).strip()
+            if word_timestamps:
+                results[batch_idx[pos]] = StreamHypothesis(text)
+                if tokens:
+                    kept.append((group_pos, tokens))
+            else:
+                results[batch_idx[pos]] = text
+
+        if word_timestamps and kept:
+            _add_word_timestamps(model, tokenizer, group_output, positions, kept, batch_audio, batch_idx, results)
+
+
+def _verify_targets(model, tokenizer, encoder_output, batch_idx, batch_audio, prompts, params, profile, results):
+    """
+    Verifikasi kata target berikutnya dengan forced alignment (model.align: satu pass decoder
+    dengan teacher forcing, bukan pencarian di seluruh vocabulary). Awalan kata target dengan
+    probabilitas >= min_word_prob dan durasi ter-align >= min_word_seconds dianggap sudah dibaca
+    dan dikembalikan sebagai teks. Dicoba dengan dan tanpa kata konteks (sisa kata sebelumnya di
+    overlap window), dipilih yang paling banyak lolos. Klip tanpa kata yang lolos (salah baca,
+    kata lain, target habis) di-decode biasa dari encoder output yang sama.
+    """
+    hop = model.feature_extractor.hop_length
+    num_frames = [min(len(a) // hop, model.feature_extractor.nb_max_frames) for a in batch_audio]
+    targets = [prompts[i] if isinstance(prompts[i], TargetPrompt) else None for i in batch_idx]
+    accepted = [[] for _ in batch_idx]
+
+    checkable = [pos for pos, target in enumerate(targets) if target is not None and target.words]
+    if checkable:
+        storage = encoder_output if len(checkable) == len(batch_idx) else _subset(encoder_output, checkable)
+        frames = [num_frames[pos] for pos in checkable]
+        variants = (False, True) if any(targets[pos].context for pos in checkable) else (False,)
+
+        for with_context in variants:
+            token_lists = []
+            for pos in checkable:
+                target = targets[pos]
+                words = target.context + target.words if with_context else target.words
+                token_lists.append(tokenizer.encode(" " + " ".join(words)))
+
+            alignments = model.find_alignment(tokenizer, token_lists, storage, frames)
+            for pos, aligned in zip(checkable, alignments):
+                target = targets[pos]
+                aligned = aligned[len(target.context):] if with_context else aligned
+                passed = []
+                for word, w in zip(target.words, aligned):
+                    if w["probability"] < params["min_word_prob"] or w["end"] - w["start"] < params["min_word_seconds"]:
+                        break
+                    passed.append(word)
+                if len(passed) > len(accepted[pos]):
+                    accepted[pos] = passed
+
+    for pos, words in enumerate(accepted):
+        if words:
+            results[batch_idx[pos]] = " ".join(words)
+
+    fallback = [pos for pos, words in enumerate(accepted) if not words]
+    logger.info(f"🎯 Verifikasi target {profile}: {len(batch_idx) - len(fallback)}/{len(batch_idx)} klip lolos "
+                f"({sum(len(words) for words in accepted)} kata), {len(fallback)} decode biasa")
+    if fallback:
+        storage = encoder_output if len(fallback) == len(batch_idx) else _subset(encoder_output, fallback)
+        _decode(
+            model, tokenizer, storage,
+            [batch_idx[pos] for pos in fallback], [batch_audio[pos] for pos in fallback],
+            [_prompt_text(p) for p in prompts], params, profile, results,
+        )
+
+
+def _avg_logprob(output) -> float:
+    tokens = output.sequences_ids[0]
+    return output.scores[0] * len(tokens) / (len(tokens) + 1)
+
+
+def _is_silence(output) -> bool:
+    return output.no_speech_prob > NO_SPEECH_THRESHOLD and _avg_logprob(output) < LOG_PROB_THRESHOLD
+
+
+def _retry_low_confidence(generate, group_output, outputs, beam_size: int, profile: str):
+    """
+    Decode ulang (beam lebih lebar) item yang bukan hening tapi avg log-prob-nya di bawah
+    LOG_PROB_THRESHOLD. Hasil baru hanya dipakai kalau log-prob-nya lebih baik.
+    """
+    retry = [g for g, out in enumerate(outputs) if not _is_silence(out) and _avg_logprob(out) < LOG_PROB_THRESHOLD]
+    if not retry:
+        return outputs
+
+    storage = group_output if len(retry) == len(outputs) else _subset(group_output, retry)
+
+    outputs = list(outputs)
+    improved = 0
+    for g, output in zip(retry, generate(storage, len(retry), beam_size)):
+        if _avg_logprob(output) > _avg_logprob(outputs[g]):
+            outputs[g] = output
+            improved += 1
+    logger.info(f"🔁 Decoding {profile}: {len(retry)} klip log-prob rendah diulang dengan beam {beam_size}, {improved} membaik")
+    return outputs
+
+
+def _compression_ratio(tokenizer, output) -> float:
+    return get_compression_ratio(tokenizer.decode(output.sequences_ids[0]).strip())
+
+
+def _needs_fallback(tokenizer, output) -> bool:
+    if _is_silence(output):
+        return False
+    return _compression_ratio(tokenizer, output) > COMPRESSION_RATIO_THRESHOLD or _avg_logprob(output) < LOG_PROB_THRESHOLD
+
+
+def _fallback_temperature(generate, tokenizer, group_output, outputs, profile: str):
+    """
+    Fallback temperatur model.transcribe versi batch: per temperatur, hanya item yang masih gagal
+    (repetitif / log-prob rendah, bukan hening) yang di-decode ulang, satu panggilan generate
+    untuk semuanya. Kalau semua temperatur gagal, dipilih hasil dengan log-prob tertinggi di antara
+    yang rasio kompresinya lolos (atau di antara semua percobaan kalau tidak ada yang lolos).
+    """
+    failing = [g for g, out in enumerate(outputs) if _needs_fallback(tokenizer, out)]
+    if not failing or not FALLBACK_TEMPERATURES:
+        return outputs
+
+    outputs = list(outputs)
+    attempts = {g: [outputs[g]] for g in failing}
+    retried = len(failing)
+    for temperature in FALLBACK_TEMPERATURES:
+        storage = group_output if len(failing) == len(outputs) else _subset(group_output, failing)
+        sampled = generate(
+            storage, len(failing), 1,
+            num_hypotheses=FALLBACK_BEST_OF, sampling_topk=0, sampling_temperature=temperature,
+        )
+        still_failing = []
+        for g, output in zip(failing, sampled):
+            attempts[g].append(output)
+            if _needs_fallback(tokenizer, output):
+                still_failing.append(g)
+            else:
+                outputs[g] = output
+        failing = still_failing
+        if not failing:
+            break
+
+    for g in failing:
+        below_cr = [o for o in attempts[g] if _compression_ratio(tokenizer, o) <= COMPRESSION_RATIO_THRESHOLD]
+        outputs[g] = max(below_cr or attempts[g], key=_avg_logprob)
+    logger.info(f"🌡️ Decoding {profile}: {retried} klip repetitif / log-prob rendah diulang dengan sampling, {retried - len(failing)} lolos")
+    return outputs
+
+
+def _add_word_timestamps(model, tokenizer, group_output, positions, kept, batch_audio, batch_idx, results):
+    """Timestamp per kata lewat cross-attention alignment (model.align) untuk satu grup decoder."""
+    if len(kept) < len(positions):
+        group_output = _subset(group_output, [g for g, _ in kept])
+
+    hop = model.feature_extractor.hop_length
+    num_frames = [min(len(batch_audio[positions[g]]) // hop, model.feature_extractor.nb_max_frames) for g, _ in kept]
+    alignments = model.find_alignment(tokenizer, [tokens for _, tokens in kept], group_output, num_frames)
+
+    for (g, _), words in zip(kept, alignments):
+        hyp = results[batch_idx[positions[g]]]
+        hyp.words = [(w["word"].strip(), float(w["start"]), float(w["end"])) for w in words if w["word"].strip()]
+
+
+def warm_up(model, prompt: str = "") -> float:
+    """
+    Satu inferensi per profil decoding pada klip sintetis 1 detik, supaya kernel,
+    alokasi memori, dan model VAD sudah siap sebelum request pertama masuk.
+    Mengembalikan durasi warm-up (detik).
+    """
+    start = time.time()
+    t = np.arange(SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+    clip = (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    for profile in DECODE_PROFILES:
+        if ":" not in profile: # Varian adaptif memakai kernel yang sama dengan profil dasarnya
+            transcribe_batch(model, [clip], [prompt], profile)
+    return time.time() - start
+
+
+# ------------------------------------------------
+# MICRO-BATCHING SCHEDULER
+# ------------------------------------------------
+class BatchScheduler:
+    """
+    Mengumpulkan klip yang masuk selama beberapa milidetik lalu menjalankannya
+    sebagai satu batch di executor. Klip dengan profil berbeda tidak dicampur.
+    max_concurrent_batches > 1 dipakai bersama worker pool (satu batch per worker).
+    observer(name, profile, size, queue_waits, run_seconds) dipanggil setelah setiap batch
+    (queue_waits = waktu tunggu tiap klip dari submit sampai batch mulai jalan di executor).
+
+    Admission control: antrian dibatasi (FairQueue: window live didahulukan, round-robin
+    per user_id). Klip ditolak dengan Overloaded kalau antrian penuh, jatah user habis,
+    atau perkiraan latency (antrian + jalan) melewati slo_seconds[prioritas].
+    """
+
+    def __init__(self, run_batch, executor, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 max_concurrent_batches: int = 1, name: str = "default", observer=None,
+                 max_pending: int = 64, max_per_user: int = 0, slo_seconds: dict = None):
+        self.run_batch = run_batch # fungsi(profile, audios, prompts) -> List[str]
+        self.executor = executor
+        self.name = name
+        self.observer = observer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.max_pending = max(1, max_pending)
+        self.max_per_user = max_per_user
+        self.slo_seconds = slo_seconds or {} # prioritas -> detik (tidak ada = tanpa SLO)
+
+        self.queue = None
+        self.batch_seconds = None # EWMA durasi satu batch, dasar perkiraan latency
+        self._slots = None
+        self._task = None
+        self.running_batches = 0
+
+        # Statistik untuk endpoint /inference/stats
+        self.total_batches = 0
+        self.total_items = 0
+        self.last_batch_size = 0
+        self.max_seen_batch_size = 0
+        self.admitted = 0
+        self.shed = 0
+        self.rejected = {name: defaultdict(int) for name in PRIORITY_NAMES.values()}
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            if self.queue is None:
+                self.queue = FairQueue(self.max_pending, self.max_per_user)
+                self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    # --- Admission control ---
+    def estimated_latency(self, priority: int) -> float:
+        """Perkiraan detik sampai klip baru dengan prioritas ini selesai (0 kalau belum ada data)."""
+        if self.batch_seconds is None:
+            return 0.0
+        ahead = (self.queue.depth(priority) if self.queue else 0) + 1
+        batches = math.ceil(ahead / self.max_batch_size) + self.running_batches
+        return math.ceil(batches / self.max_concurrent_batches) * self.batch_seconds
+
+    def _reject(self, reason: str, priority: int):
+        self.rejected[PRIORITY_NAMES[priority]][reason] += 1
+        latency = self.estimated_latency(priority)
+        retry_after = max(latency - self.slo_seconds.get(priority, 0.0), self.batch_seconds or 1.0)
+        raise Overloaded(reason, retry_after)
+
+    def check(self, profile: str):
+        """
+        Cek murah sebelum kerja mahal (decode, buka sesi): melempar Overloaded kalau
+        klip dengan profil ini saat ini pasti ditolak.
+        """
+        priority = profile_priority(profile)
+        slo = self.slo_seconds.get(priority)
+        if slo and self.estimated_latency(priority) > slo:
+            self._reject("slo", priority)
+        if self.queue is not None and self.queue.qsize() >= self.max_pending and priority == max(PRIORITY_NAMES):
+            self._reject("queue_full", priority) # Kelas terendah tidak bisa menggeser siapa pun
+
+    async def submit(self, audio, prompt: str, profile: str, user_id: str = "") -> str:
+        self._ensure_started()
+        self.check(profile)
+        priority = profile_priority(profile)
+        future = asyncio.get_running_loop().create_future()
+        item = (profile, audio, prompt, future, time.monotonic())
+        try:
+            self.queue.put_nowait(item, user_id, priority)
+        except Overloaded as e:
+            victim = self.queue.shed(priority) if e.reason == "queue_full" else None
+            if victim is None:
+                self._reject(e.reason, priority)
+            # Window live menggeser klip batch: klip batch itu gagal cepat dengan retry-after
+            # (kalau pemanggilnya sudah batal / timeout, future-nya sudah selesai: cukup dibuang)
+            self.shed += 1
+            if not victim[3].done():
+                victim[3].set_exception(Overloaded("shed", self.estimated_latency(profile_priority(victim[0]))))
+            self.queue.put_nowait(item, user_id, priority)
+        self.admitted += 1
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # Tunggu sampai ada slot kosong; selama menunggu antrian ikut menumpuk
+            # sehingga batch berikutnya otomatis lebih besar.
+            async with self._slots:
+                pass
+            batch = await self._collect()
+
+            by_profile = defaultdict(list)
+            for item in batch:
+                by_profile[item[0]].append(item)
+
+            for profile, items in by_profile.items():
+                await self._slots.acquire()
+                asyncio.get_running_loop().create_task(self._dispatch(profile, items))
+
+    async def _dispatch(self, profile: str, items):
+        loop = asyncio.get_running_loop()
+        audios = [it[1] for it in items]
+        prompts = [it[2] for it in items]
+        futures = [it[3] for it in items]
+        enqueued = [it[4] for it in items]
+
+        self.total_batches += 1
+        self.total_items += len(items)
+        self.last_batch_size = len(items)
+        self.max_seen_batch_size = max(self.max_seen_batch_size, len(items))
+        self.running_batches += 1
+        logger.info(f"📦 Batch {profile}: {len(items)} klip | sisa antrian: {self.queue.qsize()}")
+
+        started = []
+
+        def timed_batch():
+            started.append(time.monotonic())
+            return self.run_batch(profile, audios, prompts)
+
+        try:
+            texts = await loop.run_in_executor(self.executor, timed_batch)
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self.running_batches -= 1
+            self._slots.release()
+            if started:
+                run_seconds = time.monotonic() - started[0]
+                self.batch_seconds = run_seconds if self.batch_seconds is None else 0.8 * self.batch_seconds + 0.2 * run_seconds
+                if self.observer:
+                    self._observe(profile, enqueued, started[0])
+
+        for fut, text in zip(futures, texts):
+            if not fut.done():
+                fut.set_result(text)
+
+    def _observe(self, profile: str, enqueued, started: float):
+        try:
+            self.observer(self.name, profile, len(enqueued), [started - t for t in enqueued], time.monotonic() - started)
+        except Exception as e:
+            logger.info(f"⚠️ Observer batch gagal: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "running_batches": self.running_batches,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "total_batches": self.total_batches,
+            "total_items": self.total_items,
+            "last_batch_size": self.last_batch_size,
+            "max_seen_batch_size": self.max_seen_batch_size,
+            "avg_batch_size": round(self.total_items / self.total_batches, 2) if self.total_batches else 0.0,
+            "admission": {
+                **(self.queue.stats() if self.queue else {"depth": 0}),
+                "slo_seconds": {PRIORITY_NAMES[p]: s for p, s in self.slo_seconds.items()},
+                "avg_batch_seconds": round(self.batch_seconds, 4) if self.batch_seconds is not None else None,
+                "estimated_latency": {name: round(self.estimated_latency(p), 3) for p, name in PRIORITY_NAMES.items()},
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "rejected": {name: dict(reasons) for name, reasons in self.rejected.items()},
+            },
+        }
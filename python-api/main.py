@@ -3,30 +3,55 @@ import asyncio
 import json
 import numpy as np
 import logging
-import re
-import difflib
 import io
 import multiprocessing
-from typing import List
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
 from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from huggingface_hub import login
 # import torch
-from pydub import AudioSegment
 import logging
 
 # new
-import glob
-import shutil
+import queue
+import tempfile
 from fastapi import File, UploadFile, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+import copy
 import time
+from contextlib import asynccontextmanager
 from fastapi import Request
-
-
-app = FastAPI()
+from inference import DECODE_PROFILES, BatchScheduler, TargetPrompt, transcribe_batch, warm_up
+from worker_pool import InferenceWorkerPool
+from alignment import WordAlignmentEngine, normalize_arabic
+from verse_index import VerseIndex
+from streaming import AudioRingBuffer, IncrementalTranscriber, PcmSpool, SpeechGate, StreamingPipeline
+from audio_merge import compact_recording, merge_chunks
+from persistence import PersistenceQueue
+from result_cache import ResultCache
+from sessions import SessionStore
+from models import ModelRegistry, ModelTier, RescorePolicy
+from admission import PRIORITY_BATCH, PRIORITY_LIVE, Overloaded
+from decoding import DecodingController
+from storage import StorageManager, QuotaExceeded
+import metrics
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Model dimuat di background: port langsung terbuka, /healthz sudah bisa dijawab,
+    # /readyz baru 200 setelah model siap & warm-up selesai.
+    asyncio.get_running_loop().create_task(start_model_loading())
+    yield
+    # Selesaikan dulu rekaman yang masih antri sebelum proses berhenti
+    persistence.close()
+    storage.close()
+    if worker_pool:
+        worker_pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
 load_dotenv()
 
 # --- MIDDLEWARE  ---
@@ -35,6 +60,10 @@ async def log_response_time(request: Request, call_next):
     start_time = time.time()
     response = await call_next(request)
     process_time = time.time() - start_time
+    # Label path = template route (bukan URL mentah) supaya URL scanner / 404 tidak membuat time series baru
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", None) or "unmatched"
+    metrics.HTTP_SECONDS.labels(request.method, route_path, str(response.status_code)).observe(process_time)
     
     # Cetak ke terminal / docker logs
     logger.info(f"⏱️ [PERFORMANCE] {request.method} {request.url.path} selesai dalam {process_time:.3f} detik")
@@ -50,28 +79,33 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 # logging.getLogger("faster_whisper").setLevel(logging.DEBUG)
 
-STORAGE_PATH = "/app/public/recordings"
+STORAGE_PATH = os.getenv("STORAGE_PATH", "/app/public/recordings")
+# Spool PCM sementara untuk sesi WebSocket (jangan di folder publik recordings)
+SPOOL_PATH = os.getenv("SPOOL_PATH", os.path.join(tempfile.gettempdir(), "hafizku-spool"))
 
 os.makedirs(STORAGE_PATH, exist_ok=True)
 
 # ------------------------------------------------
-# 1) LOAD FASTER-WHISPER MODEL
+# 1) LOAD FASTER-WHISPER MODEL (di background saat startup)
 # ------------------------------------------------
-token = os.getenv("HF_TOKEN")
-if token:
-    login(token=token)
-
 # MODEL_ID = "OdyAsh/faster-whisper-base-ar-quran" 
-MODEL_ID = "tiny" 
+MODEL_ID = os.getenv("MODEL_ID", "tiny")
 
-logger.info(f"user model: {MODEL_ID}.")
+# Folder model CTranslate2 yang sudah dikonversi/diunduh sebelumnya (mis. ikut di image Docker).
+# Kalau ada, model dimuat langsung dari disk tanpa login / download dari HF Hub.
+LOCAL_MODEL_DIR = os.getenv("LOCAL_MODEL_DIR")
+MODEL_SOURCE = LOCAL_MODEL_DIR if LOCAL_MODEL_DIR and os.path.isdir(LOCAL_MODEL_DIR) else MODEL_ID
+# Warm-up: satu inferensi per profil decoding pada klip sintetis sebelum dinyatakan ready
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+
+logger.info(f"user model: {MODEL_SOURCE}.")
 
 # Deteksi Core: Di VPS kecil, jangan gunakan semua core untuk AI
 # Sisakan resource untuk menghandle WebSocket
 total_cores = multiprocessing.cpu_count()
 
 # ai_threads = max(1, total_cores - 1) if total_cores > 2 else total_cores
-ai_threads = 4
+ai_threads = int(os.getenv("AI_THREADS", "4"))
 # Intra-op threads untuk komputasi matriks
 os.environ["OMP_NUM_THREADS"] = str(ai_threads) 
 
@@ -91,16 +125,119 @@ device = "cpu"
 compute_type = "int8" # Wajib int8 untuk CPU VPS
 
 
-model = WhisperModel(MODEL_ID, device=device, compute_type=compute_type,cpu_threads=ai_threads,num_workers=1)
-# logger.info("✅ Faster-Whisper Model siap")
-logger.info("✅ Faster-Whisper Model siap (Optimized for CPU)")
+# Multi-process: INFERENCE_WORKERS > 0 -> setiap worker punya model & thread sendiri
+# (total core dibagi rata). 0 = model tunggal di proses ini seperti sebelumnya.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+
+if INFERENCE_WORKERS > 0:
+    threads_per_worker = max(1, total_cores // INFERENCE_WORKERS)
+    logger.info(f"⚙️ Worker pool: {INFERENCE_WORKERS} proses x {threads_per_worker} thread")
+
+worker_pool = None
+model = None
+
+# Model tier akurat (mis. "OdyAsh/faster-whisper-base-ar-quran") dengan thread sendiri.
+# Hanya dipakai untuk me-re-score hasil /evaluate yang ambigu; /ws tetap di model cepat.
+ACCURATE_MODEL_ID = os.getenv("ACCURATE_MODEL_ID", "") # kosong = nonaktif
+ACCURATE_MODEL_THREADS = int(os.getenv("ACCURATE_MODEL_THREADS", "2"))
+# "off" / "ambiguous" (skor dalam +-RESCORE_MARGIN dari threshold, atau blank) / "all"
+RESCORE_POLICY = os.getenv("RESCORE_POLICY", "ambiguous")
+RESCORE_MARGIN = float(os.getenv("RESCORE_MARGIN", "10"))
+RESCORE_MAX_INFLIGHT = int(os.getenv("RESCORE_MAX_INFLIGHT", "2"))
+
+model_registry = ModelRegistry()
+if ACCURATE_MODEL_ID:
+    model_registry.register(ModelTier("accurate", ACCURATE_MODEL_ID, device, compute_type, ACCURATE_MODEL_THREADS,
+                                      observer=metrics.observe_batch))
+rescore_policy = RescorePolicy(RESCORE_POLICY if ACCURATE_MODEL_ID else "off", RESCORE_MARGIN, RESCORE_MAX_INFLIGHT)
+
+# Status lifecycle model (dilaporkan oleh /readyz)
+# starting -> loading -> warming_up -> ready (atau failed)
+model_state = {
+    "status": "starting",
+    "model": MODEL_SOURCE,
+    "started_at": time.time(),
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "time_to_ready": None,
+    "error": None,
+}
+
+
+def load_models():
+    """Dijalankan di thread executor saat startup: login HF, load model, lalu warm-up."""
+    global model, worker_pool
+
+    model_state["status"] = "loading"
+    load_start = time.time()
+
+    token = os.getenv("HF_TOKEN")
+    if token and MODEL_SOURCE == MODEL_ID:
+        login(token=token)
+
+    if INFERENCE_WORKERS > 0:
+        # Setiap worker load + warm-up sendiri, timing per worker ada di /inference/stats
+        worker_pool = InferenceWorkerPool(INFERENCE_WORKERS, MODEL_SOURCE, device, compute_type, threads_per_worker, warmup=MODEL_WARMUP)
+        if not worker_pool.wait_ready():
+            raise RuntimeError("Tidak ada worker inferensi yang berhasil dimuat")
+        model_state["load_seconds"] = round(time.time() - load_start, 3)
+        return
+
+    model = WhisperModel(MODEL_SOURCE, device=device, compute_type=compute_type,cpu_threads=ai_threads,num_workers=1)
+    model_state["load_seconds"] = round(time.time() - load_start, 3)
+    # logger.info("✅ Faster-Whisper Model siap")
+    logger.info(f"✅ Faster-Whisper Model siap (Optimized for CPU) dalam {model_state['load_seconds']} detik")
+
+    if MODEL_WARMUP:
+        model_state["status"] = "warming_up"
+        model_state["warmup_seconds"] = round(warm_up(model, DEFAULT_TARGET), 3)
+        logger.info(f"🔥 Warm-up selesai dalam {model_state['warmup_seconds']} detik")
+
+
+async def start_model_loading():
+    try:
+        await asyncio.get_running_loop().run_in_executor(executor, load_models)
+    except Exception as e:
+        model_state["status"] = "failed"
+        model_state["error"] = str(e)
+        logger.error(f"❌ Gagal memuat model: {e}")
+        return
+
+    model_state["time_to_ready"] = round(time.time() - model_state["started_at"], 3)
+    model_state["status"] = "ready"
+    logger.info(f"🚀 Model siap menerima request (time-to-ready {model_state['time_to_ready']} detik)")
+
+    # Tier tambahan dimuat setelah jalur cepat ready; selama belum siap, re-score dilewati
+    if model_registry.tiers:
+        await asyncio.get_running_loop().run_in_executor(None, model_registry.load_all, MODEL_WARMUP, DEFAULT_TARGET)
+
+
+def model_not_ready():
+    """Response 503 selama model belum siap (None kalau sudah siap)."""
+    if model_state["status"] == "ready":
+        return None
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "5"},
+        content={"status": "error", "message": f"Model belum siap ({model_state['status']})"}
+    )
+
+
+def overloaded(e: Overloaded, path: str):
+    """Response 503 cepat saat admission control menolak klip."""
+    metrics.ADMISSION_REJECTED.labels(path, e.reason).inc()
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after_seconds)},
+        content={"status": "error", "message": str(e), "reason": e.reason, "retry_after": e.retry_after_seconds}
+    )
 
 # ------------------------------------------------
 # 2) AUDIO CONFIG
 # ------------------------------------------------
 SAMPLE_RATE = 16000
-WINDOW_SECONDS = 1.6
-OVERLAP_SECONDS = 0.6
+WINDOW_SECONDS = float(os.getenv("WINDOW_SECONDS", "1.6"))
+OVERLAP_SECONDS = float(os.getenv("OVERLAP_SECONDS", "0.6"))
 
 # OPTIMASI 1: Perbesar Window. 
 # Jangan 1.6s. Gunakan 3-4 detik agar CPU punya napas.
@@ -109,284 +246,465 @@ OVERLAP_SECONDS = 0.6
 # OVERLAP_SECONDS = 1.0
 WINDOW_SIZE = int(SAMPLE_RATE * WINDOW_SECONDS)
 OVERLAP_SIZE = int(SAMPLE_RATE * OVERLAP_SECONDS)
-SILENCE_THRESHOLD = 0.015
-
-# Executor untuk AI dan File Processing
+SILENCE_THRESHOLD = float(os.getenv("SILENCE_THRESHOLD", "0.015"))
+# Gerbang energi WebSocket: window hening tidak dikirim ke AI, window terakhir di-flush
+# lebih awal begitu suara berhenti selama SPEECH_HANGOVER_MS (SPEECH_GATE=0 untuk mematikan)
+SPEECH_GATE = os.getenv("SPEECH_GATE", "1") == "1"
+SPEECH_HANGOVER_MS = int(os.getenv("SPEECH_HANGOVER_MS", "400"))
+# Akumulasi statistik gerbang dari semua sesi (untuk /inference/stats)
+stream_gate_totals = {"sessions": 0, "windows_checked": 0, "windows_skipped": 0, "early_flushes": 0, "windows_processed": 0}
+# Kalau AI tertinggal, window yang menumpuk digabung maksimal sepanjang ini (sisanya dibuang)
+MAX_PENDING_SECONDS = float(os.getenv("MAX_PENDING_SECONDS", "3.2"))
+MAX_PENDING_SIZE = int(SAMPLE_RATE * MAX_PENDING_SECONDS)
+
+# Mode decoding WebSocket:
+# "window"      -> setiap window 1.6s di-decode ulang dari nol (overlap 0.6s)
+# "incremental" -> hanya audio yang belum ter-commit yang di-decode, kata dikirim sekali
+# "verify"      -> seperti window, tapi kata target berikutnya diverifikasi dengan forced
+#                  alignment (decode bebas hanya kalau tidak ada kata yang lolos)
+STREAM_DECODING = os.getenv("STREAM_DECODING", "window")
+VERIFY_MAX_WORDS = int(os.getenv("VERIFY_MAX_WORDS", "4")) # kata target yang dicek per window
+VERIFY_CONTEXT_WORDS = int(os.getenv("VERIFY_CONTEXT_WORDS", "1")) # kata sebelumnya (overlap)
+STEP_SIZE = WINDOW_SIZE - OVERLAP_SIZE
+INCREMENTAL_MAX_SECONDS = 8.0
+
+# Executor untuk AI
 # executor = ThreadPoolExecutor(max_workers=4) 
 executor = ThreadPoolExecutor(max_workers=1) 
 
+# Executor terpisah untuk decode upload & tulis chunk ke disk (bukan jalur inferensi)
+audio_executor = ThreadPoolExecutor(max_workers=int(os.getenv("AUDIO_WORKERS", "2")))
+
+# Antrian simpan rekaman (export WebSocket & merge /finish), tidak pernah memakai executor AI
+PERSIST_WORKERS = int(os.getenv("PERSIST_WORKERS", "2"))
+PERSIST_MAX_PENDING = int(os.getenv("PERSIST_MAX_PENDING", "32"))
+PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", "2"))
+# Berapa lama request menunggu slot antrian sebelum ditolak (backpressure)
+PERSIST_ENQUEUE_WAIT = float(os.getenv("PERSIST_ENQUEUE_WAIT", "2.0"))
+persistence = PersistenceQueue(
+    num_workers=PERSIST_WORKERS,
+    max_pending=PERSIST_MAX_PENDING,
+    max_retries=PERSIST_MAX_RETRIES,
+)
+
+# Micro-batching: kumpulkan klip selama BATCH_MAX_WAIT_MS lalu jalankan sekaligus
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Admission control: antrian inferensi terbatas, adil per user, window /ws didahulukan.
+# Klip ditolak (503 / event busy + Retry-After) kalau perkiraan latency melewati SLO (0 = tanpa SLO).
+ADMISSION_MAX_PENDING = int(os.getenv("ADMISSION_MAX_PENDING", "64"))
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", "4"))
+ADMISSION_SLO_LIVE_MS = float(os.getenv("ADMISSION_SLO_LIVE_MS", "2000"))
+ADMISSION_SLO_BATCH_MS = float(os.getenv("ADMISSION_SLO_BATCH_MS", "8000"))
+admission_slo = {
+    priority: ms / 1000.0
+    for priority, ms in ((PRIORITY_LIVE, ADMISSION_SLO_LIVE_MS), (PRIORITY_BATCH, ADMISSION_SLO_BATCH_MS))
+    if ms > 0
+}
+
+# Decoding adaptif: greedy saat antrian padat, beam lebar saat longgar / skor dekat threshold
+ADAPTIVE_DECODING = os.getenv("ADAPTIVE_DECODING", "1") == "1"
+DECODING_BUSY_RATIO = float(os.getenv("DECODING_BUSY_RATIO", "0.7")) # porsi SLO
+DECODING_IDLE_RATIO = float(os.getenv("DECODING_IDLE_RATIO", "0.2"))
+decoding = DecodingController(ADAPTIVE_DECODING, DECODING_BUSY_RATIO, DECODING_IDLE_RATIO, margin=RESCORE_MARGIN)
+
+if INFERENCE_WORKERS > 0:
+    # Satu thread per worker, hanya untuk menunggu hasil dari proses worker
+    inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS)
+else:
+    inference_executor = executor
+
+
+def run_batch(profile, audios, prompts):
+    # worker_pool / model baru terisi setelah load_models selesai
+    if worker_pool:
+        return worker_pool.run_batch(profile, audios, prompts)
+    return transcribe_batch(model, audios, prompts, profile)
+
+scheduler = BatchScheduler(
+    run_batch,
+    inference_executor,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_concurrent_batches=max(1, INFERENCE_WORKERS),
+    name="fast",
+    observer=metrics.observe_batch,
+    max_pending=ADMISSION_MAX_PENDING,
+    max_per_user=ADMISSION_MAX_PER_USER,
+    slo_seconds=admission_slo,
+)
+logger.info(f"⚙️ Batching: max {BATCH_MAX_SIZE} klip / {BATCH_MAX_WAIT_MS} ms")
+
+# Gauge antrian & kapasitas dibaca saat /metrics di-scrape
+metrics.watch_scheduler("fast", scheduler)
+for tier in model_registry.tiers.values():
+    metrics.watch_scheduler(tier.name, tier.scheduler)
+metrics.watch_executor("inference", inference_executor)
+metrics.watch_executor("audio", audio_executor)
+metrics.watch_queue("persistence", lambda: persistence.pending)
+
+# Siklus hidup folder rekaman: index tanpa glob, expire chunk sesi yang ditinggal,
+# kuota disk per user & global (0 = tanpa batas, chunk baru ditolak 507 kalau penuh),
+# kompaksi rekaman lama di background
+STORAGE_CHUNK_TTL = float(os.getenv("STORAGE_CHUNK_TTL", "21600")) # detik, harus > SESSION_IDLE_TTL
+STORAGE_USER_QUOTA_MB = float(os.getenv("STORAGE_USER_QUOTA_MB", "0"))
+STORAGE_MAX_MB = float(os.getenv("STORAGE_MAX_MB", "0"))
+# Opt-in: tegakkan kuota dengan MENGHAPUS rekaman final tertua (setiap penghapusan di-log & dihitung)
+STORAGE_EVICT_RECORDINGS = os.getenv("STORAGE_EVICT_RECORDINGS", "0") == "1"
+STORAGE_COMPACT_AFTER_DAYS = float(os.getenv("STORAGE_COMPACT_AFTER_DAYS", "30")) # 0 = nonaktif
+STORAGE_COMPACT_BITRATE = int(os.getenv("STORAGE_COMPACT_BITRATE", "24000"))
+STORAGE_COMPACT_BATCH = int(os.getenv("STORAGE_COMPACT_BATCH", "20")) # file per sweep
+STORAGE_SWEEP_SECONDS = float(os.getenv("STORAGE_SWEEP_SECONDS", "300"))
+storage = StorageManager(
+    STORAGE_PATH,
+    chunk_ttl=STORAGE_CHUNK_TTL,
+    user_quota=int(STORAGE_USER_QUOTA_MB * 1024 * 1024),
+    max_bytes=int(STORAGE_MAX_MB * 1024 * 1024),
+    compact_after=STORAGE_COMPACT_AFTER_DAYS * 86400,
+    compact_bit_rate=STORAGE_COMPACT_BITRATE,
+    compact_batch=STORAGE_COMPACT_BATCH,
+    compact_fn=metrics.timed("compaction", compact_recording),
+    sweep_interval=STORAGE_SWEEP_SECONDS,
+    evict_recordings=STORAGE_EVICT_RECORDINGS,
+)
+metrics.watch_storage(storage)
+
 # ------------------------------------------------
 # 3) HELPER FUNCTIONS
 # ------------------------------------------------
-ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u06D6-\u06ED]")
-
-def normalize_arabic(text: str) -> str:
-    text = text.strip()
-    text = ARABIC_DIACRITICS.sub("", text)
-    text = re.sub("[إأٱآا]", "ا", text)
-    text = re.sub("[ؤ]", "و", text)
-    text = re.sub("[ئ]", "ي", text)
-    text = re.sub("ة", "ه", text)
-    text = re.sub("[^\u0600-\u06FF\s]", " ", text)
-    return re.sub("\s+", " ", text).strip()
-
-# def normalize_arabic(text: str) -> str:
-#     if not text:
-#         return ""
-#     # Filter ketat hanya menyisakan huruf Arab dan spasi
-#     text = re.sub(r"[^\u060f\u0620-\u064a\u066e\u066f\u0671-\u06d3\u06d5\s]", "", text)
-#     return re.sub(r"\s+", " ", text).strip()
-
-def tokenize_words(text: str) -> List[str]:
-    t = normalize_arabic(text)
-    return t.split() if t else []
-
-
-class WordAlignmentEngine:
-    def __init__(self, target_text: str, match_threshold: float, current_index: int):
-        self.target_text = target_text
-        self.target_words = tokenize_words(target_text) # Asumsi fungsi ini sudah ada
-        self.match_threshold = match_threshold
-        self.current_index = current_index
-        self.last_sent = -1
-        
-        # 📊 FITUR BARU: Kamus untuk melacak jumlah salah per index kata
-        # Contoh bentuknya: {0: 0, 1: 2, 2: 0, 3: 1 ...}
-        self.word_errors = {i: 0 for i in range(len(self.target_words))}
-
-    def feed(self, asr_text: str):
-        events = []
-        original_words = asr_text.split()
-        preds = tokenize_words(asr_text)
-        
-        # Flag penanda: Apakah di dalam rekaman kali ini target utamanya sudah ketemu?
-        found_anchor = False 
-        
-        for i, p in enumerate(preds):
-            if self.current_index >= len(self.target_words): 
-                break
-            
-            expected = self.target_words[self.current_index]
-            actual_text = original_words[i] if i < len(original_words) else p
-            
-            # Hitung skor kecocokan
-            score = difflib.SequenceMatcher(None, p, expected).ratio() * 100
-            is_match = score >= self.match_threshold
-            
-            # ========================================================
-            # SKENARIO 1: Baru Memulai Ayat (current_index == 0)
-            # ========================================================
-            if self.current_index == 0:
-                if is_match:
-                    self._emit_correct(events, expected, actual_text, score)
-                    found_anchor = True
-                else:
-                    # Langsung hitung salah, kirim feedback unmatch, dan HENTIKAN proses kata selanjutnya
-                    self.word_errors[self.current_index] += 1
-                    self._emit_unmatched(events, expected, actual_text, score)
-                    break 
-
-            # ========================================================
-            # SKENARIO 2: Sedang di Tengah Hafalan (current_index > 0)
-            # ========================================================
-            else:
-                # 2A. Jika KATA TARGET BELUM KETEMU dalam rentetan ucapan ini
-                if not found_anchor:
-                    if is_match:
-                        # Alhamdulillah ketemu!
-                        found_anchor = True
-                        self._emit_correct(events, expected, actual_text, score)
-                    else:
-                        # Kata belum cocok. Kita cek apakah ini ancang-ancang?
-                        if i < (len(preds)-1):
-                            continue
-                            
-                        else:
-                            # Jika ini kata yang murni salah/ngawur, kita hitung diam-diam
-                            self.word_errors[self.current_index] += 1
-                            self._emit_unmatched(events, expected, actual_text, score)
-                            # LANJUTKAN LOOP (Continue) tanpa mengirim feedback unmatch ke Flutter
-                            break
-                
-                # 2B. Jika KATA TARGET SUDAH KETEMU (Mengecek kata ekornya)
-                else:
-                    if is_match:
-                        # Ternyata kata selanjutnya juga benar
-                        self._emit_correct(events, expected, actual_text, score)
-                    else:
-                        # Kata sambungannya salah! Hitung error, kirim unmatch, dan putus loop
-                        self.word_errors[self.current_index] += 1
-                        self._emit_unmatched(events, expected, actual_text, score)
-                        break
-
-        return events
-
-    # -----------------------------------------------------------------
-    # FUNGSI HELPER (Agar loop utama di atas lebih mudah dibaca)
-    # -----------------------------------------------------------------
+DEFAULT_TARGET = "بسم الله الرحمن الرحيم"
+
+# Index ayat (key "surah:ayah" -> teks + token ternormalisasi), dibuat dengan scripts/build_verse_index.py
+VERSE_INDEX_PATH = os.getenv("VERSE_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "quran_index.json.gz"))
+verse_index = VerseIndex.load(VERSE_INDEX_PATH)
+# Tanpa index, request yang hanya mengirim key (tanpa target_text) selalu 400 -> /readyz ikut 503
+VERSE_INDEX_REQUIRED = os.getenv("VERSE_INDEX_REQUIRED", "1") == "1"
+if not len(verse_index):
+    log = logger.error if VERSE_INDEX_REQUIRED else logger.info
+    log(f"❌ Verse index kosong / tidak ada di {VERSE_INDEX_PATH}: request key-only akan ditolak "
+        f"(buat dengan scripts/build_verse_index.py atau set VERSE_INDEX_REQUIRED=0)")
+
+
+def process_and_upload_audio(spool_path: str, user_id: str, key: str):
+    """
+    Dijalankan oleh PersistenceQueue. Error sengaja dilempar agar job diulang;
+    file spool baru dihapus setelah berhasil (kalau gagal total, spool tetap ada untuk dipulihkan).
+    """
+    logger.info(f"DEBUG: Saving to Local Disk for User: {user_id}")
+
+    # 1. Siapkan Folder User
+    file_full_path = storage.recording_path(user_id, key)
+    os.makedirs(os.path.dirname(file_full_path), exist_ok=True)
+
+    # Cek apakah ada data audio
+    if os.path.getsize(spool_path) < 1000: # Kalau audio terlalu pendek (< 0.1 detik), skip
+        logger.info("⚠️ Audio terlalu pendek, tidak disimpan.")
+        os.remove(spool_path)
+        return
+
     
-    def _emit_correct(self, events, expected, actual_text, score):
-        idx = self.current_index
-        self.current_index += 1
-        if idx != self.last_sent:
-            events.append({
-                "event": "word_correct",
-                "index": idx,
-                "text": actual_text,
-                "expected": expected,
-                "score": score,
-                "error_count": self.word_errors[idx]
-            })
-            self.last_sent = idx
-
-    def _emit_unmatched(self, events, expected, actual_text, score):
-        events.append({
-            "event": "word_unmatched",
-            "index": self.current_index,
-            "text": actual_text,
-            "expected": expected,
-            "score": score,
-            "error_count": self.word_errors[self.current_index]
-        })
+    logger.info(f"💾 Memproses audio untuk User: {user_id}, Key: {key}...")
 
-    # def _is_ancang_ancang(self, word: str) -> bool:
-    #     # Mengecek apakah kata ini ada di 5 kata sebelumnya
-    #     start_check = max(0, self.current_index - 5)
-    #     previous_words = self.target_words[start_check : self.current_index]
-        
-    #     for prev_word in previous_words:
-    #         prev_score = difflib.SequenceMatcher(None, word, prev_word).ratio() * 100
-    #         if prev_score >= self.match_threshold:
-    #             return True
-    #     return False
+    # 3. Simpan File
+    safe_filename = os.path.basename(file_full_path)
+    
+    # Raw PCM spool (16kHz, 16-bit, mono) di-encode ke AAC secara streaming
+    merge_chunks([spool_path], file_full_path)
+    storage.record_recording(user_id, file_full_path)
+    
+    logger.info(f"✅ File tersimpan di: {file_full_path}")
 
-DEFAULT_TARGET = "بسم الله الرحمن الرحيم"
+    # Hapus file spool sementara
+    os.remove(spool_path)
+    
+    return f"{safe_filename}"
 
 
-def process_and_upload_audio(raw_buffer: io.BytesIO, user_id: str, key: str):
-    logger.info(f"DEBUG: Saving to Local Disk for User: {user_id}")
+# Format upload /evaluate -> ekstensi file chunk di disk
+# "m4a"       -> container AAC dari Flutter (default)
+# "pcm_s16le" -> raw PCM 16 kHz, 16-bit, mono (tanpa decode sama sekali)
+CHUNK_EXTENSIONS = {"m4a": ".m4a", "pcm_s16le": ".pcm"}
+
+# Tulis chunk yang masih berjalan per folder sesi (ditunggu oleh /finish dan /reset)
+pending_chunk_writes = {}
+
+# Cache hasil transkripsi /evaluate (retry chunk yang sama tidak perlu Whisper lagi)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR") # kosong = hanya memori
+RESULT_CACHE_DISK_TTL = float(os.getenv("RESULT_CACHE_DISK_TTL", "86400"))
+result_cache = ResultCache(
+    max_entries=RESULT_CACHE_SIZE,
+    ttl_seconds=RESULT_CACHE_TTL,
+    disk_path=RESULT_CACHE_DIR,
+    disk_ttl_seconds=RESULT_CACHE_DISK_TTL,
+    executor=audio_executor,
+)
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+# Sesi /evaluate (user_id + key): engine & hitungan salah per kata hidup lintas chunk
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+
 
+def log_session_end(session, reason):
+    logger.info(f"🧾 Sesi {session.user_id}/{session.key} ditutup ({reason}): {session.summary()}")
+
+
+sessions = SessionStore(idle_ttl=SESSION_IDLE_TTL, max_sessions=SESSION_MAX, on_evict=log_session_end)
+metrics.EVALUATE_SESSIONS.set_function(lambda: len(sessions))
+
+
+def decode_upload(data: bytes) -> np.ndarray:
+    """Decode container audio langsung dari memori ke float32 16 kHz (tanpa file sementara)."""
+    return decode_audio(io.BytesIO(data), sampling_rate=SAMPLE_RATE)
+
+
+def write_chunk(user_id: str, chunk_path: str, data: bytes):
     try:
-        # 1. Siapkan Folder User
-        user_folder = os.path.join(STORAGE_PATH, user_id)
-        os.makedirs(user_folder, exist_ok=True)
-
-        raw_buffer.seek(0) # Reset pointer ke awal
-        # Cek apakah ada data audio
-        data = raw_buffer.read()
-        if len(data) < 1000: # Kalau audio terlalu pendek (< 0.1 detik), skip
-            logger.info("⚠️ Audio terlalu pendek, tidak disimpan.")
-            return
+        with metrics.stage_timer("chunk_write"):
+            os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+            with open(chunk_path, "wb") as buffer:
+                buffer.write(data)
+    except Exception:
+        storage.cancel(user_id, len(data)) # Lepas cadangan kuota dari admit
+        raise
+    storage.record_chunk(user_id, chunk_path, len(data))
 
-        
-        logger.info(f"💾 Memproses audio untuk User: {user_id}, Key: {key}...")
-        
-        # 1. Load Raw Audio menggunakan Pydub
-        # Asumsi Flutter mengirim: 16kHz, 16-bit (2 bytes), Mono (1 channel)
-        audio_segment = AudioSegment(
-            data=data,
-            sample_width=2, 
-            frame_rate=SAMPLE_RATE, 
-            channels=1
-        )
 
-        # 3. Simpan File
-        key_safe = key.replace(":", "_")
-        safe_filename = f"{user_id}_{key_safe}.m4a"
-        file_full_path = os.path.join(user_folder, safe_filename)
-        
-        # Export langsung ke file
-        audio_segment.export(file_full_path, format="mp4", bitrate="64k")
-     
-        
-        logger.info(f"✅ File tersimpan di: {file_full_path}")
-        
-        return f"{safe_filename}"
+def track_chunk_write(session_dir: str, future):
+    writes = pending_chunk_writes.setdefault(session_dir, set())
+    writes.add(future)
 
-    except Exception as e:
-        logger.info(f"❌ Gagal Simpan Local: {e}")
-
-
-def transcribe_sync(audio, target_text):
-    segments, _ = model.transcribe(
-        audio, 
-        language="ar", 
-        beam_size=1,
-        best_of=1,
-        vad_filter=True, # Penting! Menggunakan Silero VAD bawaan faster_whisper
-        # vad_parameters=dict(min_silence_duration_ms=500, speech_pad_ms=200),
-        initial_prompt=target_text
-    )
-    return "".join([s.text for s in segments]).strip()
-    # segments, _ = model.transcribe(
-    #     audio, 
-    #     language="ar", 
-    #     beam_size=5,
-    #     vad_filter=True,
-    #     initial_prompt=DEFAULT_TARGET
-    # )
-
-def transcribe_file_sync(file_path: str, target_text: str):
-    """Digunakan oleh REST API (Menerima path file utuh)"""
-    segments, _ = model.transcribe(
-        file_path, 
-        language="ar", 
-        beam_size=3,        # <--- Ubah ke 3 atau 5 agar tidak gampang "blank"
-        best_of=1,
-        vad_filter=False, 
-        condition_on_previous_text=False,
-        initial_prompt=target_text,
-        
-    )
-    return "".join([s.text for s in segments]).strip()
+    def _done(f):
+        writes.discard(f)
+        if not writes and pending_chunk_writes.get(session_dir) is writes:
+            pending_chunk_writes.pop(session_dir, None)
+        if not f.cancelled() and f.exception():
+            logger.error(f"❌ Gagal menulis chunk di {session_dir}: {f.exception()}")
+
+    future.add_done_callback(_done)
+
+
+async def wait_chunk_writes(session_dir: str):
+    writes = pending_chunk_writes.get(session_dir)
+    if writes:
+        await asyncio.gather(*list(writes), return_exceptions=True)
 
 
 @app.post("/evaluate")
 async def evaluate_chunk(
     audio: UploadFile = File(...),
-    target_text: str = Form(...),
+    target_text: str = Form(None), # Opsional jika key ada di verse index
     user_id: str = Form(...),
     key: str = Form(...),
     threshold: float = Form(65.0),
     chunk_index: int = Form(...),
-    current_index: int = Form(...)
+    current_index: int = Form(...),
+    alignment_mode: str = Form(None), # "greedy" / "lookahead" (default: ALIGNMENT_MODE)
+    audio_format: str = Form("m4a") # "m4a" / "pcm_s16le"
 ):
     """Mengevaluasi satu potongan rekaman saat user melepas tombol mic."""
-    session_dir = os.path.join(STORAGE_PATH, user_id, key.replace(":", "_"))
-    os.makedirs(session_dir, exist_ok=True)
-    
-    chunk_path = os.path.join(session_dir, f"chunk_{chunk_index:03d}.m4a")
-    with open(chunk_path, "wb") as buffer:
-        shutil.copyfileobj(audio.file, buffer)
+    request_start_time = time.time()
+
+    not_ready = model_not_ready()
+    if not_ready:
+        return not_ready
+
+    target = verse_index.get(key, target_text)
+    if target is None:
+        return JSONResponse(status_code=400, content={"status": "error", "message": "target_text wajib diisi (key tidak ada di index)"})
+    target_text = target.text
+
+    if audio_format not in CHUNK_EXTENSIONS:
+        return JSONResponse(status_code=400, content={"status": "error", "message": f"audio_format tidak dikenal: {audio_format}"})
+
+    session_dir = storage.session_dir(user_id, key)
+    chunk_path = os.path.join(session_dir, f"chunk_{chunk_index:03d}{CHUNK_EXTENSIONS[audio_format]}")
+
+    with metrics.stage_timer("upload_read"):
+        audio_bytes = await audio.read()
+    loop = asyncio.get_event_loop()
+
+    try:
+        storage.admit(user_id, len(audio_bytes))
+    except QuotaExceeded as e:
+        metrics.ADMISSION_REJECTED.labels("evaluate", f"storage_{e.scope}").inc()
+        logger.info(f"⚠️ Chunk {user_id}/{key} ditolak: {e}")
+        return JSONResponse(
+            status_code=507,
+            headers={"Retry-After": str(e.retry_after_seconds)},
+            content={"status": "error", "message": str(e), "reason": f"storage_{e.scope}", "retry_after": e.retry_after_seconds}
+        )
+
+    # Simpan raw bytes di background, tidak menghalangi inferensi
+    track_chunk_write(session_dir, loop.run_in_executor(audio_executor, write_chunk, user_id, chunk_path, audio_bytes))
         
     logger.info(f"📥 Menerima chunk ke-{chunk_index} dari {user_id} (Target: {target_text})")
 
-    # --- HITUNG WAKTU AI ---
-    ai_start_time = time.time() # Mulai Stopwatch
+    decode_time = 0.0
+    ai_process_time = 0.0
+    rescore_time = 0.0
+    widen_time = 0.0
+    decoded = None
+    decode_profile = None # Varian profil yang dipakai (None = hasil dari cache)
+
+    async def decode_chunk():
+        # --- DECODE DI MEMORI (sekali per request, dipakai ulang saat re-score) ---
+        nonlocal decoded, decode_time
+        if decoded is None:
+            decode_start_time = time.time()
+            try:
+                if audio_format == "pcm_s16le":
+                    decoded = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+                else:
+                    decoded = await loop.run_in_executor(audio_executor, decode_upload, audio_bytes)
+            except Exception as e:
+                raise AudioDecodeError(e) from e
+            decode_time += time.time() - decode_start_time
+            metrics.observe_stage("decode", time.time() - decode_start_time)
+        return decoded
+
+    async def run_inference():
+        nonlocal ai_process_time, decode_profile
+        scheduler.check("file") # Tolak sebelum decode kalau antrian sudah pasti kelebihan
+        audio_array = await decode_chunk()
+
+        # --- HITUNG WAKTU AI ---
+        ai_start_time = time.time() # Mulai Stopwatch
+
+        decode_profile = decoding.choose(scheduler, "file")
+        text = await scheduler.submit(audio_array, target_text, decode_profile, user_id=user_id)
+
+        ai_process_time = time.time() - ai_start_time # Stop Stopwatch
+        logger.info(f"🧠 AI Inference memakan waktu: {ai_process_time:.3f} detik (decode {decode_time:.3f} detik)")
+        return text
+
+    # Key cache: isi audio + semua yang memengaruhi hasil transkripsi
+    # (profil dasar: varian beam karena beban tidak memecah cache, hasil "wide" punya key sendiri)
+    cache_key = ResultCache.make_key(audio_bytes, audio_format, target_text, MODEL_SOURCE, DECODE_PROFILES["file"])
+    try:
+        transcribed_text, cached = await result_cache.get_or_compute(cache_key, run_inference)
+    except AudioDecodeError as e:
+        logger.error(f"❌ Gagal decode chunk: {e}")
+        return JSONResponse(status_code=400, content={"status": "error", "message": "Audio tidak bisa didecode"})
+    except Overloaded as e:
+        logger.info(f"🚦 Chunk ke-{chunk_index} dari {user_id} ditolak: {e}")
+        return overloaded(e, "evaluate")
 
-    loop = asyncio.get_event_loop()
-    transcribed_text = await loop.run_in_executor(
-        executor, 
-        transcribe_file_sync, 
-        chunk_path, 
-        target_text
+    if cached:
+        logger.info(f"♻️ Hasil chunk ke-{chunk_index} diambil dari cache")
+
+    
+    # Engine dipakai ulang dari sesi sehingga word_errors tetap terakumulasi antar chunk
+    session = sessions.get_or_create(
+        user_id, key, target,
+        lambda: WordAlignmentEngine(target_text, threshold, current_index, mode=alignment_mode, target_words=target.words)
     )
+    # Satu chunk per sesi pada satu waktu: dua request chunk yang sama tidak menghitung salah dua kali
+    async with session.lock:
+        reply = session.replay(chunk_index, cache_key)
+        if reply is None:
+            session.sync(current_index, threshold, alignment_mode)
+            engine = session.engine
+            model_used = "fast"
+
+            accurate = model_registry.get("accurate")
+            if (accurate is None or rescore_policy.mode == "off") and not decoding.enabled:
+                with metrics.stage_timer("alignment"):
+                    events = engine.feed(transcribed_text)
+            else:
+                # Salinan engine hanya untuk memutuskan decode ulang (beam lebar / model akurat);
+                # transkrip yang dipilih di-feed ke engine sesi sekali di akhir (session.lock dipegang
+                # sepanjang blok ini, jadi tidak ada chunk lain yang mengubah engine di tengah jalan)
+                with metrics.stage_timer("alignment"):
+                    trial = copy.deepcopy(engine)
+                    events = trial.feed(transcribed_text)
+
+                wide = decoding.widen(scheduler, decode_profile or "file", events, threshold)
+                if wide:
+                    widen_start_time = time.time()
+
+                    async def run_wide():
+                        scheduler.check("file")
+                        return await scheduler.submit(await decode_chunk(), target_text, wide, user_id=user_id)
+
+                    try:
+                        wide_key = ResultCache.make_key(audio_bytes, audio_format, target_text, MODEL_SOURCE, DECODE_PROFILES[wide])
+                        wide_text, _ = await result_cache.get_or_compute(wide_key, run_wide)
+                        decode_profile = wide
+                        if normalize_arabic(wide_text) != normalize_arabic(transcribed_text):
+                            decoding.widen_changed += 1
+                            logger.info(f"🔎 Decode ulang {wide}: '{transcribed_text}' -> '{wide_text}'")
+                            transcribed_text = wide_text
+                            with metrics.stage_timer("alignment"):
+                                trial = copy.deepcopy(engine)
+                                events = trial.feed(wide_text)
+                    except Overloaded as e:
+                        logger.info(f"🚦 Decode ulang dilewati: {e}")
+                    finally:
+                        widen_time = time.time() - widen_start_time
+                        metrics.observe_stage("widen", widen_time)
+
+                reason = rescore_policy.reason(events, threshold) if accurate is not None else None
+                if reason and rescore_policy.try_acquire():
+                    rescore_start_time = time.time()
+                    changed = False
+
+                    async def run_rescore():
+                        return await accurate.scheduler.submit(await decode_chunk(), target_text, "file", user_id=user_id)
+
+                    try:
+                        rescore_key = ResultCache.make_key(audio_bytes, audio_format, target_text, accurate.source, DECODE_PROFILES["file"])
+                        accurate_text, _ = await result_cache.get_or_compute(rescore_key, run_rescore)
+                        changed = normalize_arabic(accurate_text) != normalize_arabic(transcribed_text)
+                        logger.info(f"🔬 Re-score ({reason}): '{transcribed_text}' -> '{accurate_text}'")
+                        transcribed_text = accurate_text
+                        model_used = "accurate"
+                    except Overloaded as e:
+                        logger.info(f"🚦 Re-score dilewati, pakai hasil model cepat: {e}")
+                    except Exception as e:
+                        logger.error(f"❌ Re-score gagal, pakai hasil model cepat: {e}")
+                    finally:
+                        rescore_policy.release(changed)
+                        rescore_time = time.time() - rescore_start_time
+                        metrics.observe_stage("rescore", rescore_time)
 
-    ai_process_time = time.time() - ai_start_time # Stop Stopwatch
-    logger.info(f"🧠 AI Inference memakan waktu: {ai_process_time:.3f} detik")
+                with metrics.stage_timer("alignment"):
+                    events = engine.feed(transcribed_text)
 
-    
-    engine = WordAlignmentEngine(target_text,threshold, current_index)
-    events = engine.feed(transcribed_text)
+            session.remember(chunk_index, cache_key, events, transcribed_text, model_used)
+        else:
+            # Retry chunk yang sama: kirim ulang hasil sebelumnya, jangan hitung salah dua kali
+            logger.info(f"♻️ Chunk ke-{chunk_index} sudah dievaluasi, kirim ulang hasil sebelumnya")
+            events, transcribed_text, model_used = reply
 
     logger.info(f"transcribed_text: {transcribed_text}")
     logger.info(f"detail: {events}")
+
+    total_time = time.time() - request_start_time
+    logger.info(f"⏱️ Evaluate total {total_time:.3f} detik | AI {ai_process_time:.3f} detik")
     
     return JSONResponse(content={
         "status": "success",
         "target_text": target_text,
         "transcribed_text": transcribed_text,
-        "details": events
+        "details": events,
+        "cached": cached,
+        "model": model_used, # "fast" / "accurate" (hasil re-score)
+        "decoding": decode_profile, # mis. "file:normal", "file:wide"
+        "timing": {
+            "decode": round(decode_time, 4),
+            "ai": round(ai_process_time, 4),
+            "widen": round(widen_time, 4),
+            "rescore": round(rescore_time, 4),
+            "total": round(total_time, 4)
+        }
     })
 
 
@@ -396,48 +714,58 @@ async def finish_ayah(
     key: str = Form(...)
 ):
     """Menggabungkan semua potongan rekaman dan menyimpannya secara lokal saat ayat selesai."""
-    session_dir = os.path.join(STORAGE_PATH, user_id, key.replace(":", "_"))
+    session_dir = storage.session_dir(user_id, key)
     
+    # Pastikan semua chunk yang masih ditulis di background sudah ada di disk
+    await wait_chunk_writes(session_dir)
+
     if not os.path.exists(session_dir):
+        sessions.close(user_id, key, reason="finish") # Engine & lock sesi tidak dibiarkan sampai idle eviction
         return JSONResponse(status_code=404, content={"status": "error", "message": "Sesi chunking tidak ditemukan"})
 
     try:
-        # Ambil semua file chunk dan urutkan
-        chunk_files = sorted(glob.glob(os.path.join(session_dir, "chunk_*.m4a")))
+        # Ambil semua file chunk (dari index storage, urut chunk_index)
+        chunk_files = storage.chunk_files(session_dir)
         
         if not chunk_files:
+            sessions.close(user_id, key, reason="finish")
             return JSONResponse(status_code=400, content={"status": "error", "message": "Tidak ada audio untuk digabungkan"})
 
         logger.info(f"🔗 Menggabungkan {len(chunk_files)} potongan audio untuk {user_id}...")
-        
-        merged_audio = AudioSegment.empty()
-        for file in chunk_files:
-            merged_audio += AudioSegment.from_file(file)
             
         # Simpan file gabungan ke folder utama user (seperti fungsi WebSocket existing)
-        user_folder = os.path.join(STORAGE_PATH, user_id)
-        os.makedirs(user_folder, exist_ok=True)
+        final_file_path = storage.recording_path(user_id, key)
+        safe_filename = os.path.basename(final_file_path)
+        os.makedirs(os.path.dirname(final_file_path), exist_ok=True)
         
-        key_safe = key.replace(":", "_")
-        safe_filename = f"{user_id}_{key_safe}.m4a"
-        final_file_path = os.path.join(user_folder, safe_filename)
-        
-        # Export file gabungan
-        merged_audio.export(final_file_path, format="mp4", bitrate="64k")
-        logger.info(f"✅ File gabungan berhasil disimpan secara lokal di: {final_file_path}")
+        # Gabungkan lewat antrian simpan (remux tanpa transcode kalau format chunk seragam)
+        merge_start_time = time.time()
+        try:
+            job = await persistence.submit_async(
+                f"finish {user_id} {key}", metrics.timed("persistence", merge_chunks), chunk_files, final_file_path,
+                wait=PERSIST_ENQUEUE_WAIT
+            )
+        except queue.Full:
+            return JSONResponse(
+                status_code=503,
+                headers={"Retry-After": "5"},
+                content={"status": "error", "message": "Server sedang sibuk menyimpan rekaman, coba lagi"}
+            )
+        merge_mode = await asyncio.wrap_future(job)
+        logger.info(f"✅ File gabungan ({merge_mode}, {time.time() - merge_start_time:.3f} detik) berhasil disimpan secara lokal di: {final_file_path}")
+        storage.record_recording(user_id, final_file_path)
         
         # Bersihkan file potongan (chunk) dan folder temporary agar tidak memenuhi disk
-        for file in chunk_files:
-            os.remove(file)
-        try:
-            os.rmdir(session_dir)
-        except OSError:
-            pass # Folder mungkin tidak kosong jika ada file lain
+        storage.release(session_dir)
+
+        # Tutup sesi evaluasi: ringkasan kesalahan seluruh ayat ikut dikirim
+        session = sessions.close(user_id, key, reason="finish")
 
         return JSONResponse(content={
             "status": "success",
             "message": "Audio berhasil digabungkan dan disimpan",
-            "file_saved": safe_filename # Flutter dapat menggunakan nama file ini untuk memutar audionya
+            "file_saved": safe_filename, # Flutter dapat menggunakan nama file ini untuk memutar audionya
+            "summary": session.summary() if session else None
         })
 
     except Exception as e:
@@ -450,14 +778,16 @@ async def finish_ayah(
     user_id: str = Form(...),
     key: str = Form(...)
 ):
-    session_dir = os.path.join(STORAGE_PATH, user_id, key.replace(":", "_"))
+    session_dir = storage.session_dir(user_id, key)
+    sessions.close(user_id, key, reason="reset")
+    await wait_chunk_writes(session_dir)
     
     if not os.path.exists(session_dir):
         return JSONResponse(status_code=404, content={"status": "error", "message": "Sesi chunking tidak ditemukan"})
 
     try:
-        # Ambil semua file chunk dan urutkan
-        chunk_files = sorted(glob.glob(os.path.join(session_dir, "chunk_*.m4a")))
+        # Ambil semua file chunk (dari index storage)
+        chunk_files = storage.chunk_files(session_dir)
         
         if not chunk_files:
             return JSONResponse(status_code=400, content={"status": "error", "message": "Tidak ada audio"})
@@ -465,12 +795,7 @@ async def finish_ayah(
         logger.info(f"🔗 Menghapus {len(chunk_files)} potongan audio untuk {user_id}...")
         
         # Bersihkan file potongan (chunk) dan folder temporary agar tidak memenuhi disk
-        for file in chunk_files:
-            os.remove(file)
-        try:
-            os.rmdir(session_dir)
-        except OSError:
-            pass # Folder mungkin tidak kosong jika ada file lain
+        storage.release(session_dir)
 
         return JSONResponse(content={
             "status": "success",
@@ -482,6 +807,63 @@ async def finish_ayah(
         return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
 
 
+@app.get("/inference/stats")
+async def inference_stats():
+    """Kedalaman antrian dan ukuran batch inferensi saat ini."""
+    stats = scheduler.stats()
+    stats["stream_gate"] = stream_gate_totals
+    stats["result_cache"] = result_cache.stats()
+    stats["tiers"] = model_registry.stats()
+    stats["rescore"] = rescore_policy.stats()
+    stats["decoding"] = decoding.stats()
+    if worker_pool:
+        stats["workers"] = worker_pool.stats()
+    return JSONResponse(content=stats)
+
+
+@app.get("/sessions/stats")
+async def session_stats():
+    """Jumlah sesi /evaluate yang aktif dan statistik eviction."""
+    return JSONResponse(content=sessions.stats())
+
+
+@app.get("/persistence/stats")
+async def persistence_stats():
+    """Export rekaman yang masih antri, sedang berjalan, dan yang gagal."""
+    return JSONResponse(content=persistence.stats())
+
+
+@app.get("/storage/stats")
+async def storage_stats():
+    """Pemakaian disk rekaman, kuota, dan hasil garbage collection terakhir."""
+    return JSONResponse(content=storage.stats())
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Metrik Prometheus: histogram per tahap, antrian, sesi aktif, utilisasi model."""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: proses & event loop hidup (tidak bergantung pada model)."""
+    return JSONResponse(content={"status": "ok"})
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 hanya setelah model dimuat, warm-up selesai, dan verse index tersedia."""
+    state = dict(model_state)
+    state["tiers"] = {name: tier.status for name, tier in model_registry.tiers.items()}
+    state["verse_index"] = len(verse_index)
+    if worker_pool:
+        state["workers"] = worker_pool.stats()
+    ready = state["status"] == "ready" and (len(verse_index) or not VERSE_INDEX_REQUIRED)
+    return JSONResponse(status_code=200 if ready else 503, content=state)
+
+
 # ------------------------------------------------
 # 5) WEBSOCKET SERVER
 # ------------------------------------------------
@@ -490,6 +872,20 @@ async def websocket_endpoint(ws: WebSocket):
     await ws.accept()
     logger.info("📡 Client connected")
 
+    if model_state["status"] != "ready":
+        await ws.send_json({"event": "error", "message": f"Model belum siap ({model_state['status']})"})
+        await ws.close()
+        return
+
+    # Sesi baru tidak diterima kalau window live saat ini pun sudah melewati SLO
+    try:
+        scheduler.check("stream")
+    except Overloaded as e:
+        metrics.ADMISSION_REJECTED.labels("ws", e.reason).inc()
+        await ws.send_json({"event": "busy", "message": str(e), "retry_after": e.retry_after_seconds})
+        await ws.close()
+        return
+
     # Metadata untuk penyimpanan file
     meta_user_id = "unknown"
     meta_key = "0:0"
@@ -498,13 +894,16 @@ async def websocket_endpoint(ws: WebSocket):
     
     current_target_text = DEFAULT_TARGET
     engine = None
+    decoding_mode = STREAM_DECODING
 
     # --- PHASE 1: INITIALIZATION ---
     try:
         init_msg = await ws.receive_json()
         
-        if "target_text" in init_msg:
-            current_target_text = init_msg["target_text"]
+        target = verse_index.get(init_msg.get("key"), init_msg.get("target_text"))
+
+        if target is not None:
+            current_target_text = target.text
 
             
             
@@ -512,9 +911,26 @@ async def websocket_endpoint(ws: WebSocket):
             meta_user_id = init_msg["user_id"]
             meta_key = init_msg["key"]
 
-            logger.info(f"📝 Init User: {meta_user_id} | key: {meta_key}")
+            decoding_mode = init_msg.get("decoding", STREAM_DECODING)
+
+            # Rekaman sesi ini akan disimpan: tolak dari awal kalau kuota user / global sudah penuh
+            try:
+                storage.admit(meta_user_id, 0)
+            except QuotaExceeded as e:
+                metrics.ADMISSION_REJECTED.labels("ws", f"storage_{e.scope}").inc()
+                await ws.send_json({"event": "busy", "message": str(e), "retry_after": e.retry_after_seconds})
+                await ws.close()
+                return
+
+            logger.info(f"📝 Init User: {meta_user_id} | key: {meta_key} | mode: {decoding_mode}")
             
-            engine = WordAlignmentEngine(current_target_text)
+            engine = WordAlignmentEngine(
+                current_target_text,
+                float(init_msg.get("threshold", 65.0)),
+                int(init_msg.get("current_index", 0)),
+                mode=init_msg.get("alignment"),
+                target_words=target.words
+            )
             
             await ws.send_json({
                 "event": "init_ok", 
@@ -522,7 +938,7 @@ async def websocket_endpoint(ws: WebSocket):
                 "target_len": len(engine.target_words)
             })
         else:
-            await ws.send_json({"event": "error", "message": "Missing 'target_text'"})
+            await ws.send_json({"event": "error", "message": "Missing 'target_text' (key tidak ada di index)"})
             await ws.close()
             return
 
@@ -533,16 +949,67 @@ async def websocket_endpoint(ws: WebSocket):
 
     # --- PHASE 2: AUDIO LOOP ---
     
-    # Buffer 1: Untuk AI (Numpy Float32)
-    ai_buffer = np.array([], dtype=np.float32)
+    # Buffer 1: Untuk AI (Ring buffer Float32, ukuran tetap)
+    ai_buffer = AudioRingBuffer(WINDOW_SIZE + OVERLAP_SIZE)
     
-    # Buffer 2: Untuk File Save (BytesIO RAW PCM)
-    full_audio_buffer = io.BytesIO()
+    # Buffer 2: Untuk File Save (RAW PCM di-spool ke disk)
+    full_audio_buffer = PcmSpool(SPOOL_PATH)
 
-    loop = asyncio.get_event_loop()
+    incremental = None
+    if decoding_mode == "incremental":
+        incremental = IncrementalTranscriber(
+            SAMPLE_RATE, INCREMENTAL_MAX_SECONDS, normalize=normalize_arabic, fallback_prompt=current_target_text
+        )
 
-    # Task processing
-    processing_task = None
+    # Consumer: transkripsi berjalan di background, hasil langsung dikirim ke client
+    busy_until = 0.0
+
+    async def transcribe_window(audio):
+        nonlocal busy_until
+        try:
+            if decoding_mode == "verify":
+                i = engine.current_index
+                prompt = TargetPrompt(
+                    current_target_text,
+                    words=tuple(engine.target_words[i:i + VERIFY_MAX_WORDS]),
+                    context=tuple(engine.target_words[max(0, i - VERIFY_CONTEXT_WORDS):i]),
+                )
+                return await scheduler.submit(audio, prompt, "stream_verify", user_id=meta_user_id)
+            if incremental is None:
+                profile = decoding.choose(scheduler, "stream")
+                return await scheduler.submit(audio, current_target_text, profile, user_id=meta_user_id)
+
+            # Mode incremental: audio berisi sampel baru saja, decode sisa yang belum ter-commit
+            incremental.insert(audio)
+            hyp = await scheduler.submit(incremental.audio, incremental.prompt(), "stream_incremental", user_id=meta_user_id)
+        except Overloaded as e:
+            # Window dilewati (audio tetap tersimpan); beri tahu client sekali per periode retry_after
+            metrics.ADMISSION_REJECTED.labels("ws", e.reason).inc()
+            if time.monotonic() >= busy_until:
+                busy_until = time.monotonic() + e.retry_after_seconds
+                await ws.send_json({"event": "busy", "message": str(e), "retry_after": e.retry_after_seconds})
+            return None
+        delta = incremental.commit(hyp.words)
+        # transcript_partial tetap menampilkan hipotesis penuh, engine hanya menerima delta
+        return hyp.text, " ".join(delta)
+
+    async def send_result(result):
+        if result is None:
+            return
+        text, delta = (result, result) if incremental is None else result
+        logger.info(text)
+        if text:
+            await ws.send_json({"event": "transcript_partial", "text": text})
+        if delta:
+            with metrics.stage_timer("alignment"):
+                events = engine.feed(delta)
+            for ev in events:
+                await ws.send_json(ev)
+
+    pipeline = StreamingPipeline(transcribe_window, send_result, MAX_PENDING_SIZE)
+    metrics.WS_SESSIONS.inc()
+    gate = SpeechGate(SAMPLE_RATE, SILENCE_THRESHOLD, hangover_ms=SPEECH_HANGOVER_MS) if SPEECH_GATE else None
+    last_window_end = 0
 
     try:
         while True:
@@ -555,30 +1022,35 @@ async def websocket_endpoint(ws: WebSocket):
                 # 1. Simpan Raw Bytes untuk file akhir
                 full_audio_buffer.write(raw_bytes) 
                 
-                # 2. Proses untuk AI (Convert ke Float32)
-                chunk = np.frombuffer(raw_bytes, dtype=np.int16).astype(np.float32) / 32768.0
-                ai_buffer = np.concatenate((ai_buffer, chunk))
-
-                # Cek apakah task sebelumnya sudah selesai
-                if processing_task and processing_task.done():
-                    processing_task = None # Reset
-
-                # Logic Windowing AI
-                if len(ai_buffer) >= WINDOW_SIZE:
-                    audio_slice = ai_buffer[-WINDOW_SIZE:]
-                    
-                    try:    
-                        text = await loop.run_in_executor(executor, transcribe_sync, audio_slice, current_target_text)
-                        logger.info(text)
-                        if text:
-                            await ws.send_json({"event": "transcript_partial", "text": text})
-                            for ev in engine.feed(text):
-                                await ws.send_json(ev)
-
-                    except Exception as e:
-                        logger.info(f"⚠️ Transcription Error: {e}")
-
-                    ai_buffer = ai_buffer[-OVERLAP_SIZE:]
+                # 2. Proses untuk AI (Convert ke Float32 langsung di ring buffer)
+                ai_buffer.write_pcm16(raw_bytes)
+
+                # 3. Gerbang suara: apakah user baru saja berhenti bicara?
+                new_samples = ai_buffer.total_written - last_window_end
+                speech_ended = False
+                if gate is not None:
+                    speech_ended = gate.update(ai_buffer.latest(len(raw_bytes) // 2))
+                    # Flush hanya kalau masih ada audio yang belum pernah dikirim selain hening hangover
+                    speech_ended = speech_ended and new_samples > gate.hangover_samples
+
+                # Logic Windowing AI (producer: tidak menunggu hasil AI)
+                if incremental is not None:
+                    # Mode incremental: kirim hanya sampel baru setiap STEP_SIZE
+                    if new_samples >= STEP_SIZE or speech_ended:
+                        new_audio = ai_buffer.latest(new_samples).copy()
+                        last_window_end = ai_buffer.total_written
+                        # Step hening dilewati, kecuali masih ada hipotesis yang menunggu kesepakatan
+                        if gate is None or speech_ended or incremental.previous or gate.is_speech(new_audio):
+                            pipeline.push(new_audio, len(new_audio))
+
+                elif len(ai_buffer) >= WINDOW_SIZE or speech_ended:
+                    audio_slice = ai_buffer.latest(WINDOW_SIZE)
+                    last_window_end = ai_buffer.total_written
+
+                    if gate is None or speech_ended or gate.is_speech(audio_slice):
+                        # Copy karena ring buffer akan terus ditimpa frame berikutnya
+                        pipeline.push(audio_slice.copy(), new_samples)
+                    ai_buffer.keep(OVERLAP_SIZE)
             
             # Handle Text Data
             elif "text" in msg:
@@ -591,6 +1063,14 @@ async def websocket_endpoint(ws: WebSocket):
                         
                         # Ubah status jadi BOLEH SIMPAN
                         should_save = True 
+
+                        # Selesaikan window terakhir agar event kata terakhir tetap terkirim
+                        await pipeline.drain(timeout=5.0)
+                        if incremental is not None:
+                            delta = incremental.flush()
+                            if delta:
+                                for ev in engine.feed(" ".join(delta)):
+                                    await ws.send_json(ev)
                         
                         # Keluar dari loop -> Otomatis masuk ke 'finally'
                         break 
@@ -605,18 +1085,35 @@ async def websocket_endpoint(ws: WebSocket):
         logger.info(f"❌ Unexpected Error: {e}")
 
     finally:
+        metrics.WS_SESSIONS.dec()
+        pipeline.close()
+        logger.info(f"📊 Pipeline {meta_user_id}: {pipeline.stats()}")
+        if gate is not None:
+            session_minutes = full_audio_buffer.nbytes / 2 / SAMPLE_RATE / 60
+            stream_gate_totals["sessions"] += 1
+            stream_gate_totals["windows_processed"] += pipeline.windows_processed
+            for name, value in gate.stats().items():
+                stream_gate_totals[name] += value
+            if session_minutes > 0:
+                logger.info(f"🔇 Gate {meta_user_id}: {gate.stats()} | {pipeline.windows_processed / session_minutes:.1f} inferensi/menit")
+
         # Cek apakah ada data yang terekam
-        if should_save and full_audio_buffer.getbuffer().nbytes > 0:
+        if should_save and full_audio_buffer.nbytes > 0:
             logger.info(f"🏁 Sesi Berakhir ({meta_user_id}) - Memulai Proses Save...")
-            # Jalankan save di background thread
-            loop.run_in_executor(
-                executor, 
-                process_and_upload_audio, 
-                full_audio_buffer, 
-                meta_user_id, 
-                meta_key
-            )
+            full_audio_buffer.close()
+            # Jalankan save di antrian simpan (bukan executor AI)
+            try:
+                await persistence.submit_async(
+                    f"ws {meta_user_id} {meta_key}",
+                    metrics.timed("persistence", process_and_upload_audio), 
+                    full_audio_buffer.path, 
+                    meta_user_id, 
+                    meta_key,
+                    wait=PERSIST_ENQUEUE_WAIT * 5
+                )
+            except queue.Full:
+                logger.error(f"❌ Antrian simpan penuh, rekaman {meta_user_id} tertinggal di {full_audio_buffer.path}")
         else:
             # Jika putus koneksi atau buffer kosong
             logger.info("🗑️ Data audio dibuang (Tidak ada sinyal finish atau buffer kosong).")
-            full_audio_buffer.close() # Bersihkan memori
\ No newline at end of file
+            full_audio_buffer.discard() # Hapus file spool
\ No newline at end of file
@@ -0,0 +1,101 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Catatan: dengan beberapa worker uvicorn, setiap proses punya registry sendiri
+# (scrape per proses atau jalankan satu worker per container).
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ------------------------------------------------
+# HISTOGRAM
+# ------------------------------------------------
+# stage: upload_read, chunk_write, decode, queue_wait, inference, alignment, widen, persistence, rescore, compaction
+STAGE_SECONDS = Histogram(
+    "hafizku_stage_seconds", "Durasi per tahap pemrosesan audio", ["stage"], buckets=STAGE_BUCKETS
+)
+# path: template route FastAPI (mis. "/evaluate"), "unmatched" kalau tidak ada route yang cocok
+HTTP_SECONDS = Histogram(
+    "hafizku_http_request_seconds", "Durasi request HTTP", ["method", "path", "status"], buckets=STAGE_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "hafizku_inference_batch_size", "Jumlah klip per batch inferensi", ["model", "profile"],
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32)
+)
+
+# ------------------------------------------------
+# COUNTER & GAUGE
+# ------------------------------------------------
+# Utilisasi model = rate(hafizku_inference_busy_seconds_total[1m]) / max_concurrent_batches
+BUSY_SECONDS = Counter(
+    "hafizku_inference_busy_seconds", "Total waktu model sibuk menjalankan batch", ["model"]
+)
+ADMISSION_REJECTED = Counter(
+    "hafizku_admission_rejected", "Klip yang ditolak admission control", ["path", "reason"]
+)
+WS_SESSIONS = Gauge("hafizku_ws_sessions_active", "Koneksi WebSocket /ws yang sedang aktif")
+EXECUTOR_QUEUE = Gauge("hafizku_executor_queue_depth", "Antrian pekerjaan per executor", ["executor"])
+INFERENCE_QUEUE = Gauge("hafizku_inference_queue_depth", "Klip yang menunggu di scheduler", ["model"])
+INFERENCE_RUNNING = Gauge("hafizku_inference_running_batches", "Batch yang sedang berjalan", ["model"])
+INFERENCE_CAPACITY = Gauge("hafizku_inference_max_concurrent_batches", "Batas batch bersamaan", ["model"])
+EVALUATE_SESSIONS = Gauge("hafizku_evaluate_sessions_active", "Sesi /evaluate yang masih disimpan")
+STORAGE_BYTES = Gauge("hafizku_storage_bytes", "Pemakaian disk folder rekaman", ["kind"])
+STORAGE_CHUNK_SETS = Gauge("hafizku_storage_chunk_sets", "Folder chunk /evaluate yang belum di-finish / reset")
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def timed(stage: str, fn):
+    """Bungkus fungsi (mis. job executor) agar durasinya tercatat sebagai `stage`."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage_timer(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def observe_batch(model: str, profile: str, size: int, queue_waits, run_seconds: float):
+    """Dipanggil BatchScheduler setelah setiap batch selesai."""
+    BATCH_SIZE.labels(model, profile).observe(size)
+    BUSY_SECONDS.labels(model).inc(run_seconds)
+    observe_stage("inference", run_seconds)
+    for wait in queue_waits:
+        observe_stage("queue_wait", wait)
+
+
+def watch_queue(name: str, depth_fn):
+    """Kedalaman antrian (dibaca saat scrape)."""
+    EXECUTOR_QUEUE.labels(name).set_function(depth_fn)
+
+
+def watch_executor(name: str, executor):
+    watch_queue(name, lambda: executor._work_queue.qsize())
+
+
+def watch_scheduler(model: str, scheduler):
+    INFERENCE_QUEUE.labels(model).set_function(lambda: scheduler.queue.qsize() if scheduler.queue else 0)
+    INFERENCE_RUNNING.labels(model).set_function(lambda: scheduler.running_batches)
+    INFERENCE_CAPACITY.labels(model).set(scheduler.max_concurrent_batches)
+
+
+def watch_storage(storage):
+    STORAGE_BYTES.labels("chunks").set_function(lambda: storage.usage()["chunk_bytes"])
+    STORAGE_BYTES.labels("recordings").set_function(lambda: storage.usage()["recording_bytes"])
+    STORAGE_CHUNK_SETS.set_function(lambda: storage.usage()["chunk_sets"])
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from inference import BatchScheduler, transcribe_batch, warm_up
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------
+# MODEL TIER
+# ------------------------------------------------
+class ModelTier:
+    """
+    Satu model tambahan yang dimuat di proses ini dengan budget thread, executor,
+    dan micro-batching scheduler sendiri (tidak berbagi antrian dengan model streaming).
+    """
+
+    def __init__(self, name: str, source: str, device: str, compute_type: str, cpu_threads: int,
+                 max_batch_size: int = 4, max_wait_ms: float = 10.0, observer=None):
+        self.name = name
+        self.source = source
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+
+        self.model = None
+        self.status = "not_loaded"
+        self.error = None
+        self.timings = {}
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"model-{name}")
+        self.scheduler = BatchScheduler(self._run_batch, self.executor, max_batch_size=max_batch_size,
+                                        max_wait_ms=max_wait_ms, name=name, observer=observer)
+
+    def _run_batch(self, profile, audios, prompts):
+        return transcribe_batch(self.model, audios, prompts, profile)
+
+    def load(self, warmup: bool = False, prompt: str = ""):
+        from faster_whisper import WhisperModel
+
+        self.status = "loading"
+        start = time.time()
+        self.model = WhisperModel(self.source, device=self.device, compute_type=self.compute_type,
+                                  cpu_threads=self.cpu_threads, num_workers=1)
+        self.timings["load"] = round(time.time() - start, 3)
+        if warmup:
+            self.status = "warming_up"
+            self.timings["warmup"] = round(warm_up(self.model, prompt), 3)
+        self.status = "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def stats(self) -> dict:
+        return {
+            "source": self.source,
+            "status": self.status,
+            "error": self.error,
+            "cpu_threads": self.cpu_threads,
+            "timings": self.timings,
+            "scheduler": self.scheduler.stats(),
+        }
+
+
+class ModelRegistry:
+    """Kumpulan model tier tambahan berdasarkan nama (mis. "accurate")."""
+
+    def __init__(self):
+        self.tiers: Dict[str, ModelTier] = {}
+
+    def register(self, tier: ModelTier):
+        self.tiers[tier.name] = tier
+
+    def get(self, name: str) -> Optional[ModelTier]:
+        """Tier yang sudah siap dipakai, None kalau tidak terdaftar / belum / gagal dimuat."""
+        tier = self.tiers.get(name)
+        return tier if tier is not None and tier.ready else None
+
+    def load_all(self, warmup: bool = False, prompt: str = ""):
+        """
+        Muat semua tier secara berurutan. Tier yang gagal hanya dinonaktifkan,
+        jalur utama (model streaming) tetap jalan.
+        """
+        for tier in self.tiers.values():
+            try:
+                tier.load(warmup, prompt)
+                logger.info(f"✅ Model tier '{tier.name}' ({tier.source}) siap {tier.timings}")
+            except Exception as e:
+                tier.status = "failed"
+                tier.error = str(e)
+                logger.error(f"❌ Model tier '{tier.name}' gagal dimuat, dinonaktifkan: {e}")
+
+    def stats(self) -> dict:
+        return {name: tier.stats() for name, tier in self.tiers.items()}
+
+
+# ------------------------------------------------
+# ROUTING: KAPAN HASIL /evaluate DI-SCORE ULANG
+# ------------------------------------------------
+RESCORE_MODES = ("off", "ambiguous", "all")
+
+
+class RescorePolicy:
+    """
+    Menentukan apakah hasil model cepat perlu diulang dengan model akurat.
+    - "off"       : tidak pernah.
+    - "ambiguous" : hanya kalau ada kata dengan skor dalam +-margin dari threshold,
+                    atau model cepat tidak menghasilkan event sama sekali (blank).
+    - "all"       : selalu (untuk evaluasi / perbandingan model).
+    Dibatasi max_inflight re-score bersamaan; kalau penuh, hasil model cepat dipakai.
+    """
+
+    def __init__(self, mode: str = "ambiguous", margin: float = 10.0, max_inflight: int = 2):
+        if mode not in RESCORE_MODES:
+            raise ValueError(f"RESCORE_POLICY tidak dikenal: {mode}")
+        self.mode = mode
+        self.margin = margin
+        self.max_inflight = max_inflight
+
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.considered = 0
+        self.rescored = 0
+        self.skipped_busy = 0
+        self.changed = 0 # re-score menghasilkan teks berbeda
+
+    def reason(self, events: list, threshold: float) -> Optional[str]:
+        """Alasan re-score ("blank" / "near_threshold" / "all"), atau None kalau jalur cepat cukup."""
+        if self.mode == "off":
+            return None
+        self.considered += 1
+        if self.mode == "all":
+            return "all"
+        if not events:
+            return "blank"
+        for ev in events:
+            score = ev.get("score")
+            if score is not None and abs(score - threshold) <= self.margin:
+                return "near_threshold"
+        return None
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                self.skipped_busy += 1
+                return False
+            self.inflight += 1
+            self.rescored += 1
+            return True
+
+    def release(self, changed: bool):
+        with self._lock:
+            self.inflight -= 1
+            if changed:
+                self.changed += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "margin": self.margin,
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "considered": self.considered,
+            "rescored": self.rescored,
+            "skipped_busy": self.skipped_busy,
+            "changed": self.changed,
+            "rescore_rate": round(self.rescored / self.considered, 3) if self.considered else 0.0,
+        }
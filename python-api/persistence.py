@@ -0,0 +1,169 @@
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Job:
+    job_id: int
+    name: str
+    fn: object
+    args: tuple
+    future: Future = field(default_factory=Future)
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class PersistenceQueue:
+    """
+    Antrian penyimpanan rekaman (export / merge audio) dengan worker thread sendiri,
+    terpisah dari executor inferensi sehingga export yang lambat tidak menunda transkripsi.
+    - Antrian dibatasi (max_pending): kalau penuh, submit() melempar queue.Full (backpressure).
+    - Job yang gagal diulang sampai max_retries kali dengan jeda bertambah (retry_backoff * 2^n).
+    - Kegagalan terakhir disimpan (dibatasi) untuk endpoint status.
+    """
+
+    def __init__(self, num_workers: int = 2, max_pending: int = 32, max_retries: int = 2,
+                 retry_backoff: float = 1.0, max_failures_kept: int = 50):
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._running = {} # job_id -> _Job
+
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.recent_failures = deque(maxlen=max_failures_kept)
+
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"persist-{i}", daemon=True)
+            for i in range(max(1, num_workers))
+        ]
+        for t in self._workers:
+            t.start()
+
+    # --- API ---
+    def _offer(self, job: _Job) -> bool:
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            return False
+
+    def _reject(self, job: _Job):
+        with self._lock:
+            self.rejected += 1
+        logger.info(f"⚠️ Antrian simpan penuh ({self.max_pending}), '{job.name}' ditolak")
+        raise queue.Full
+
+    def submit(self, name: str, fn, *args) -> Future:
+        """Masukkan job ke antrian tanpa menunggu. Melempar queue.Full kalau antrian penuh."""
+        job = _Job(next(self._job_ids), name, fn, args)
+        if not self._offer(job):
+            self._reject(job)
+        return job.future
+
+    async def submit_async(self, name: str, fn, *args, wait: float = 0.0) -> Future:
+        """
+        Versi untuk event loop: kalau antrian penuh, tunggu sampai `wait` detik
+        (tanpa memblok loop) sebelum menyerah dengan queue.Full.
+        """
+        job = _Job(next(self._job_ids), name, fn, args)
+        deadline = time.monotonic() + wait
+        while not self._offer(job):
+            if time.monotonic() >= deadline:
+                self._reject(job)
+            await asyncio.sleep(0.1)
+        return job.future
+
+    # --- Worker ---
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            with self._lock:
+                self._running[job.job_id] = job
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._running.pop(job.job_id, None)
+
+    def _run(self, job: _Job):
+        while True:
+            job.attempts += 1
+            try:
+                result = job.fn(*job.args)
+            except Exception as e:
+                if job.attempts <= self.max_retries:
+                    delay = self.retry_backoff * (2 ** (job.attempts - 1))
+                    logger.info(f"🔁 Simpan '{job.name}' gagal (percobaan {job.attempts}): {e} - ulangi dalam {delay:.1f} detik")
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(delay)
+                    continue
+
+                logger.error(f"❌ Simpan '{job.name}' gagal setelah {job.attempts} percobaan: {e}")
+                with self._lock:
+                    self.failed += 1
+                    self.recent_failures.append({
+                        "name": job.name,
+                        "error": str(e),
+                        "attempts": job.attempts,
+                        "failed_at": time.time(),
+                    })
+                job.future.set_exception(e)
+                return
+
+            with self._lock:
+                self.completed += 1
+            job.future.set_result(result)
+            return
+
+    # --- Status ---
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = [
+                {"name": j.name, "attempts": j.attempts, "age_seconds": round(time.time() - j.enqueued_at, 2)}
+                for j in self._running.values()
+            ]
+            return {
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "running": running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "rejected": self.rejected,
+                "recent_failures": list(self.recent_failures),
+            }
+
+    def close(self, timeout: float = 30.0):
+        """Selesaikan job yang sudah antri (maksimal `timeout` detik) lalu hentikan worker."""
+        deadline = time.monotonic() + timeout
+        for _ in self._workers:
+            try:
+                self._queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for t in self._workers:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
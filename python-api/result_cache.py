@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Cache hasil transkripsi berbasis isi audio (content-addressed).
+    - Tier memori: LRU dengan TTL, dibatasi max_entries.
+    - Tier disk (opsional): satu file JSON kecil per key di disk_path, bertahan lintas restart.
+    - Request identik yang datang bersamaan (retry saat request pertama belum selesai)
+      menunggu hasil yang sama, bukan menjalankan Whisper dua kali.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0,
+                 disk_path: str = None, disk_ttl_seconds: float = 86400.0, executor=None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_ttl = disk_ttl_seconds
+        self.executor = executor # untuk tulis/sapu tier disk di background
+
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._inflight = {} # key -> asyncio.Future
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+        self._disk_writes = 0
+
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    @staticmethod
+    def make_key(audio_bytes: bytes, *params) -> str:
+        """sha256(audio) + parameter yang memengaruhi hasil (target, profil, model, ...)."""
+        digest = hashlib.sha256(audio_bytes)
+        for p in params:
+            digest.update(b"\0")
+            digest.update(str(p).encode("utf-8"))
+        return digest.hexdigest()
+
+    # --- Tier memori ---
+    def _get_memory(self, key: str):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # --- Tier disk ---
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, key[:2], f"{key}.json")
+
+    def _get_disk(self, key: str):
+        path = self._disk_file(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.disk_ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _put_disk(self, key: str, value):
+        path = self._disk_file(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.info(f"⚠️ Gagal menulis cache disk: {e}")
+
+    def _sweep_disk(self):
+        """Hapus file cache disk yang sudah lewat TTL."""
+        cutoff = time.time() - self.disk_ttl
+        removed = 0
+        for root, _, files in os.walk(self.disk_path):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"🧹 Cache disk: {removed} entri kedaluwarsa dihapus")
+
+    def _background(self, fn, *args):
+        if self.executor is None:
+            fn(*args)
+        else:
+            self.executor.submit(fn, *args)
+
+    # --- API ---
+    def get(self, key: str):
+        value = self._get_memory(key)
+        if value is None and self.disk_path:
+            value = self._get_disk(key)
+            if value is not None:
+                self.disk_hits += 1
+                self._put_memory(key, value)
+        return value
+
+    def put(self, key: str, value):
+        self._put_memory(key, value)
+        if self.disk_path:
+            self._background(self._put_disk, key, value)
+            self._disk_writes += 1
+            if self._disk_writes % 256 == 0:
+                self._background(self._sweep_disk)
+
+    async def get_or_compute(self, key: str, compute):
+        """
+        Kembalikan (value, cached). `compute` adalah coroutine function tanpa argumen
+        yang hanya dipanggil kalau key belum ada di cache dan belum sedang dihitung.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, True
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                future.exception() # Tandai sudah dibaca kalau tidak ada yang menunggu
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self.put(key, value)
+        future.set_result(value)
+        return value, False
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk": bool(self.disk_path),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
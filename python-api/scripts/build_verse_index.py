@@ -0,0 +1,65 @@
+"""
+Membuat file verse index (data/quran_index.json.gz) untuk python-api.
+
+Sumber teks bisa berupa:
+  - file format Tanzil   : baris "surah|ayah|teks"
+  - file JSON            : {"1:1": "teks", ...}
+  - API quran.com (v4)   : --from-api
+
+    python scripts/build_verse_index.py --source quran-uthmani.txt
+    python scripts/build_verse_index.py --from-api
+"""
+import argparse
+import json
+import os
+import sys
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from verse_index import VerseIndex  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "quran_index.json.gz")
+QURAN_API_URL = "https://api.quran.com/api/v4/quran/verses/uthmani"
+
+
+def read_source(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+
+        texts = {}
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            surah, ayah, text = line.split("|", 2)
+            texts[f"{int(surah)}:{int(ayah)}"] = text
+        return texts
+
+
+def read_api() -> dict:
+    with urllib.request.urlopen(QURAN_API_URL, timeout=60) as resp:
+        data = json.load(resp)
+    return {v["verse_key"]: v["text_uthmani"] for v in data["verses"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", help="File Tanzil (.txt) atau JSON key -> teks")
+    parser.add_argument("--from-api", action="store_true", help="Ambil teks Uthmani dari api.quran.com")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    if args.source:
+        texts = read_source(args.source)
+    elif args.from_api:
+        texts = read_api()
+    else:
+        parser.error("butuh --source atau --from-api")
+
+    VerseIndex.save(args.output, texts)
+    print(f"✅ {len(texts)} ayat ditulis ke {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Re-score offline semua rekaman final di STORAGE_PATH/<user_id>/<user_id>_<surah>_<ayah>.m4a
+(mis. setelah upgrade model), tanpa menyentuh server produksi.
+
+- Decode audio paralel di process pool (--decode-workers), prefetch terbatas.
+- Transkripsi lewat transcribe_batch (satu encoder call per --batch klip).
+- WordAlignmentEngine terhadap teks ayat dari verse index, dari kata pertama.
+- Hasil ditulis sebagai dataset Parquet (output/part-NNNNN.parquet, satu part per --flush-rows baris);
+  dibaca dengan pandas.read_parquet(output) / pyarrow.dataset.
+- Resume: rekaman (path + mtime) yang sudah ada di part sebelumnya dengan status ok / no_target
+  dilewati, jadi proses yang terhenti cukup dijalankan ulang dengan argumen yang sama. Rekaman
+  berstatus error / decode_error dicoba lagi (baris lama tetap ada; ambil rescored_at terbaru per path).
+
+    pip install -r scripts/requirements.txt
+    python scripts/rescore.py --model OdyAsh/faster-whisper-base-ar-quran --output rescore-base
+    python scripts/rescore.py --storage ./recordings --users u1 u2 --limit 100 --output /tmp/rescore
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Dicek di main() supaya --help tetap jalan
+    pa = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from alignment import ALIGNMENT_MODE, WordAlignmentEngine  # noqa: E402
+from inference import DECODE_PROFILES, SAMPLE_RATE, transcribe_batch  # noqa: E402
+from storage import recording_key  # noqa: E402
+from verse_index import VerseIndex  # noqa: E402
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX = os.getenv("VERSE_INDEX_PATH", os.path.join(API_DIR, "data", "quran_index.json.gz"))
+
+COLUMNS = [
+    ("user_id", "string"),
+    ("key", "string"),
+    ("path", "string"),
+    ("size", "int64"),
+    ("mtime_ns", "int64"),
+    ("duration", "float64"),
+    ("status", "string"), # ok / no_target / decode_error / error
+    ("error", "string"),
+    ("model", "string"),
+    ("profile", "string"),
+    ("mode", "string"),
+    ("threshold", "float64"),
+    ("text", "string"),
+    ("target_len", "int32"),
+    ("matched", "int32"), # jumlah event word_correct
+    ("reached_index", "int32"), # posisi engine setelah seluruh rekaman
+    ("accuracy", "float64"), # matched / target_len
+    ("mean_score", "float64"),
+    ("total_errors", "int32"),
+    ("skipped", "int32"),
+    ("repeated", "int32"),
+    ("inserted", "int32"),
+    ("rescored_at", "float64"),
+]
+# Status yang tidak diulang saat resume (error / decode_error dicoba lagi)
+DONE_STATUSES = ("ok", "no_target")
+
+
+@dataclass
+class RecordingFile:
+    user_id: str
+    key: str
+    path: str
+    size: int
+    mtime_ns: int
+
+
+# ------------------------------------------------
+# SCAN & RESUME
+# ------------------------------------------------
+def find_recordings(root: str, users=None):
+    """Semua rekaman final, urut path (urutan stabil supaya resume & part file konsisten)."""
+    found = []
+    with os.scandir(root) as user_entries:
+        for user_entry in user_entries:
+            if not user_entry.is_dir() or (users and user_entry.name not in users):
+                continue
+            with os.scandir(user_entry.path) as entries:
+                for entry in entries:
+                    key = recording_key(user_entry.name, entry.name)
+                    if key is None or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    found.append(RecordingFile(user_entry.name, key, entry.path, st.st_size, st.st_mtime_ns))
+    found.sort(key=lambda r: r.path)
+    return found
+
+
+def part_files(output: str):
+    return sorted(glob.glob(os.path.join(output, "part-*.parquet")))
+
+
+def load_done(output: str) -> set:
+    """
+    (path, mtime_ns) yang sudah selesai di output (status ok / no_target). Rekaman yang direkam
+    ulang, atau yang gagal sementara (error / decode_error), diproses lagi.
+    """
+    done = set()
+    for part in part_files(output):
+        table = pq.read_table(part, columns=["path", "mtime_ns", "status"])
+        rows = zip(table.column("path").to_pylist(), table.column("mtime_ns").to_pylist(), table.column("status").to_pylist())
+        done.update((path, mtime_ns) for path, mtime_ns, status in rows if status in DONE_STATUSES)
+    return done
+
+
+class PartWriter:
+    """Tulis baris ke part Parquet baru setiap flush (tmp + rename, jadi part tidak pernah setengah jadi)."""
+
+    def __init__(self, output: str, flush_rows: int):
+        self.output = output
+        self.flush_rows = flush_rows
+        self.schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in COLUMNS])
+        self.rows = []
+        self.written = 0
+        existing = part_files(output)
+        self.next_part = int(os.path.basename(existing[-1])[5:10]) + 1 if existing else 1
+
+    def add(self, row: dict):
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        path = os.path.join(self.output, f"part-{self.next_part:05d}.parquet")
+        table = pa.Table.from_pylist(self.rows, schema=self.schema)
+        pq.write_table(table, path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        self.written += len(self.rows)
+        self.next_part += 1
+        self.rows = []
+
+
+# ------------------------------------------------
+# DECODE (process pool)
+# ------------------------------------------------
+def decode_file(path: str):
+    """Dijalankan di proses decode: (audio float32 16 kHz, None) atau (None, pesan error)."""
+    from faster_whisper import decode_audio
+    try:
+        return decode_audio(path, sampling_rate=SAMPLE_RATE), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+
+def decoded_batches(pool, recordings, batch_size: int, prefetch: int):
+    """
+    Batch (recording, audio, error) berurutan. Paling banyak `prefetch` file di-decode di depan
+    proses transkripsi, jadi memori tetap terbatas berapa pun jumlah rekaman.
+    """
+    remaining = iter(recordings)
+    pending = deque()
+
+    def fill():
+        while len(pending) < prefetch:
+            rec = next(remaining, None)
+            if rec is None:
+                return
+            pending.append((rec, pool.submit(decode_file, rec.path)))
+
+    fill()
+    batch = []
+    while pending:
+        rec, future = pending.popleft()
+        fill()
+        audio, error = future.result()
+        batch.append((rec, audio, error))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ------------------------------------------------
+# SCORE
+# ------------------------------------------------
+def base_row(rec: RecordingFile, args) -> dict:
+    row = {name: None for name, _ in COLUMNS}
+    row.update(
+        user_id=rec.user_id, key=rec.key, path=rec.path, size=rec.size, mtime_ns=rec.mtime_ns,
+        model=args.model, profile=args.profile, mode=args.mode, threshold=args.threshold, rescored_at=time.time(),
+    )
+    return row
+
+
+def score(row: dict, target, text: str, args) -> dict:
+    engine = WordAlignmentEngine(target.text, args.threshold, 0, mode=args.mode, target_words=target.words)
+    events = engine.feed(text)
+    scores = [ev["score"] for ev in events if ev.get("score") is not None]
+    matched = sum(1 for ev in events if ev["event"] == "word_correct")
+    target_len = len(engine.target_words)
+    row.update(
+        status="ok",
+        text=text,
+        target_len=target_len,
+        matched=matched,
+        reached_index=engine.current_index,
+        accuracy=round(matched / target_len, 4) if target_len else None,
+        mean_score=round(float(np.mean(scores)), 2) if scores else None,
+        total_errors=sum(engine.word_errors.values()),
+        skipped=len(engine.skipped),
+        repeated=engine.repeated_count,
+        inserted=engine.inserted_count,
+    )
+    return row
+
+
+def rescore_batch(model, verse_index, batch, args):
+    rows, audios, prompts, targets = [], [], [], []
+    for rec, audio, error in batch:
+        row = base_row(rec, args)
+        target = verse_index.get(rec.key)
+        if error is not None:
+            row.update(status="decode_error", error=error)
+        elif target is None:
+            row.update(status="no_target", duration=round(len(audio) / SAMPLE_RATE, 3))
+        else:
+            row["duration"] = round(len(audio) / SAMPLE_RATE, 3)
+            audios.append(audio)
+            prompts.append(target.text)
+            targets.append((row, target))
+        rows.append(row)
+
+    if audios:
+        try:
+            texts = transcribe_batch(model, audios, prompts, args.profile)
+        except Exception as e:
+            for row, _ in targets:
+                row.update(status="error", error=str(e))
+        else:
+            for (row, target), text in zip(targets, texts):
+                score(row, target, getattr(text, "text", text), args)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score offline rekaman final di STORAGE_PATH")
+    parser.add_argument("--storage", default=os.getenv("STORAGE_PATH", "/app/public/recordings"))
+    parser.add_argument("--output", required=True, help="Folder dataset Parquet (dibuat kalau belum ada)")
+    parser.add_argument("--model", default=os.getenv("LOCAL_MODEL_DIR") or os.getenv("MODEL_ID", "tiny"))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("AI_THREADS", "4")))
+    parser.add_argument("--decode-workers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=16, help="Klip per panggilan transcribe_batch")
+    parser.add_argument("--profile", default="file", choices=[p for p in DECODE_PROFILES if not DECODE_PROFILES[p].get("verify")])
+    parser.add_argument("--mode", default=ALIGNMENT_MODE, choices=["greedy", "lookahead"])
+    parser.add_argument("--threshold", type=float, default=65.0)
+    parser.add_argument("--verse-index", default=DEFAULT_INDEX)
+    parser.add_argument("--users", nargs="*", help="Hanya user_id ini")
+    parser.add_argument("--limit", type=int, default=0, help="Maksimal rekaman yang diproses (0 = semua)")
+    parser.add_argument("--flush-rows", type=int, default=500)
+    parser.add_argument("--no-resume", action="store_true", help="Proses ulang semua (part lama tetap ada)")
+    args = parser.parse_args()
+
+    if pa is None:
+        sys.exit("pyarrow belum terpasang: pip install -r scripts/requirements.txt")
+
+    verse_index = VerseIndex.load(args.verse_index)
+    if not len(verse_index):
+        sys.exit(f"Verse index kosong / tidak ditemukan: {args.verse_index}")
+
+    os.makedirs(args.output, exist_ok=True)
+    recordings = find_recordings(args.storage, set(args.users) if args.users else None)
+    total = len(recordings)
+    if not args.no_resume:
+        done = load_done(args.output)
+        recordings = [r for r in recordings if (r.path, r.mtime_ns) not in done]
+    skipped = total - len(recordings)
+    if args.limit:
+        recordings = recordings[:args.limit]
+    print(f"📂 {total} rekaman di {args.storage}, {len(recordings)} akan diproses ({skipped} sudah ada di output)")
+    if not recordings:
+        return
+
+    # Pool decode dibuat sebelum model dimuat: proses anak tidak ikut membawa thread CTranslate2
+    pool = ProcessPoolExecutor(max_workers=max(1, args.decode_workers))
+    from faster_whisper import WhisperModel
+    model = WhisperModel(args.model, device="cpu", compute_type="int8", cpu_threads=args.threads, num_workers=1)
+
+    writer = PartWriter(args.output, args.flush_rows)
+    statuses = {}
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    try:
+        for batch in decoded_batches(pool, recordings, args.batch, prefetch=args.batch * 2):
+            for row in rescore_batch(model, verse_index, batch, args):
+                statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+                audio_seconds += row["duration"] or 0.0
+                writer.add(row)
+            processed = sum(statuses.values())
+            elapsed = time.perf_counter() - start
+            print(f"⏳ {processed}/{len(recordings)} rekaman | {audio_seconds / max(elapsed, 1e-9):.1f} detik audio/detik | {statuses}")
+    except KeyboardInterrupt:
+        print("⚠️ Dihentikan, menyimpan hasil yang sudah ada (jalankan ulang untuk melanjutkan)")
+    finally:
+        writer.flush()
+        pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {writer.written} baris ditulis ke {args.output} dalam {elapsed:.1f} detik ({audio_seconds:.0f} detik audio)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from alignment import WordAlignmentEngine
+from verse_index import TargetText
+
+logger = logging.getLogger(__name__)
+
+# Jumlah balasan chunk terakhir yang disimpan untuk menjawab retry chunk_index yang sama
+REPLAY_CHUNKS = 8
+
+
+@dataclass
+class EvaluateSession:
+    """State satu sesi hafalan /evaluate (user_id + key) yang hidup lintas chunk."""
+    user_id: str
+    key: str
+    target: TargetText
+    engine: WordAlignmentEngine
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+    chunks: int = 0
+    replies: OrderedDict = field(default_factory=OrderedDict) # chunk_index -> (content_key, events, text, model)
+    # Evaluasi chunk dalam satu sesi diserialkan: replay -> feed engine -> remember
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def sync(self, current_index: int, threshold: float, mode: Optional[str]):
+        """Samakan posisi dengan client (client tetap sumber kebenaran posisi kata)."""
+        engine = self.engine
+        if current_index != engine.current_index:
+            logger.info(f"↪️ Sesi {self.user_id}/{self.key}: posisi client {current_index} != server {engine.current_index}, ikut client")
+            engine.current_index = current_index
+        engine.match_threshold = threshold
+        if mode:
+            engine.mode = mode
+
+    def replay(self, chunk_index: int, content_key: str):
+        """
+        (events, text, model) dari chunk_index yang sama, hanya kalau audionya juga sama
+        (content_key = key ResultCache). Audio baru dengan index lama (client restart tanpa
+        /reset) tetap dievaluasi.
+        """
+        reply = self.replies.get(chunk_index)
+        if reply is None or reply[0] != content_key:
+            return None
+        return reply[1:]
+
+    def remember(self, chunk_index: int, content_key: str, events: list, text: str, model: str):
+        self.chunks += 1
+        self.replies[chunk_index] = (content_key, events, text, model)
+        self.replies.move_to_end(chunk_index)
+        while len(self.replies) > REPLAY_CHUNKS:
+            self.replies.popitem(last=False)
+
+    def summary(self) -> dict:
+        engine = self.engine
+        return {
+            "chunks": self.chunks,
+            "current_index": engine.current_index,
+            "target_len": len(engine.target_words),
+            "total_errors": sum(engine.word_errors.values()),
+            "word_errors": {i: n for i, n in engine.word_errors.items() if n},
+            "skipped": list(engine.skipped),
+            "repeated": engine.repeated_count,
+            "inserted": engine.inserted_count,
+        }
+
+
+class SessionStore:
+    """
+    Session store in-process untuk /evaluate.
+    - Urutan LRU (OrderedDict): sesi yang paling lama tidak dipakai ada di depan.
+    - Sesi yang idle lebih dari idle_ttl detik, atau melebihi max_sessions, dibuang
+      (dicek setiap kali store diakses, tanpa task background).
+    - on_evict(session, reason) dipanggil untuk setiap sesi yang dibuang / ditutup.
+    """
+
+    def __init__(self, idle_ttl: float = 1800.0, max_sessions: int = 10000,
+                 on_evict: Callable[[EvaluateSession, str], None] = None):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.on_evict = on_evict
+        self._sessions = OrderedDict() # (user_id, key) -> EvaluateSession
+
+        self.created = 0
+        self.reused = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+        self.closed = 0
+
+    def _evict(self, reason: str):
+        now = time.monotonic()
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if reason == "idle" and now - session.last_used <= self.idle_ttl:
+                break
+            if reason == "capacity" and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[key]
+            if reason == "idle":
+                self.evicted_idle += 1
+            else:
+                self.evicted_capacity += 1
+            self._notify(session, reason)
+
+    def _notify(self, session: EvaluateSession, reason: str):
+        if self.on_evict:
+            try:
+                self.on_evict(session, reason)
+            except Exception as e:
+                logger.info(f"⚠️ Hook sesi gagal: {e}")
+
+    def get_or_create(self, user_id: str, key: str, target: TargetText,
+                      factory: Callable[[], WordAlignmentEngine]) -> EvaluateSession:
+        self._evict("idle")
+
+        session = self._sessions.get((user_id, key))
+        if session is not None and session.target.words != target.words:
+            # Target berubah (mis. teks potongan ayat lain) -> mulai sesi baru
+            self.close(user_id, key, reason="target_changed")
+            session = None
+
+        if session is None:
+            session = EvaluateSession(user_id, key, target, factory())
+            self._sessions[(user_id, key)] = session
+            self.created += 1
+            self._evict("capacity")
+        else:
+            self.reused += 1
+            self._sessions.move_to_end((user_id, key))
+
+        session.last_used = time.monotonic()
+        return session
+
+    def close(self, user_id: str, key: str, reason: str = "closed") -> Optional[EvaluateSession]:
+        """Hapus sesi (dipanggil oleh /finish dan /reset). Mengembalikan sesi yang ditutup, kalau ada."""
+        session = self._sessions.pop((user_id, key), None)
+        if session is not None:
+            self.closed += 1
+            self._notify(session, reason)
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        self._evict("idle")
+        return {
+            "active": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "created": self.created,
+            "reused": self.reused,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+            "closed": self.closed,
+        }
@@ -0,0 +1,497 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+CHUNK_PREFIX = "chunk_"
+RECORDING_EXT = ".m4a"
+
+
+class QuotaExceeded(Exception):
+    """Chunk baru ditolak karena kuota disk (per user / global) sudah habis."""
+
+    def __init__(self, scope: str, used: int, limit: int, retry_after_seconds: int):
+        super().__init__(f"Kuota penyimpanan {scope} penuh ({used / MB:.2f}/{limit / MB:.2f} MB)")
+        self.scope = scope # user / global
+        self.used = used
+        self.limit = limit
+        self.retry_after_seconds = retry_after_seconds # Paling cepat sweep berikutnya (expire / kompaksi)
+
+
+@dataclass
+class ChunkSet:
+    """Folder chunk satu sesi /evaluate: STORAGE_PATH/<user_id>/<key_safe>/chunk_NNN.*"""
+    user_id: str
+    path: str
+    chunks: dict = field(default_factory=dict) # nama file -> ukuran (byte)
+    last_write: float = field(default_factory=time.time)
+
+    @property
+    def size(self) -> int:
+        return sum(self.chunks.values())
+
+
+@dataclass
+class Recording:
+    """Rekaman final: STORAGE_PATH/<user_id>/<user_id>_<key_safe>.m4a"""
+    user_id: str
+    path: str
+    size: int
+    mtime: float
+    compacted: bool = False
+
+
+def recording_key(user_id: str, name: str) -> Optional[str]:
+    """
+    Kebalikan StorageManager.recording_path: "u1_2_255.m4a" -> "2:255".
+    None kalau nama file bukan rekaman final milik user_id.
+    """
+    prefix = f"{user_id}_"
+    if not (name.startswith(prefix) and name.endswith(RECORDING_EXT)):
+        return None
+    key_safe = name[len(prefix):-len(RECORDING_EXT)]
+    surah, sep, ayah = key_safe.rpartition("_")
+    return f"{surah}:{ayah}" if sep else key_safe
+
+
+def _chunk_order(name: str):
+    # chunk_7.m4a < chunk_010.m4a < chunk_1000.m4a (urutan angka, bukan urutan string)
+    stem = name[len(CHUNK_PREFIX):].split(".", 1)[0]
+    return (int(stem), name) if stem.isdigit() else (float("inf"), name)
+
+
+class StorageManager:
+    """
+    Index folder rekaman di STORAGE_PATH dan garbage collector di thread background.
+    - Index in-memory (folder chunk per sesi + rekaman final per user) dibangun sekali dari
+      disk saat start, lalu diperbarui oleh write_chunk / finish / reset / export WebSocket,
+      jadi /finish dan /reset tidak perlu glob folder.
+    - Folder chunk yang tidak ditulis selama chunk_ttl detik (sesi ditinggal) dihapus.
+    - Kuota per user (user_quota) dan global (max_bytes), dalam byte (0 = tanpa batas), dihitung
+      dari chunk aktif + rekaman final: chunk baru ditolak di admit (QuotaExceeded), rekaman
+      yang sudah ada tidak pernah disentuh.
+    - evict_recordings (opt-in, default mati): kuota ditegakkan dengan menghapus rekaman final
+      tertua lewat sweep; admit hanya menolak kalau chunk aktif saja sudah melewati kuota.
+      Setiap penghapusan di-log (warning) dan dihitung di stats (evicted_recordings / evicted_bytes).
+    - Rekaman final yang lebih tua dari compact_after detik di-encode ulang ke compact_bit_rate
+      (nama file tetap, maksimal compact_batch file per sweep).
+    """
+
+    def __init__(self, root: str, chunk_ttl: float = 21600.0, user_quota: int = 0, max_bytes: int = 0,
+                 compact_after: float = 0.0, compact_bit_rate: int = 24000, compact_batch: int = 20,
+                 compact_fn: Optional[Callable[[str, int], int]] = None, sweep_interval: float = 300.0,
+                 evict_recordings: bool = False):
+        self.root = root
+        self.chunk_ttl = chunk_ttl
+        self.user_quota = user_quota
+        self.max_bytes = max_bytes
+        self.compact_after = compact_after
+        self.compact_bit_rate = compact_bit_rate
+        self.compact_batch = compact_batch
+        self.compact_fn = compact_fn
+        self.sweep_interval = sweep_interval
+        self.evict_recordings = evict_recordings
+
+        self._lock = threading.RLock()
+        self._chunk_sets = {} # path folder -> ChunkSet
+        self._recordings = {} # path file -> Recording
+        self._chunk_bytes = defaultdict(int) # user_id -> byte chunk aktif
+        self._reserved_bytes = defaultdict(int) # user_id -> byte chunk yang sudah di-admit, belum selesai ditulis
+        self._recording_bytes = defaultdict(int) # user_id -> byte rekaman final
+
+        self.scanned = False
+        self.expired_sets = 0
+        self.evicted_recordings = 0
+        self.evicted_bytes = 0
+        self.compacted = 0
+        self.compacted_saved_bytes = 0
+        self.compact_failed = 0
+        self.quota_rejected = 0
+        self.last_sweep = None # {"at", "seconds", ...}
+
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="storage-gc", daemon=True)
+        self._thread.start()
+
+    # --- Path ---
+    def session_dir(self, user_id: str, key: str) -> str:
+        return os.path.join(self.root, user_id, key.replace(":", "_"))
+
+    def recording_path(self, user_id: str, key: str) -> str:
+        return os.path.join(self.root, user_id, f"{user_id}_{key.replace(':', '_')}{RECORDING_EXT}")
+
+    # --- Akuntansi (dipanggil dengan _lock) ---
+    def _add_chunk(self, chunk_set: ChunkSet, name: str, size: int):
+        delta = size - chunk_set.chunks.get(name, 0)
+        chunk_set.chunks[name] = size
+        self._chunk_bytes[chunk_set.user_id] += delta
+
+    def _drop_chunk_set(self, chunk_set: ChunkSet):
+        self._chunk_sets.pop(chunk_set.path, None)
+        self._chunk_bytes[chunk_set.user_id] -= chunk_set.size
+        if self._chunk_bytes[chunk_set.user_id] <= 0:
+            del self._chunk_bytes[chunk_set.user_id]
+
+    def _add_recording(self, rec: Recording):
+        old = self._recordings.get(rec.path)
+        if old:
+            self._drop_recording(old)
+        self._recordings[rec.path] = rec
+        self._recording_bytes[rec.user_id] += rec.size
+
+    def _drop_recording(self, rec: Recording):
+        self._recordings.pop(rec.path, None)
+        self._recording_bytes[rec.user_id] -= rec.size
+        if self._recording_bytes[rec.user_id] <= 0:
+            del self._recording_bytes[rec.user_id]
+
+    def _unreserve(self, user_id: str, size: int):
+        self._reserved_bytes[user_id] -= size
+        if self._reserved_bytes[user_id] <= 0:
+            del self._reserved_bytes[user_id]
+
+    def _user_bytes(self, user_id: str) -> int:
+        return self._chunk_bytes.get(user_id, 0) + self._recording_bytes.get(user_id, 0)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._chunk_bytes.values()) + sum(self._recording_bytes.values())
+
+    # --- API (dipanggil dari handler / executor) ---
+    def admit(self, user_id: str, size: int):
+        """
+        Cek kuota sebelum chunk baru ditulis; melempar QuotaExceeded kalau chunk aktif (termasuk
+        yang masih ditulis) + rekaman final + chunk ini melewati kuota. Dengan evict_recordings
+        hanya chunk aktif yang dihitung dan sweep dibangunkan untuk menghapus rekaman tertua.
+        Kalau diterima, `size` byte dicadangkan sampai record_chunk (atau cancel kalau tulis gagal),
+        jadi upload bersamaan tidak lolos dengan total yang sama.
+        """
+        with self._lock:
+            if self.user_quota:
+                active = self._chunk_bytes.get(user_id, 0) + self._reserved_bytes.get(user_id, 0) + size
+                used = active if self.evict_recordings else active + self._recording_bytes.get(user_id, 0)
+                if used > self.user_quota:
+                    self._reject("user", used, self.user_quota)
+                if self.evict_recordings and active + self._recording_bytes.get(user_id, 0) > self.user_quota:
+                    self._wake.set()
+            if self.max_bytes:
+                active = sum(self._chunk_bytes.values()) + sum(self._reserved_bytes.values()) + size
+                used = active if self.evict_recordings else active + sum(self._recording_bytes.values())
+                if used > self.max_bytes:
+                    self._reject("global", used, self.max_bytes)
+                if self.evict_recordings and active + sum(self._recording_bytes.values()) > self.max_bytes:
+                    self._wake.set()
+            if size:
+                self._reserved_bytes[user_id] += size
+
+    def cancel(self, user_id: str, size: int):
+        """Lepas cadangan admit untuk chunk yang gagal ditulis."""
+        if size:
+            with self._lock:
+                self._unreserve(user_id, size)
+
+    def _reject(self, scope: str, used: int, limit: int):
+        self.quota_rejected += 1
+        raise QuotaExceeded(scope, used, limit, max(1, int(self.sweep_interval)))
+
+    def record_chunk(self, user_id: str, chunk_path: str, size: int):
+        """Chunk selesai ditulis ke disk (cadangan `size` byte dari admit dipindah ke chunk aktif)."""
+        session_dir, name = os.path.split(chunk_path)
+        with self._lock:
+            if size:
+                self._unreserve(user_id, size)
+            chunk_set = self._chunk_sets.get(session_dir)
+            if chunk_set is None:
+                chunk_set = self._chunk_sets[session_dir] = ChunkSet(user_id, session_dir)
+            self._add_chunk(chunk_set, name, size)
+            chunk_set.last_write = time.time()
+
+    def chunk_files(self, session_dir: str) -> List[str]:
+        """
+        Path chunk sesi, urut chunk_index. Dari index; folder yang belum ter-index
+        (mis. ditulis sebelum restart dan scan belum selesai) dibaca sekali dengan scandir.
+        Sesi yang dibaca dianggap aktif lagi (tidak akan di-expire oleh sweep berikutnya).
+        """
+        with self._lock:
+            chunk_set = self._chunk_sets.get(session_dir)
+            if chunk_set is not None:
+                chunk_set.last_write = time.time()
+                names = list(chunk_set.chunks)
+        if chunk_set is None:
+            chunk_set = self._scan_chunk_set(os.path.basename(os.path.dirname(session_dir)), session_dir)
+            if chunk_set is None:
+                return []
+            with self._lock:
+                if session_dir not in self._chunk_sets:
+                    self._chunk_sets[session_dir] = ChunkSet(chunk_set.user_id, session_dir)
+                    for name, size in chunk_set.chunks.items():
+                        self._add_chunk(self._chunk_sets[session_dir], name, size)
+            names = list(chunk_set.chunks)
+        return [os.path.join(session_dir, name) for name in sorted(names, key=_chunk_order)]
+
+    def release(self, session_dir: str) -> int:
+        """Hapus semua chunk sesi beserta foldernya (finish / reset / expire). Mengembalikan jumlah chunk."""
+        files = self.chunk_files(session_dir)
+        for path in files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(session_dir)
+        except OSError:
+            pass # Folder mungkin tidak kosong jika ada file lain
+        with self._lock:
+            chunk_set = self._chunk_sets.get(session_dir)
+            if chunk_set is not None:
+                self._drop_chunk_set(chunk_set)
+        return len(files)
+
+    def record_recording(self, user_id: str, path: str):
+        """Rekaman final baru ditulis (merge /finish atau export WebSocket)."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._add_recording(Recording(user_id, path, st.st_size, st.st_mtime))
+            over = self.evict_recordings and self.user_quota and self._user_bytes(user_id) > self.user_quota
+        if over:
+            self._wake.set()
+
+    # --- Scan awal ---
+    def _scan_chunk_set(self, user_id: str, path: str) -> Optional[ChunkSet]:
+        chunk_set = ChunkSet(user_id, path, last_write=0.0)
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.startswith(CHUNK_PREFIX) and entry.is_file():
+                        st = entry.stat()
+                        chunk_set.chunks[entry.name] = st.st_size
+                        chunk_set.last_write = max(chunk_set.last_write, st.st_mtime)
+            if not chunk_set.chunks:
+                chunk_set.last_write = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        return chunk_set
+
+    def scan(self):
+        """Bangun index dari disk (sekali saat start, di thread GC)."""
+        start = time.time()
+        chunk_sets, recordings = [], []
+        try:
+            user_entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            user_entries = []
+
+        for user_entry in user_entries:
+            if not user_entry.is_dir():
+                continue
+            user_id = user_entry.name
+            with os.scandir(user_entry.path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        chunk_set = self._scan_chunk_set(user_id, entry.path)
+                        if chunk_set is not None:
+                            chunk_sets.append(chunk_set)
+                    elif entry.name.endswith(RECORDING_EXT):
+                        st = entry.stat()
+                        recordings.append(Recording(user_id, entry.path, st.st_size, st.st_mtime))
+
+        # Entri yang sudah dicatat handler selama scan berjalan lebih baru, jangan ditimpa
+        with self._lock:
+            for chunk_set in chunk_sets:
+                if chunk_set.path in self._chunk_sets:
+                    continue
+                indexed = self._chunk_sets[chunk_set.path] = ChunkSet(chunk_set.user_id, chunk_set.path, last_write=chunk_set.last_write)
+                for name, size in chunk_set.chunks.items():
+                    self._add_chunk(indexed, name, size)
+            for rec in recordings:
+                if rec.path not in self._recordings:
+                    self._add_recording(rec)
+            self.scanned = True
+
+        logger.info(
+            f"🗂️ Index storage: {len(chunk_sets)} folder chunk, {len(recordings)} rekaman, "
+            f"{self.total_bytes / MB:.1f} MB ({time.time() - start:.2f} detik)"
+        )
+
+    # --- Sweep ---
+    def _evict_oldest(self, recordings: List[Recording], excess: int) -> int:
+        """
+        Policy evict_recordings: hapus rekaman tertua sampai `excess` byte terbebas.
+        Mengembalikan byte yang dihapus.
+        """
+        freed = 0
+        for rec in sorted(recordings, key=lambda r: r.mtime):
+            if freed >= excess:
+                break
+            try:
+                os.remove(rec.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"❌ Gagal menghapus rekaman {rec.path}: {e}")
+                continue
+            with self._lock:
+                if self._recordings.get(rec.path) is rec:
+                    self._drop_recording(rec)
+                self.evicted_recordings += 1
+                self.evicted_bytes += rec.size
+            freed += rec.size
+            logger.warning(f"🗑️ evict_recordings: rekaman {rec.path} ({rec.size / MB:.1f} MB) dihapus karena kuota penuh")
+        return freed
+
+    def sweep(self) -> dict:
+        start = time.time()
+        now = time.time()
+        result = {"expired": 0, "evicted": 0, "compacted": 0}
+
+        # 1. Folder chunk yang ditinggal
+        if self.chunk_ttl:
+            with self._lock:
+                stale = [s.path for s in self._chunk_sets.values() if now - s.last_write > self.chunk_ttl]
+            for path in stale:
+                with self._lock:
+                    chunk_set = self._chunk_sets.get(path)
+                    if chunk_set is None or now - chunk_set.last_write <= self.chunk_ttl:
+                        continue # Ditulis lagi sejak daftar dibuat
+                removed = self.release(path)
+                with self._lock:
+                    self.expired_sets += 1
+                result["expired"] += 1
+                logger.info(f"🧹 Chunk sesi ditinggal dihapus: {path} ({removed} chunk)")
+
+        # 2. Policy evict_recordings: rekaman final tertua dulu (chunk aktif tidak pernah dihapus di sini)
+        evicted_before = self.evicted_recordings
+        if self.evict_recordings and self.user_quota:
+            with self._lock:
+                over = {
+                    user_id: self._user_bytes(user_id) - self.user_quota
+                    for user_id in set(self._chunk_bytes) | set(self._recording_bytes)
+                    if self._user_bytes(user_id) > self.user_quota
+                }
+                candidates = {
+                    user_id: [r for r in self._recordings.values() if r.user_id == user_id] for user_id in over
+                }
+            for user_id, excess in over.items():
+                self._evict_oldest(candidates[user_id], excess)
+        if self.evict_recordings and self.max_bytes:
+            excess = self.total_bytes - self.max_bytes
+            if excess > 0:
+                with self._lock:
+                    candidates = list(self._recordings.values())
+                self._evict_oldest(candidates, excess)
+        result["evicted"] = self.evicted_recordings - evicted_before
+
+        # 3. Kompaksi rekaman lama
+        if self.compact_after and self.compact_fn:
+            with self._lock:
+                candidates = sorted(
+                    (r for r in self._recordings.values() if not r.compacted and now - r.mtime > self.compact_after),
+                    key=lambda r: r.mtime,
+                )[:self.compact_batch]
+            for rec in candidates:
+                if self._closed:
+                    break
+                result["compacted"] += self._compact(rec)
+
+        self.last_sweep = dict(result, at=now, seconds=round(time.time() - start, 3))
+        return result
+
+    def _compact(self, rec: Recording) -> int:
+        try:
+            saved = self.compact_fn(rec.path, self.compact_bit_rate)
+        except FileNotFoundError:
+            with self._lock:
+                if self._recordings.get(rec.path) is rec:
+                    self._drop_recording(rec)
+            return 0
+        except Exception as e:
+            logger.error(f"❌ Kompaksi {rec.path} gagal: {e}")
+            with self._lock:
+                self.compact_failed += 1
+                rec.compacted = True # Jangan dicoba ulang setiap sweep
+            return 0
+
+        with self._lock:
+            rec.compacted = True
+            if saved and self._recordings.get(rec.path) is rec:
+                self._recording_bytes[rec.user_id] -= saved
+                rec.size -= saved
+                self.compacted += 1
+                self.compacted_saved_bytes += saved
+        if saved:
+            logger.info(f"🗜️ Rekaman {rec.path} dikompaksi, hemat {saved / 1024:.0f} KB")
+        return 1 if saved else 0
+
+    def _loop(self):
+        try:
+            self.scan()
+        except Exception as e:
+            logger.error(f"❌ Scan storage gagal: {e}")
+        while True:
+            self._wake.wait(self.sweep_interval)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"❌ Sweep storage gagal: {e}")
+
+    # --- Status ---
+    def usage(self) -> dict:
+        """Ringkas (untuk gauge Prometheus): byte chunk, byte rekaman, jumlah folder chunk."""
+        with self._lock:
+            return {
+                "chunk_bytes": sum(self._chunk_bytes.values()),
+                "recording_bytes": sum(self._recording_bytes.values()),
+                "chunk_sets": len(self._chunk_sets),
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            chunk_bytes = sum(self._chunk_bytes.values())
+            recording_bytes = sum(self._recording_bytes.values())
+            users = set(self._chunk_bytes) | set(self._recording_bytes)
+            top_users = sorted(users, key=self._user_bytes, reverse=True)[:10]
+            return {
+                "scanned": self.scanned,
+                "chunk_sets": len(self._chunk_sets),
+                "chunk_bytes": chunk_bytes,
+                "reserved_bytes": sum(self._reserved_bytes.values()),
+                "recordings": len(self._recordings),
+                "recording_bytes": recording_bytes,
+                "total_bytes": chunk_bytes + recording_bytes,
+                "users": len(users),
+                "top_users": {user_id: self._user_bytes(user_id) for user_id in top_users},
+                "user_quota": self.user_quota,
+                "max_bytes": self.max_bytes,
+                "evict_recordings": self.evict_recordings,
+                "chunk_ttl": self.chunk_ttl,
+                "compact_after": self.compact_after,
+                "compact_bit_rate": self.compact_bit_rate,
+                "expired_sets": self.expired_sets,
+                "evicted_recordings": self.evicted_recordings,
+                "evicted_bytes": self.evicted_bytes,
+                "compacted": self.compacted,
+                "compacted_saved_bytes": self.compacted_saved_bytes,
+                "compact_failed": self.compact_failed,
+                "quota_rejected": self.quota_rejected,
+                "last_sweep": self.last_sweep,
+            }
+
+    def close(self, timeout: float = 5.0):
+        """Hentikan thread GC (kompaksi yang sedang berjalan diselesaikan dulu)."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,356 @@
+import asyncio
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------
+# RING BUFFER AUDIO (untuk AI)
+# ------------------------------------------------
+class AudioRingBuffer:
+    """
+    Ring buffer float32 berukuran tetap. Setiap sampel ditulis dua kali (i dan i + capacity)
+    sehingga N sampel terakhir selalu bisa diambil sebagai satu slice kontigu tanpa copy.
+    Tidak ada alokasi ulang selama sesi berlangsung.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = np.zeros(capacity * 2, dtype=np.float32)
+        self._end = 0 # total sampel yang pernah ditulis
+        self._count = 0 # sampel valid yang belum dibuang
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def total_written(self) -> int:
+        return self._end
+
+    def write_pcm16(self, raw_bytes: bytes):
+        """Konversi int16 -> float32 langsung ke dalam buffer (tanpa array perantara)."""
+        src = np.frombuffer(raw_bytes, dtype=np.int16)
+        if len(src) > self.capacity:
+            # Hanya sampel terakhir yang muat
+            self._end += len(src) - self.capacity
+            src = src[-self.capacity:]
+
+        n = len(src)
+        start = self._end % self.capacity
+        first = min(n, self.capacity - start)
+
+        for dst, part in ((start, src[:first]), (0, src[first:])):
+            if len(part) == 0:
+                continue
+            main = self._buf[dst:dst + len(part)]
+            np.multiply(part, 1.0 / 32768.0, out=main, casting="unsafe")
+            self._buf[dst + self.capacity:dst + self.capacity + len(part)] = main
+
+        self._end += n
+        self._count = min(self._count + n, self.capacity)
+
+    def latest(self, n: int) -> np.ndarray:
+        """
+        View (bukan copy) dari n sampel terakhir.
+        View ini hanya valid sampai write_pcm16 berikutnya menimpa area tersebut.
+        """
+        n = min(n, self._count)
+        end = self._end % self.capacity + self.capacity
+        return self._buf[end - n:end]
+
+    def keep(self, n: int):
+        """Buang sampel lama, sisakan n sampel terakhir (untuk overlap)."""
+        self._count = min(self._count, n)
+
+    def clear(self):
+        self._count = 0
+
+
+# ------------------------------------------------
+# GERBANG SUARA (ENERGY GATE) SEBELUM INFERENSI
+# ------------------------------------------------
+def frame_rms(audio: np.ndarray, frame_size: int) -> np.ndarray:
+    """RMS per frame (vectorized). Sisa sampel yang tidak genap satu frame diabaikan."""
+    n = len(audio) // frame_size * frame_size
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n].reshape(-1, frame_size)
+    return np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame_size)
+
+
+class SpeechGate:
+    """
+    Deteksi suara berbasis energi per frame (murah, tanpa model).
+    - is_speech(window): apakah window layak dikirim ke AI (ada cukup frame bersuara).
+    - update(new_audio): dipanggil untuk setiap frame WebSocket yang masuk,
+      mengembalikan True tepat satu kali saat suara berhenti (hening >= hangover),
+      sebagai sinyal untuk mem-flush window terakhir lebih awal. Sisa sampel yang belum
+      genap satu frame disimpan dan disambung ke awal audio panggilan berikutnya.
+    """
+
+    def __init__(self, sample_rate: int, threshold: float, frame_ms: int = 20,
+                 hangover_ms: int = 400, min_speech_ms: int = 60):
+        self.threshold = threshold
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.hangover_samples = self.hangover_frames * self.frame_size
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+
+        self.in_speech = False
+        self._speech_frames = 0 # frame bersuara sejak suara terakhir berhenti
+        self._silent_frames = 0 # frame hening berturut-turut terakhir
+        self._remainder = np.zeros(0, dtype=np.float32) # < frame_size sampel dari update sebelumnya
+
+        self.windows_checked = 0
+        self.windows_skipped = 0
+        self.early_flushes = 0
+
+    def is_speech(self, window: np.ndarray) -> bool:
+        self.windows_checked += 1
+        voiced = np.count_nonzero(frame_rms(window, self.frame_size) > self.threshold)
+        if voiced < self.min_speech_frames:
+            self.windows_skipped += 1
+            return False
+        return True
+
+    def update(self, new_audio: np.ndarray) -> bool:
+        if len(self._remainder):
+            new_audio = np.concatenate((self._remainder, new_audio))
+        tail = len(new_audio) % self.frame_size
+        self._remainder = new_audio[len(new_audio) - tail:].copy()
+        voiced = frame_rms(new_audio, self.frame_size) > self.threshold
+        if len(voiced) == 0:
+            return False
+
+        hits = np.flatnonzero(voiced)
+        if len(hits):
+            self._speech_frames += len(hits)
+            self._silent_frames = len(voiced) - 1 - hits[-1]
+            if self._speech_frames >= self.min_speech_frames:
+                self.in_speech = True
+        else:
+            self._silent_frames += len(voiced)
+
+        if self._silent_frames < self.hangover_frames:
+            return False
+
+        # Hening cukup lama: klik/noise pendek sebelumnya tidak dihitung lagi
+        self._speech_frames = 0
+        if self.in_speech:
+            self.in_speech = False
+            self.early_flushes += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "windows_checked": self.windows_checked,
+            "windows_skipped": self.windows_skipped,
+            "early_flushes": self.early_flushes,
+        }
+
+
+# ------------------------------------------------
+# SPOOL PCM KE DISK (untuk File Save)
+# ------------------------------------------------
+class PcmSpool:
+    """
+    Menampung raw PCM sesi WebSocket di file sementara, ditulis per chunk,
+    sehingga memori per koneksi tetap datar berapa pun panjang bacaannya.
+    """
+
+    def __init__(self, directory: str = None, chunk_bytes: int = 64 * 1024):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(prefix="ws_", suffix=".pcm", dir=directory, delete=False)
+        self.path = self._file.name
+        self.chunk_bytes = chunk_bytes
+        self.nbytes = 0
+        self._pending = bytearray()
+
+    def write(self, data: bytes):
+        self._pending += data
+        self.nbytes += len(data)
+        if len(self._pending) >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._pending and not self._file.closed:
+            self._file.write(self._pending)
+            self._pending.clear()
+
+    def close(self):
+        """Tutup file; isinya tetap ada di self.path untuk diproses."""
+        self.flush()
+        self._file.close()
+
+    def discard(self):
+        self._pending.clear()
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# ------------------------------------------------
+# PIPELINE PRODUCER / CONSUMER PER SESI
+# ------------------------------------------------
+class StreamingPipeline:
+    """
+    Loop penerima frame hanya memanggil push() (tidak pernah menunggu AI).
+    Transkripsi berjalan di background task. Kalau AI tertinggal, window yang
+    menumpuk digabung jadi satu (dibatasi max_pending_samples, sisanya dibuang)
+    sehingga latency tetap terbatas.
+    """
+
+    def __init__(self, transcribe, on_result, max_pending_samples: int):
+        self.transcribe = transcribe # async fn(audio) -> text
+        self.on_result = on_result # async fn(text)
+        self.max_pending_samples = max_pending_samples
+
+        self._pending = None
+        self._wakeup = asyncio.Event()
+        self._busy = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+        self.windows_pushed = 0
+        self.windows_merged = 0
+        self.samples_dropped = 0
+        self.windows_processed = 0
+
+    def push(self, window: np.ndarray, new_samples: int):
+        """
+        window: salinan window terbaru (bukan view ring buffer).
+        new_samples: jumlah sampel baru sejak window sebelumnya.
+        """
+        self.windows_pushed += 1
+
+        if self._pending is None:
+            self._pending = window
+        else:
+            # Window sebelumnya belum sempat diproses -> gabungkan audio barunya saja
+            self.windows_merged += 1
+            new_part = window[-new_samples:] if new_samples < len(window) else window
+            merged = np.concatenate((self._pending, new_part))
+            if len(merged) > self.max_pending_samples:
+                self.samples_dropped += len(merged) - self.max_pending_samples
+                merged = merged[-self.max_pending_samples:]
+            self._pending = merged
+
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            audio, self._pending = self._pending, None
+            if audio is None:
+                continue
+
+            self._busy = True
+            try:
+                text = await self.transcribe(audio)
+                self.windows_processed += 1
+                await self.on_result(text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info(f"⚠️ Transcription Error: {e}")
+            finally:
+                self._busy = False
+
+    @property
+    def idle(self) -> bool:
+        return self._pending is None and not self._busy
+
+    async def drain(self, timeout: float):
+        """Tunggu window yang tersisa selesai diproses (dipakai saat sinyal finish)."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not self.idle and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.02)
+
+    def close(self):
+        self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "windows_pushed": self.windows_pushed,
+            "windows_merged": self.windows_merged,
+            "windows_processed": self.windows_processed,
+            "samples_dropped": self.samples_dropped,
+        }
+
+
+# ------------------------------------------------
+# STREAMING INCREMENTAL (LocalAgreement)
+# ------------------------------------------------
+class IncrementalTranscriber:
+    """
+    State decoding incremental per sesi.
+    - Hanya audio yang belum ter-commit yang di-decode ulang (bukan window overlap penuh).
+    - Prompt = ekor teks yang sudah ter-commit (bukan initial_prompt penuh setiap kali).
+    - Kata di-commit kalau dua hipotesis berturut-turut sepakat (prefix yang sama),
+      sehingga setiap kata hanya sekali dikirim ke WordAlignmentEngine.feed.
+    """
+
+    def __init__(self, sample_rate: int, max_buffer_seconds: float, normalize=str.strip,
+                 fallback_prompt: str = "", prompt_words: int = 20):
+        self.sample_rate = sample_rate
+        self.max_buffer_samples = int(sample_rate * max_buffer_seconds)
+        self.normalize = normalize
+        self.fallback_prompt = fallback_prompt
+        self.prompt_words = prompt_words
+
+        self.audio = np.zeros(0, dtype=np.float32) # audio sejak titik commit terakhir
+        self.committed = [] # kata yang sudah final
+        self.previous = [] # hipotesis terakhir (kata, start, end) relatif ke awal self.audio
+
+    def insert(self, new_audio: np.ndarray):
+        self.audio = np.concatenate((self.audio, new_audio))
+
+    def prompt(self) -> str:
+        if self.committed:
+            return " ".join(self.committed[-self.prompt_words:])
+        return self.fallback_prompt
+
+    def commit(self, words) -> list:
+        """Bandingkan hipotesis baru dengan sebelumnya, kembalikan kata yang baru ter-commit."""
+        agreed = 0
+        for (w_new, _, _), (w_old, _, _) in zip(words, self.previous):
+            if self.normalize(w_new) != self.normalize(w_old):
+                break
+            agreed += 1
+
+        # Buffer terlalu panjang tanpa kesepakatan -> paksa commit semua kecuali kata terakhir
+        if agreed == 0 and len(self.audio) > self.max_buffer_samples and len(words) > 1:
+            agreed = len(words) - 1
+
+        delta = [w for w, _, _ in words[:agreed]]
+        remaining = words[agreed:]
+
+        if agreed:
+            self.committed.extend(delta)
+            cut = min(int(words[agreed - 1][2] * self.sample_rate), len(self.audio))
+            self.audio = self.audio[cut:]
+            offset = cut / self.sample_rate
+            remaining = [(w, max(0.0, s - offset), max(0.0, e - offset)) for w, s, e in remaining]
+        elif len(self.audio) > self.max_buffer_samples:
+            # Tetap tidak ada kata (hening / noise): buang audio lama
+            self.audio = self.audio[-self.max_buffer_samples:]
+
+        self.previous = remaining
+        return delta
+
+    def flush(self) -> list:
+        """Commit sisa hipotesis (dipakai saat sesi selesai)."""
+        delta = [w for w, _, _ in self.previous]
+        self.committed.extend(delta)
+        self.previous = []
+        self.audio = self.audio[:0]
+        return delta
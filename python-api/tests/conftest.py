@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul API ada di root python-api (tanpa package), sama seperti scripts/ dan benchmarks/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,20 @@
+"""Implementasi regex lama normalize_arabic / tokenize_words (referensi untuk tests/ dan benchmarks/)."""
+import re
+
+ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u06D6-\u06ED]")
+
+
+def normalize_arabic_regex(text: str) -> str:
+    text = text.strip()
+    text = ARABIC_DIACRITICS.sub("", text)
+    text = re.sub("[إأٱآا]", "ا", text)
+    text = re.sub("[ؤ]", "و", text)
+    text = re.sub("[ئ]", "ي", text)
+    text = re.sub("ة", "ه", text)
+    text = re.sub(r"[^\u0600-\u06FF\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def tokenize_words_regex(text: str):
+    t = normalize_arabic_regex(text)
+    return t.split() if t else []
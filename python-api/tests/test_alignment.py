@@ -0,0 +1,76 @@
+"""
+Kesetaraan normalize_arabic / tokenize_words (tabel str.translate) dengan implementasi
+regex lama (tests/regex_reference.py), pada teks Utsmani di tests/fixtures, seluruh verse
+index kalau sudah dibuat (VERSE_INDEX_PATH), dan string acak campuran aksara.
+
+    pip install -r requirements.txt -r tests/requirements.txt
+    python -m pytest tests
+"""
+import os
+import random
+
+import pytest
+
+from alignment import normalize_arabic, tokenize_words
+from regex_reference import normalize_arabic_regex, tokenize_words_regex
+from verse_index import VerseIndex
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERSE_INDEX_PATH = os.getenv("VERSE_INDEX_PATH", os.path.join(API_DIR, "data", "quran_index.json.gz"))
+
+def load_verses():
+    verses = []
+    with open(os.path.join(FIXTURES, "quran_uthmani.txt"), encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                key, text = line.rstrip("\n").split("\t", 1)
+                verses.append(pytest.param(text, id=key))
+    return verses
+
+
+def load_index_verses():
+    """Seluruh teks di verse index hasil build (kosong kalau index belum dibuat)."""
+    if not os.path.exists(VERSE_INDEX_PATH):
+        return []
+    index = VerseIndex.load(VERSE_INDEX_PATH)
+    return [pytest.param(verse.text, id=key) for key, verse in index.verses.items()]
+
+
+def random_texts(n: int, seed: int):
+    rng = random.Random(seed)
+    pool = (
+        [chr(c) for c in range(0x0600, 0x0700)]
+        + [chr(c) for c in range(0x0750, 0x0780)] + [chr(c) for c in range(0x08A0, 0x0900)]
+        + list("abcXYZ0123456789.,!?-()") + ["é", "ß", "ж", "中", "😀"]
+        + [" ", "  ", "\t", "\n", "\r", "\x1c", "\u00A0", "\u2003", "\u3000", "\u200B", "\u200C", "\uFEFF"]
+        + ["\uFDF2", "\uFE8E", "\uFEFB", "\u0640"]
+    )
+    return ["".join(rng.choice(pool) for _ in range(rng.randint(0, 80))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("text", load_verses())
+def test_quran_text_matches_regex(text):
+    assert normalize_arabic(text) == normalize_arabic_regex(text)
+    assert tokenize_words(text) == tokenize_words_regex(text)
+
+
+@pytest.mark.skipif(not os.path.exists(VERSE_INDEX_PATH), reason=f"verse index belum dibuat: {VERSE_INDEX_PATH}")
+@pytest.mark.parametrize("text", load_index_verses())
+def test_verse_index_matches_regex(text):
+    assert normalize_arabic(text) == normalize_arabic_regex(text)
+    assert tokenize_words(text) == tokenize_words_regex(text)
+
+
+def test_quran_text_strips_diacritics():
+    # Sanity: fixture benar-benar berisi harakat & tanda waqaf yang harus hilang
+    # (alif khanjariyah U+0670 di luar rentang harakat lama, jadi tetap ada)
+    assert tokenize_words("ذَٰلِكَ ٱلْكِتَٰبُ لَا رَيْبَ ۛ فِيهِ ۛ") == ["ذ\u0670لك", "الكت\u0670ب", "لا", "ريب", "فيه"]
+    assert normalize_arabic("وَلَهُۥ يَسْجُدُونَ ۩") == "وله يسجدون"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_mixed_script_matches_regex(seed):
+    for text in random_texts(2000, seed):
+        assert normalize_arabic(text) == normalize_arabic_regex(text), repr(text)
+        assert tokenize_words(text) == tokenize_words_regex(text), repr(text)
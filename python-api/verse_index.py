@@ -0,0 +1,92 @@
+import gzip
+import json
+import logging
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from alignment import normalizer_fingerprint, tokenize_words
+
+logger = logging.getLogger(__name__)
+
+# Versi format file; token di dalamnya juga ditandai dengan sidik jari normalizer yang membuatnya
+INDEX_VERSION = 2
+NORMALIZER = normalizer_fingerprint()
+
+
+@dataclass(frozen=True)
+class TargetText:
+    """Teks target yang sudah dinormalisasi & ditokenisasi (dipakai ulang lintas request)."""
+    key: Optional[str]
+    text: str
+    words: Tuple[str, ...]
+
+
+@lru_cache(maxsize=int(os.getenv("TARGET_CACHE_SIZE", "2048")))
+def _target_from_text(text: str) -> TargetText:
+    return TargetText(None, text, tuple(tokenize_words(text)))
+
+
+class VerseIndex:
+    """
+    Index ayat berdasarkan key "surah:ayah".
+    File index (gzip JSON) sudah berisi token ternormalisasi, jadi saat startup
+    tidak ada regex normalisasi yang dijalankan sama sekali.
+    """
+
+    def __init__(self, verses: Dict[str, TargetText] = None):
+        self.verses = verses or {}
+
+    @classmethod
+    def load(cls, path: str) -> "VerseIndex":
+        if not path or not os.path.exists(path):
+            logger.info(f"⚠️ Verse index tidak ditemukan ({path}), hanya memakai target_text dari client")
+            return cls()
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") not in (1, INDEX_VERSION): # v1 = tanpa sidik jari normalizer, token dihitung ulang
+            logger.info(f"⚠️ Versi verse index tidak cocok ({data.get('version')}), diabaikan")
+            return cls()
+
+        if data.get("normalizer") == NORMALIZER:
+            verses = {
+                key: TargetText(key, item["text"], tuple(item["tokens"]))
+                for key, item in data["verses"].items()
+            }
+        else:
+            # Normalizer berubah sejak index dibuat: token tersimpan basi, tokenisasi ulang dari teks
+            logger.warning(f"⚠️ Verse index dibuat dengan normalizer {data.get('normalizer')} (sekarang {NORMALIZER}), "
+                           f"token dihitung ulang - jalankan ulang scripts/build_verse_index.py")
+            verses = {
+                key: TargetText(key, item["text"], tuple(tokenize_words(item["text"])))
+                for key, item in data["verses"].items()
+            }
+        logger.info(f"📖 Verse index dimuat: {len(verses)} ayat")
+        return cls(verses)
+
+    def __len__(self):
+        return len(self.verses)
+
+    def get(self, key: str = None, text: str = None) -> Optional[TargetText]:
+        """
+        target_text dari client tetap diutamakan (bisa saja bukan ayat utuh);
+        kalau kosong, teks diambil dari index berdasarkan key.
+        Mengembalikan None kalau keduanya tidak tersedia.
+        """
+        verse = self.verses.get(key) if key else None
+        if text:
+            if verse is not None and verse.text == text:
+                return verse
+            return _target_from_text(text)
+        return verse
+
+    @staticmethod
+    def save(path: str, texts: Dict[str, str]):
+        """Tulis file index dari mapping key -> teks (dipakai oleh scripts/build_verse_index.py)."""
+        verses = {key: {"text": text, "tokens": tokenize_words(text)} for key, text in texts.items()}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "normalizer": NORMALIZER, "verses": verses}, f, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,265 @@
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, List, Union
+
+import numpy as np
+
+from inference import transcribe_batch, warm_up
+
+logger = logging.getLogger(__name__)
+
+# Jeda sebelum worker yang mati di-spawn ulang; digandakan setiap kali worker mati
+# sebelum sempat siap (mis. OOM saat load model) supaya tidak crash-loop
+RESPAWN_DELAY = 1.0
+RESPAWN_MAX_DELAY = 60.0
+
+
+def _worker_main(conn, model_id: str, device: str, compute_type: str, cpu_threads: int, warmup: bool):
+    """Loop di dalam proses worker: satu proses = satu instance model."""
+    from faster_whisper import WhisperModel
+
+    load_start = time.time()
+    model = WhisperModel(model_id, device=device, compute_type=compute_type, cpu_threads=cpu_threads, num_workers=1)
+    timings = {"load": time.time() - load_start}
+    if warmup:
+        timings["warmup"] = warm_up(model)
+    conn.send(("ready", timings, None))
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+
+        job_id, profile, shm_name, specs, prompts = job
+        shm = SharedMemory(name=shm_name) if shm_name else None
+        audios = []
+        try:
+            for spec in specs:
+                if isinstance(spec, str):
+                    audios.append(spec) # path file, didecode di worker
+                else:
+                    offset, length = spec
+                    audios.append(np.ndarray((length,), dtype=np.float32, buffer=shm.buf, offset=offset))
+
+            texts = transcribe_batch(model, audios, prompts, profile)
+            conn.send((job_id, texts, None))
+        except Exception as e:
+            conn.send((job_id, None, repr(e)))
+        finally:
+            # View numpy harus dilepas dulu sebelum shared memory ditutup
+            audios = None
+            if shm:
+                shm.close()
+
+
+class _Worker:
+    def __init__(self, index: int, ctx, model_id: str, device: str, compute_type: str, cpu_threads: int,
+                 warmup: bool, on_exit: Callable[["_Worker"], None] = None):
+        self.index = index
+        self.on_exit = on_exit
+        self.cpu_threads = cpu_threads
+        self.timings = {}
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, model_id, device, compute_type, cpu_threads, warmup),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        self.ready = threading.Event()
+        self.alive = True
+        self.closing = False
+        self.in_flight = 0 # jumlah klip yang sedang diproses worker ini
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        self.receiver = threading.Thread(target=self._receive_loop, daemon=True)
+        self.receiver.start()
+
+    def _receive_loop(self):
+        while True:
+            try:
+                job_id, texts, error = self.conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if job_id == "ready":
+                self.timings = {name: round(value, 3) for name, value in texts.items()}
+                logger.info(f"✅ Worker #{self.index} (pid {self.process.pid}) siap dengan {self.cpu_threads} thread {self.timings}")
+                self.ready.set()
+                continue
+
+            with self.lock:
+                future = self.pending.pop(job_id, None)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(texts)
+
+        # Proses worker mati: gagalkan semua job yang masih menunggu
+        self.alive = False
+        self.ready.set()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(f"Worker #{self.index} berhenti"))
+        if not self.closing:
+            self.process.join(timeout=1)
+            logger.error(f"❌ Worker #{self.index} berhenti (exit code {self.process.exitcode})")
+            if self.on_exit:
+                self.on_exit(self)
+
+    def submit(self, job_id: int, profile: str, shm_name, specs, prompts) -> Future:
+        future = Future()
+        with self.lock:
+            if not self.alive:
+                raise RuntimeError(f"Worker #{self.index} tidak aktif")
+            self.pending[job_id] = future
+            self.conn.send((job_id, profile, shm_name, specs, prompts))
+        return future
+
+
+class InferenceWorkerPool:
+    """
+    Pool proses inferensi. Setiap proses punya model sendiri dengan budget thread
+    sendiri. Audio dikirim lewat shared memory (bukan array yang di-pickle),
+    dan setiap batch diarahkan ke worker siap dengan beban paling ringan.
+    Worker yang mati (pipe EOF) di-spawn ulang di slot yang sama (load + warm-up lagi);
+    jumlah mati / restart per slot ada di stats().
+    """
+
+    def __init__(self, num_workers: int, model_id: str, device: str, compute_type: str, cpu_threads: int,
+                 warmup: bool = False):
+        # "spawn" agar worker tidak mewarisi state event loop / thread dari uvicorn
+        ctx = multiprocessing.get_context("spawn")
+        self._spawn_args = (ctx, model_id, device, compute_type, cpu_threads, warmup)
+        self._job_ids = itertools.count()
+        self._route_lock = threading.Lock()
+        self._closing = False
+        self._respawn_timers = {} # index -> threading.Timer
+        self.deaths = [0] * num_workers
+        self.restarts = [0] * num_workers
+        self._load_failures = [0] * num_workers # mati sebelum siap, berturut-turut
+        self.workers = [self._spawn(i) for i in range(num_workers)]
+
+    def _spawn(self, index: int) -> _Worker:
+        return _Worker(index, *self._spawn_args, on_exit=self._on_worker_exit)
+
+    def _on_worker_exit(self, worker: _Worker):
+        """Dipanggil dari thread penerima worker yang mati: jadwalkan spawn ulang slotnya."""
+        with self._route_lock:
+            if self._closing or self.workers[worker.index] is not worker:
+                return
+            self.deaths[worker.index] += 1
+            if worker.timings:
+                self._load_failures[worker.index] = 0
+            else:
+                self._load_failures[worker.index] += 1
+            delay = min(RESPAWN_MAX_DELAY, RESPAWN_DELAY * 2 ** self._load_failures[worker.index])
+            timer = threading.Timer(delay, self._respawn, (worker.index,))
+            timer.daemon = True
+            self._respawn_timers[worker.index] = timer
+            timer.start()
+        logger.warning(f"🔁 Worker #{worker.index} akan di-restart dalam {delay:.1f} detik")
+
+    def _respawn(self, index: int):
+        with self._route_lock:
+            self._respawn_timers.pop(index, None)
+            if self._closing:
+                return
+            worker = self.workers[index] = self._spawn(index)
+            self.restarts[index] += 1
+        logger.info(f"🔁 Worker #{index} di-restart (pid {worker.process.pid}, restart ke-{self.restarts[index]})")
+
+    def _pick_worker(self, size: int) -> _Worker:
+        with self._route_lock:
+            alive = [w for w in self.workers if w.alive]
+            if not alive:
+                raise RuntimeError("Tidak ada worker inferensi yang hidup (menunggu restart)")
+            # Worker hasil restart yang masih load / warm-up hanya dipakai kalau tidak ada yang siap
+            ready = [w for w in alive if w.ready.is_set()] or alive
+            worker = min(ready, key=lambda w: w.in_flight)
+            worker.in_flight += size
+            return worker
+
+    def run_batch(self, profile: str, audios: List[Union[str, np.ndarray]], prompts: List[str]) -> List[str]:
+        """Dipanggil dari thread executor (blocking sampai worker selesai)."""
+        arrays = [np.ascontiguousarray(a, dtype=np.float32) if not isinstance(a, str) else a for a in audios]
+        total_bytes = sum(a.nbytes for a in arrays if not isinstance(a, str))
+
+        # Worker dipilih sebelum shared memory dibuat (tidak bocor kalau semua worker sedang restart)
+        worker = self._pick_worker(len(audios))
+        shm = None
+        try:
+            shm = SharedMemory(create=True, size=total_bytes) if total_bytes else None
+            specs = []
+            offset = 0
+            for a in arrays:
+                if isinstance(a, str):
+                    specs.append(a)
+                    continue
+                view = np.ndarray(a.shape, dtype=np.float32, buffer=shm.buf, offset=offset)
+                view[:] = a
+                del view
+                specs.append((offset, len(a)))
+                offset += a.nbytes
+
+            worker.ready.wait()
+            future = worker.submit(next(self._job_ids), profile, shm.name if shm else None, specs, prompts)
+            return future.result()
+        finally:
+            with self._route_lock:
+                worker.in_flight -= len(audios)
+            if shm:
+                shm.close()
+                shm.unlink()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Blok sampai semua worker selesai load (+ warm-up). True kalau minimal satu worker hidup."""
+        for w in list(self.workers):
+            w.ready.wait(timeout)
+        return any(w.alive and w.ready.is_set() for w in self.workers)
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "index": w.index,
+                "pid": w.process.pid,
+                "alive": w.alive,
+                "ready": w.ready.is_set() and w.alive,
+                "cpu_threads": w.cpu_threads,
+                "in_flight": w.in_flight,
+                "timings": w.timings,
+                "deaths": self.deaths[w.index],
+                "restarts": self.restarts[w.index],
+                "restart_pending": w.index in self._respawn_timers,
+            }
+            for w in list(self.workers)
+        ]
+
+    def close(self):
+        with self._route_lock:
+            self._closing = True
+            timers, self._respawn_timers = self._respawn_timers, {}
+        for timer in timers.values():
+            timer.cancel()
+        for w in self.workers:
+            w.closing = True
+            if w.alive:
+                try:
+                    w.conn.send(None)
+                except OSError:
+                    pass
+        for w in self.workers:
+            w.process.join(timeout=5)
+            if w.process.is_alive():
+                w.process.terminate()